@@ -0,0 +1,206 @@
+import bisect
+import csv
+import glob
+import io
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+
+def parse_time(text: str) -> datetime:
+    """met CSV: '2026-01-01 12:00:00.123456'，情绪CSV: '2026-01-01 12:00:00'"""
+    return datetime.fromisoformat(text.strip())
+
+
+class CsvTimeIndex:
+    """
+    按时间列为一个CSV文件建立稀疏索引：每 stride 行记录一次 (时间, 字节偏移)，
+    时间取该行起第一个能解析的时间，所以索引点的行本身格式错误时也不会漏掉它之前的行
+
+    索引只建立一次，文件追加后从上次的位置继续；文件被替换或截断时重建。
+    查询 [start, end) 时直接跳到 start 之前最近的索引点，读到 end 为止，
+    前提是行按时间顺序追加。
+    """
+
+    def __init__(self, path: str, time_column: str = "time", stride: int = 256):
+        self.path = path
+        self.time_column = time_column
+        self.stride = stride
+        self.reset()
+
+    def reset(self):
+        self.header: List[str] = []
+        self.time_col = None
+        self.times: List[datetime] = []
+        self.offsets: List[int] = []
+        self.first_time: Optional[datetime] = None
+        self.last_time: Optional[datetime] = None
+        self.indexed = 0      # 已建立索引的字节位置（完整行的结尾）
+        self.rows = 0
+        self.inode = None
+
+    def update(self) -> bool:
+        """把新追加的行加入索引，文件不存在时返回 False"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.reset()
+            return False
+        if self.inode is not None and (stat.st_ino != self.inode or stat.st_size < self.indexed):
+            self.reset()
+        if stat.st_size == self.indexed:
+            return True
+
+        with open(self.path, 'rb') as f:
+            if self.inode is None:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    return True
+                self.header = next(csv.reader([line.decode('utf-8-sig')]))
+                if self.time_column not in self.header:
+                    raise ValueError(f"{self.path} 没有时间列 {self.time_column}")
+                self.time_col = self.header.index(self.time_column)
+                self.inode = stat.st_ino
+                self.indexed = f.tell()
+            f.seek(self.indexed)
+            offset = self.indexed
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                if self.rows % self.stride == 0:
+                    if self.times and self.times[-1] is None:
+                        # 整段都没有能解析的时间，用上一个索引点的时间，查询时只会多读
+                        self.times[-1] = self.times[-2] if len(self.times) > 1 else datetime.min
+                    self.times.append(None)
+                    self.offsets.append(offset)
+                # 只解析到索引点之后第一个有时间的行，其余行只计数
+                if self.times[-1] is None:
+                    time = self._line_time(line)
+                    if time is not None:
+                        if self.first_time is None:
+                            self.first_time = time
+                        self.times[-1] = time
+                offset += len(line)
+                self.rows += 1
+            self.indexed = offset
+
+        # 记录最后一行的时间，用来跳过不相关的文件
+        if self.rows > 0:
+            self.last_time = self._last_line_time() or self.last_time
+        return True
+
+    def _line_time(self, line: bytes) -> Optional[datetime]:
+        try:
+            values = next(csv.reader([line.decode('utf-8', errors='replace')]))
+            return parse_time(values[self.time_col])
+        except (StopIteration, IndexError, ValueError):
+            return None
+
+    def _last_line_time(self) -> Optional[datetime]:
+        start = self.offsets[-1] if self.offsets else 0
+        with open(self.path, 'rb') as f:
+            f.seek(max(start, self.indexed - 64 * 1024))
+            tail = f.read(self.indexed - f.tell())
+        lines = tail.rstrip(b'\n').rsplit(b'\n', 1)
+        return self._line_time(lines[-1] + b'\n')
+
+    def query(self, start: Optional[datetime], end: Optional[datetime],
+              converters: Optional[Dict[str, Callable]] = None) -> List[Dict]:
+        """读取时间在 [start, end) 内的行"""
+        if not self.update() or self.rows == 0:
+            return []
+        if start is not None and self.last_time is not None and self.last_time < start:
+            return []
+        if end is not None and self.first_time is not None and self.first_time >= end:
+            return []
+
+        # 最后一个索引点还没有找到时间时不参与查找，从前一个索引点读起
+        times = self.times if self.times[-1] is not None else self.times[:-1]
+        i = 0
+        if start is not None:
+            i = max(bisect.bisect_left(times, start) - 1, 0)
+        offset = self.offsets[i]
+        # 第一个时间不早于 end 的索引点之后的行都在范围外
+        stop = self.indexed
+        if end is not None:
+            j = bisect.bisect_left(times, end)
+            if j < len(times):
+                stop = max(self.offsets[j], offset)
+
+        converters = converters or {}
+        header = self.header
+        time_col = self.time_col
+        rows = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(stop - offset)
+        for values in csv.reader(io.StringIO(data.decode('utf-8', errors='replace'))):
+            if len(values) != len(header):
+                continue
+            try:
+                time = parse_time(values[time_col])
+            except ValueError:
+                continue
+            if start is not None and time < start:
+                continue
+            if end is not None and time >= end:
+                break
+            row = dict(zip(header, values))
+            try:
+                for key, convert in converters.items():
+                    row[key] = convert(row[key])
+            except (KeyError, ValueError):
+                continue
+            row[self.time_column] = time
+            rows.append(row)
+        return rows
+
+
+class DailyCsvStore:
+    """
+    按日期分文件的CSV（YYYY-MM-DD.csv）上的时间范围查询
+
+    每个文件一个 CsvTimeIndex，查询只打开与 [start, end) 相交的日期文件，
+    并且只读取范围内的行，例如最近7天的专注度不需要完整解析每个文件。
+    start 和 end 必须与时间列使用同一时区，met CSV 为不带时区的 UTC 时间。
+    """
+
+    def __init__(self, directory: str, time_column: str = "time", converters: Optional[Dict[str, Callable]] = None,
+                 stride: int = 256):
+        self.directory = directory
+        self.time_column = time_column
+        self.converters = converters or {}
+        self.stride = stride
+        self.indexes: Dict[str, CsvTimeIndex] = {}
+
+    def files(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[str]:
+        """与 [start, end) 可能相交的日期文件，按日期排序；前后各多取一天以容忍时区差异"""
+        paths = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "????-??-??.csv"))):
+            try:
+                day = datetime.strptime(os.path.basename(path)[:10], "%Y-%m-%d")
+            except ValueError:
+                continue
+            if start is not None and day + timedelta(days=2) <= start:
+                continue
+            if end is not None and day - timedelta(days=1) >= end:
+                continue
+            paths.append(path)
+        return paths
+
+    def index(self, path: str) -> CsvTimeIndex:
+        index = self.indexes.get(path)
+        if index is None:
+            index = CsvTimeIndex(path, self.time_column, self.stride)
+            self.indexes[path] = index
+        return index
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict]:
+        rows = []
+        paths = self.files(start, end)
+        for path in paths:
+            rows.extend(self.index(path).query(start, end, self.converters))
+        # 已删除的文件不再保留索引
+        for path in [p for p in self.indexes if not os.path.exists(p)]:
+            del self.indexes[path]
+        return rows
@@ -0,0 +1,114 @@
+import csv
+import io
+import os
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+class CsvTailFollower:
+    """
+    增量读取不断追加的CSV文件，只保留最后 max_rows 行
+
+    记住已读取的字节偏移，每次 poll() 只解析新追加的完整行；首次打开时从文件末尾向前
+    读取，所以无论文件有100行还是1000万行，耗时都只与新增行数有关。
+    文件被替换（inode变化）或截断（变小）时自动从头重新读取。
+    """
+
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, path: str, max_rows: int = 5000, converters: Optional[Dict[str, Callable]] = None):
+        self.path = path
+        self.max_rows = max_rows
+        self.converters = converters or {}
+        self.header: List[str] = []
+        self.rows: deque = deque(maxlen=max_rows)
+        self.offset = 0
+        self.inode = None
+        self._partial = b''
+
+    def reset(self):
+        self.header = []
+        self.rows.clear()
+        self.offset = 0
+        self.inode = None
+        self._partial = b''
+
+    def poll(self) -> List[Dict]:
+        """读取新追加的行，返回当前窗口内的所有行（按时间顺序）"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.reset()
+            return []
+
+        # 文件被轮换或截断，从头开始
+        if self.inode is not None and (stat.st_ino != self.inode or stat.st_size < self.offset):
+            self.reset()
+
+        if stat.st_size == self.offset:
+            return list(self.rows)
+
+        with open(self.path, 'rb') as f:
+            if self.inode is None:
+                self.inode = stat.st_ino
+                self._read_header(f)
+                if not self.header:
+                    return []
+                self._seek_tail(f, stat.st_size)
+            else:
+                f.seek(self.offset)
+            data = f.read(stat.st_size - f.tell())
+
+        # 只处理完整的行，最后不完整的一行留到下次
+        data = self._partial + data
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        self.offset = stat.st_size
+        if end > 0:
+            self._parse(data[:end])
+        return list(self.rows)
+
+    def _read_header(self, f):
+        line = f.readline()
+        if not line.endswith(b'\n'):
+            # 表头还没有写完整
+            self.inode = None
+            return
+        self.header = next(csv.reader([line.decode('utf-8-sig')]))
+        self.offset = f.tell()
+
+    def _seek_tail(self, f, size: int):
+        """从文件末尾向前找到最后 max_rows 行的起始位置"""
+        start = self.offset
+        pos = size
+        newlines = 0
+        while pos > start:
+            step = min(self.BLOCK_SIZE, pos - start)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            newlines += block.count(b'\n')
+            if newlines > self.max_rows:
+                # 跳过多余的行，从完整行的开头开始
+                f.seek(pos)
+                skip = newlines - self.max_rows - 1
+                index = -1
+                for _ in range(skip + 1):
+                    index = block.index(b'\n', index + 1)
+                f.seek(pos + index + 1)
+                return
+        f.seek(start)
+
+    def _parse(self, data: bytes):
+        header = self.header
+        converters = self.converters
+        for values in csv.reader(io.StringIO(data.decode('utf-8', errors='replace'))):
+            if len(values) != len(header):
+                continue
+            row = dict(zip(header, values))
+            try:
+                for key, convert in converters.items():
+                    row[key] = convert(row[key])
+            except (KeyError, ValueError):
+                continue
+            self.rows.append(row)
@@ -0,0 +1,139 @@
+import bisect
+import time as _time
+from collections import deque
+from typing import Dict, List, Optional
+
+MET_FIELDS = ["attention", "engagement", "excitement", "interest", "relaxation", "stress"]
+EMOTION_FIELDS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+
+class FocusFusion:
+    """
+    按时间对齐 met 与情绪数据的增量 as-of join
+
+    每条 met 数据匹配时间不晚于它、且相差不超过 tolerance 秒的最新一条情绪数据；
+    情绪数据晚到时，只更新它之后的 met 行。对齐结果保存在最近 window 行的窗口中，
+    frame(n) 的耗时只与 n 有关。设置 max_age 时，update_from() 会丢弃早于 max_age 秒
+    之前的数据。时间均为 Unix 时间（秒）。
+    """
+
+    def __init__(self, window: int = 600, tolerance: float = 5.0, max_age: Optional[float] = None):
+        self.window = window
+        self.tolerance = tolerance
+        self.max_age = max_age
+        self.rows: deque = deque(maxlen=window)
+        self.emotion_times: List[float] = []
+        self.emotions: List[Dict] = []
+        self.last_met_time: Optional[float] = None
+        self.last_emotion_time: Optional[float] = None
+
+    def _match(self, row: Dict, emotion: Optional[Dict]):
+        if emotion is None:
+            row.update({"emotion_time": None, "dominant": None})
+            row.update({field: None for field in EMOTION_FIELDS})
+        else:
+            row.update(emotion)
+
+    def add_met(self, time: float, values: Dict, source: Optional[str] = None):
+        """加入一条 met 数据，早于已有数据的行被忽略；source 记录数据来源"""
+        if self.last_met_time is not None and time <= self.last_met_time:
+            return
+        self.last_met_time = time
+        row = {"time": time, "source": source}
+        row.update({field: values.get(field) for field in MET_FIELDS})
+        i = bisect.bisect_right(self.emotion_times, time) - 1
+        if i >= 0 and time - self.emotion_times[i] <= self.tolerance:
+            self._match(row, self.emotions[i])
+        else:
+            self._match(row, None)
+        self.rows.append(row)
+
+    def add_emotion(self, time: float, dominant: str, scores: Dict):
+        """加入一条情绪数据，并更新在它之后、容差之内的 met 行"""
+        if self.last_emotion_time is not None and time <= self.last_emotion_time:
+            return
+        self.last_emotion_time = time
+        emotion = {"emotion_time": time, "dominant": dominant}
+        emotion.update({field: scores.get(field, 0.0) for field in EMOTION_FIELDS})
+        self.emotion_times.append(time)
+        self.emotions.append(emotion)
+        # 情绪列表超过两倍窗口时只保留最近的部分
+        if len(self.emotions) > 2 * self.window:
+            del self.emotion_times[:-self.window]
+            del self.emotions[:-self.window]
+
+        for row in reversed(self.rows):
+            if row["time"] < time:
+                break
+            if row["time"] - time <= self.tolerance:
+                self._match(row, emotion)
+
+    def evict(self, before: float):
+        """丢弃时间早于 before 的 met 行，以及不会再被匹配的情绪数据"""
+        while self.rows and self.rows[0]["time"] < before:
+            self.rows.popleft()
+        i = bisect.bisect_left(self.emotion_times, before - self.tolerance)
+        if i > 0:
+            del self.emotion_times[:i]
+            del self.emotions[:i]
+
+    def frame(self, n: Optional[int] = None) -> List[Dict]:
+        """最近 n 行对齐后的数据，按时间顺序"""
+        if n is None or n >= len(self.rows):
+            return list(self.rows)
+        return [self.rows[i] for i in range(len(self.rows) - n, len(self.rows))]
+
+    def latest(self, max_age: Optional[float] = None, now: Optional[float] = None) -> Optional[Dict]:
+        """最新一行；设置 max_age 时，超过 max_age 秒未更新则返回 None"""
+        if not self.rows:
+            return None
+        row = self.rows[-1]
+        if max_age is not None and (_time.time() if now is None else now) - row["time"] > max_age:
+            return None
+        return row
+
+    def _since(self, last: Optional[float], oldest: Optional[float]) -> Optional[float]:
+        if last is None:
+            return oldest
+        if oldest is None:
+            return last
+        return max(last, oldest)
+
+    def update_from(self, store=None, live_state=None, live_max_age: float = 10.0, now: Optional[float] = None):
+        """
+        从实时状态（LiveStateReader）和数据库（BiometricStore）读取新数据
+
+        met 优先使用实时状态，情绪数据来自数据库；只读取上次之后的新行。
+        """
+        oldest = None
+        if self.max_age is not None:
+            oldest = (_time.time() if now is None else now) - self.max_age
+            self.evict(oldest)
+
+        live = live_state.snapshot(max_age=live_max_age) if live_state is not None else None
+        if live is not None:
+            for row in live["rows"]:
+                if oldest is None or row["time"] >= oldest:
+                    self.add_met(row["time"], row, "live_state")
+        elif store is not None:
+            since = self._since(self.last_met_time, oldest)
+            if since is None:
+                met_rows = store.latest_met(self.window)
+            else:
+                data = store.met_range(since)
+                met_rows = [{field: float(data[field][i]) for field in ["time"] + MET_FIELDS}
+                            for i in range(len(data["time"]))]
+            for row in met_rows[-self.window:]:
+                self.add_met(row["time"], row, "biometric_store")
+
+        if store is not None:
+            since = self._since(self.last_emotion_time, oldest)
+            if since is None:
+                emotion_rows = store.latest_emotion(self.window)
+            else:
+                data = store.emotion_range(since)
+                emotion_rows = [dict({field: float(data[field][i]) for field in ["time"] + EMOTION_FIELDS},
+                                     dominant=data["dominant"][i])
+                                for i in range(len(data["time"]))]
+            for row in emotion_rows:
+                self.add_emotion(row["time"], row["dominant"], row)
@@ -12,6 +12,80 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# 实时状态通道：sub_data.py 把最新的 met 数据写入共享内存，这里直接读取，不再解析 CSV
+# live_state.py 等共享模块在项目根目录，需把项目根目录加入 PYTHONPATH（见 start_backend.sh）
+try:
+    from live_state import LiveStateReader
+    live_state = LiveStateReader()
+except ImportError:
+    live_state = None
+# 共享内存中的数据超过这个秒数未更新则视为采集进程已停止
+LIVE_STATE_MAX_AGE = 10.0
+
+# 生理数据库：sub_data.py 写入 met，EmotionCV 写入情绪分数
+try:
+    from biometric_store import BiometricStore, BIOMETRIC_DB, EMOTION_FIELDS
+except ImportError:
+    BiometricStore = None
+biometric_store = None
+
+def get_biometric_store():
+    """第一次用到时才打开数据库；数据库由采集进程创建，不存在时返回 None"""
+    global biometric_store
+    if biometric_store is None and BiometricStore is not None and os.path.exists(BIOMETRIC_DB):
+        biometric_store = BiometricStore(BIOMETRIC_DB)
+    return biometric_store
+
+# 个人专注模型：采集进程记录EEG特征（见 sub_data.py 的 ATTENTION_USER），结束专注会话时训练任务所属用户的模型，
+# 训练好之后 /focus/current 用模型预测专注度，否则用 met 公式
+try:
+    from attention_model import AttentionModel
+except ImportError:
+    AttentionModel = None
+attention_models = {}
+
+def get_attention_model(user):
+    """每个用户一个模型，其他进程保存后自动重新加载；没有安装 scikit-learn 时返回 None"""
+    if AttentionModel is None or not user:
+        return None
+    model = attention_models.get(user)
+    if model is None:
+        model = AttentionModel(user, record=False)
+        attention_models[user] = model
+    return model
+
+def get_task_user(cursor, task_id):
+    """任务所属对话的 session_id，即专注模型的用户"""
+    cursor.execute(
+        """SELECT c.session_id FROM tasks t
+           JOIN goals g ON t.goal_id = g.id
+           JOIN conversations c ON g.conversation_id = c.id
+           WHERE t.id = ?""",
+        (task_id,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def predict_task_focus(task_id):
+    """任务所属用户的模型训练好且EEG特征不超过 LIVE_STATE_MAX_AGE 秒时返回模型预测，否则返回 None"""
+    conn = sqlite3.connect('todos.db')
+    try:
+        model = get_attention_model(get_task_user(conn.cursor(), task_id))
+    finally:
+        conn.close()
+    if model is None:
+        return None
+    try:
+        return model.predict_latest(LIVE_STATE_MAX_AGE)
+    except Exception as e:
+        print(f"专注模型预测失败: {e}")
+        return None
+
+# 按时间对齐 met 与情绪数据，每次请求只读取新增的行；只保留最近 FOCUS_WINDOW_SECONDS 秒
+from focus_fusion import FocusFusion
+FOCUS_WINDOW_SECONDS = 300.0
+focus_fusion = FocusFusion(max_age=FOCUS_WINDOW_SECONDS)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时初始化数据库
@@ -1053,6 +1127,16 @@ async def end_focus_session(session_id: int, notes: str = ""):
         
         conn.commit()
         
+        # focus_score 是会话期间 /focus/update 提交的 focus_level 的平均值，作为专注模型的标签；
+        # 没有提交 focus_level 的会话没有标签，训练时跳过
+        user = get_task_user(cursor, task_id)
+        model = get_attention_model(user)
+        if model is not None:
+            try:
+                model.train_from_sessions('todos.db', user)
+            except Exception as e:
+                print(f"训练专注模型失败: {e}")
+        
         return {
             "session_id": session_id,
             "duration_minutes": duration_minutes,
@@ -1069,30 +1153,45 @@ async def get_current_focus_data(task_id: int):
     """获取当前任务的专注数据（读取真实CSV文件）"""
     import csv
     import os
-    from datetime import datetime, timedelta
+    from datetime import datetime, timedelta, timezone
     
     try:
-        # CSV文件路径
+        # CSV文件路径，met CSV 按 UTC 日期命名
         base_dir = "/Users/liyao/Code/AdventureX/SmartList/eeg_web_llm"
-        today = datetime.now().strftime("%Y-%m-%d")
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
         eeg_file = f"{base_dir}/{today}.csv"
         emotion_file = f"{base_dir}/EmotionCV/emotion_log.csv"
         
-        # 读取EEG数据
+        # 优先使用按时间对齐的 met 与情绪数据（实时状态和数据库），每条 met 对应当时的情绪
         eeg_data = []
-        if os.path.exists(eeg_file):
-            with open(eeg_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    eeg_data.append(row)
-        
-        # 读取情绪数据
         emotion_data = []
-        if os.path.exists(emotion_file):
-            with open(emotion_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    emotion_data.append(row)
+        eeg_source = "real_csv"
+        emotion_source = "real_csv"
+        focus_fusion.update_from(get_biometric_store(), live_state, LIVE_STATE_MAX_AGE)
+        # 最新一行超过 LIVE_STATE_MAX_AGE 秒未更新时视为采集已停止，不再当作当前数据
+        if focus_fusion.latest(max_age=LIVE_STATE_MAX_AGE) is not None:
+            aligned = focus_fusion.frame(10)
+            eeg_data = aligned
+            # 转换成与CSV相同的列名，没有匹配到情绪的行为空
+            emotion_data = [
+                dict({field.capitalize(): row[field] for field in EMOTION_FIELDS}, **{'Dominant Emotion': row['dominant']})
+                if row['dominant'] is not None else {}
+                for row in aligned
+            ]
+            eeg_source = aligned[-1]["source"]
+            emotion_source = "biometric_store"
+        else:
+            # 采集进程和数据库都不可用时读取CSV
+            if os.path.exists(eeg_file):
+                with open(eeg_file, 'r') as f:
+                    reader = csv.DictReader(f)
+                    for row in reader:
+                        eeg_data.append(row)
+            if os.path.exists(emotion_file):
+                with open(emotion_file, 'r') as f:
+                    reader = csv.DictReader(f)
+                    for row in reader:
+                        emotion_data.append(row)
         
         if not eeg_data:
             raise Exception("No EEG data found")
@@ -1138,6 +1237,12 @@ async def get_current_focus_data(task_id: int):
         current_attention = float(latest_eeg['attention'])
         current_engagement = float(latest_eeg['engagement'])
         current_focus = round(current_attention * 0.6 + current_engagement * 0.4, 3)
+        # 模型的预测来自最新的EEG特征，每次请求都是新的，不受 met 更新慢的限制
+        focus_source = "met_formula"
+        prediction = predict_task_focus(task_id)
+        if prediction is not None:
+            current_focus = round(prediction["focus"], 3)
+            focus_source = "attention_model"
         
         # 情绪数据
         current_emotion = "neutral"
@@ -1169,10 +1274,11 @@ async def get_current_focus_data(task_id: int):
             },
             "trends": trends,
             "metadata": {
-                "eeg_source": "real_csv",
-                "emotion_source": "real_csv" if latest_emotion else "none",
+                "eeg_source": eeg_source,
+                "emotion_source": emotion_source if latest_emotion else "none",
                 "eeg_samples": len(recent_eeg),
                 "emotion_samples": len(emotion_data),
+                "focus_source": focus_source,
                 "last_updated": datetime.now().isoformat(),
                 "data_file": eeg_file
             }
@@ -1,39 +1,115 @@
 import pandas as pd
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 
+from csv_index import DailyCsvStore
+from csv_tail import CsvTailFollower
+from focus_fusion import FocusFusion
+
+# 生理数据库在项目根目录，见 biometric_store.py（项目根目录需在 PYTHONPATH 中）
+try:
+    from biometric_store import BiometricStore, EMOTION_FIELDS
+except ImportError:
+    BiometricStore = None
+
+# 个人专注模型，见 attention_model.py；没有安装 scikit-learn 时只用 met 公式
+try:
+    from attention_model import AttentionModel, MODEL_DIR
+except ImportError:
+    AttentionModel = None
+    MODEL_DIR = None
+
+EEG_COLUMNS = ["attention", "engagement", "excitement", "interest", "relaxation", "stress"]
+EMOTION_COLUMNS = ["Angry", "Disgust", "Fear", "Happy", "Sad", "Surprise", "Neutral"]
+# 最新的EEG特征超过这个秒数时不再用模型预测
+MODEL_MAX_AGE = 10.0
+
+
+def utc_datetimes(seconds: pd.Series) -> pd.Series:
+    """Unix 时间转换成不带时区的 UTC 时间，与 MetCsvWriter 写入CSV的时间一致"""
+    return pd.to_datetime(seconds, unit="s")
+
+
+def to_utc(value: datetime) -> datetime:
+    """本地时间（不带时区）或带时区的时间转换成不带时区的 UTC 时间，用来查询 met CSV"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 class RealBioDataReader:
     """读取真实的生理监控数据"""
     
-    def __init__(self, base_dir: str = "/Users/liyao/Code/AdventureX/SmartList/eeg_web_llm"):
+    def __init__(self, base_dir: str = "/Users/liyao/Code/AdventureX/SmartList/eeg_web_llm", model_dir: Optional[str] = None):
         self.base_dir = base_dir
         self.eeg_file_pattern = "{base_dir}/{date}.csv"
         self.emotion_file = f"{base_dir}/EmotionCV/emotion_log.csv"
+        # eeg 和 emotion 各一个增量读取器，只解析新追加的行
+        self.followers: Dict[str, CsvTailFollower] = {}
+        # 按日期分文件的EEG数据，支持任意时间范围查询
+        self.eeg_store = DailyCsvStore(base_dir, "time", converters={c: float for c in EEG_COLUMNS})
+        # 数据库存在时优先读取数据库，否则读取CSV
+        self.db_path = os.path.join(base_dir, "biometrics.db")
+        self.store = None
+        # met 与情绪数据按时间对齐，每次只读取数据库中的新行，与 get_latest_eeg_data 一样只看最近10分钟
+        self.fusion = FocusFusion(max_age=10 * 60)
+        # 每个用户一个专注模型，采集进程训练并保存后自动重新加载
+        self.model_dir = model_dir or MODEL_DIR
+        self.models: Dict[str, "AttentionModel"] = {}
+    
+    def _get_store(self):
+        if self.store is None and BiometricStore is not None and os.path.exists(self.db_path):
+            self.store = BiometricStore(self.db_path)
+        return self.store
+    
+    def _read_store(self, table: str, minutes_back: int) -> Optional[pd.DataFrame]:
+        """
+        从数据库读取最近几分钟的数据，列名和时间格式与CSV相同：met 为 UTC 时间，情绪为本地时间；
+        没有数据库或这段时间没有数据时返回 None
+        """
+        store = self._get_store()
+        if store is None:
+            return None
+        since = time.time() - minutes_back * 60
+        if table == "met":
+            df = pd.DataFrame(store.met_range(since))
+        else:
+            df = pd.DataFrame(store.emotion_range(since))
+        if df.empty:
+            return None
+        if table == "met":
+            df["time"] = utc_datetimes(df["time"])
+        else:
+            df["time"] = pd.to_datetime(df["time"].map(datetime.fromtimestamp))
+            columns = {field: field.capitalize() for field in EMOTION_FIELDS}
+            columns.update({"time": "Timestamp", "dominant": "Dominant Emotion"})
+            df = df.rename(columns=columns)
+        return df
+    
+    def _read_tail(self, kind: str, path: str, columns: List[str], max_rows: int = 5000) -> pd.DataFrame:
+        """读取文件最后 max_rows 行，耗时与文件总大小无关"""
+        follower = self.followers.get(kind)
+        # 日期变化后换成新的文件
+        if follower is None or follower.path != path:
+            follower = CsvTailFollower(path, max_rows, converters={c: float for c in columns})
+            self.followers[kind] = follower
+        rows = follower.poll()
+        return pd.DataFrame.from_records(rows, columns=follower.header or None)
     
     def get_latest_eeg_data(self, minutes_back: int = 10) -> Dict:
         """获取最近几分钟的EEG数据"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        eeg_file = self.eeg_file_pattern.format(base_dir=self.base_dir, date=today)
-        
-        if not os.path.exists(eeg_file):
-            # 如果今天的文件不存在，尝试昨天的
-            yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-            eeg_file = self.eeg_file_pattern.format(base_dir=self.base_dir, date=yesterday)
-        
-        if not os.path.exists(eeg_file):
-            return self._get_fallback_data()
-        
         try:
-            df = pd.read_csv(eeg_file)
-            if df.empty:
+            df = self._read_store("met", minutes_back)
+            if df is None:
+                df = self._read_eeg_csv()
+            if df is None or df.empty:
                 return self._get_fallback_data()
             
             # 转换时间列
             df['time'] = pd.to_datetime(df['time'])
             
-            # 获取最近的数据
-            recent_time = datetime.now() - timedelta(minutes=minutes_back)
+            # 获取最近的数据，met 的时间是 UTC
+            recent_time = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=minutes_back)
             recent_data = df[df['time'] >= recent_time]
             
             if recent_data.empty:
@@ -69,14 +145,56 @@ class RealBioDataReader:
             print(f"读取EEG数据失败: {e}")
             return self._get_fallback_data()
     
+    def _read_eeg_csv(self) -> Optional[pd.DataFrame]:
+        """读取今天（不存在时昨天）的EEG CSV，文件按 UTC 日期命名"""
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        eeg_file = self.eeg_file_pattern.format(base_dir=self.base_dir, date=today)
+        
+        if not os.path.exists(eeg_file):
+            # 如果今天的文件不存在，尝试昨天的
+            yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+            eeg_file = self.eeg_file_pattern.format(base_dir=self.base_dir, date=yesterday)
+        
+        if not os.path.exists(eeg_file):
+            return None
+        return self._read_tail('eeg', eeg_file, EEG_COLUMNS)
+    
+    def get_eeg_range(self, start: datetime, end: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        获取 [start, end) 内的EEG数据，可跨越多天的文件
+        start 和 end 为本地时间或带时区的时间，返回的 time 列为 UTC 时间
+        """
+        store = self._get_store()
+        if store is not None:
+            data = store.met_range(start.timestamp(), end.timestamp() if end is not None else None)
+            if len(data["time"]) > 0:
+                df = pd.DataFrame(data)
+                df["time"] = utc_datetimes(df["time"])
+                return df[EEG_COLUMNS + ["time"]]
+        rows = self.eeg_store.query(to_utc(start), to_utc(end) if end is not None else None)
+        return pd.DataFrame.from_records(rows, columns=EEG_COLUMNS + ["time"])
+    
+    def get_focus_history(self, days: int = 7, bucket_minutes: int = 60) -> Dict:
+        """获取最近几天的专注度（注意力*0.6 + 参与度*0.4），按时间段取平均"""
+        end = datetime.now()
+        df = self.get_eeg_range(end - timedelta(days=days), end)
+        if df.empty:
+            return {"buckets": [], "focus": [], "sample_count": 0}
+        df["focus"] = df["attention"] * 0.6 + df["engagement"] * 0.4
+        grouped = df.set_index("time")["focus"].resample(f"{bucket_minutes}min").mean().dropna()
+        return {
+            "buckets": [t.isoformat() for t in grouped.index],
+            "focus": [round(v, 3) for v in grouped.tolist()],
+            "sample_count": len(df)
+        }
+    
     def get_latest_emotion_data(self, minutes_back: int = 5) -> Dict:
         """获取最近的情绪识别数据"""
-        if not os.path.exists(self.emotion_file):
-            return self._get_fallback_emotion()
-        
         try:
-            df = pd.read_csv(self.emotion_file)
-            if df.empty:
+            df = self._read_store("emotion", minutes_back)
+            if df is None and os.path.exists(self.emotion_file):
+                df = self._read_tail('emotion', self.emotion_file, EMOTION_COLUMNS)
+            if df is None or df.empty:
                 return self._get_fallback_emotion()
             
             # 转换时间列
@@ -168,19 +286,47 @@ class RealBioDataReader:
             "sample_count": 1
         }
     
-    def get_comprehensive_focus_data(self, task_id: int) -> Dict:
-        """获取综合的专注数据"""
+    def get_model_focus(self, user: Optional[str], max_age: float = MODEL_MAX_AGE) -> Optional[Dict]:
+        """用户的模型已训练且有最近的EEG特征时返回模型预测，例如 {'time': 1627457774.5, 'focus': 0.71}，否则返回 None"""
+        if AttentionModel is None or not user:
+            return None
+        model = self.models.get(user)
+        if model is None:
+            model = AttentionModel(user, self.model_dir, record=False)
+            self.models[user] = model
+        try:
+            return model.predict_latest(max_age)
+        except Exception as e:
+            print(f"专注模型预测失败: {e}")
+            return None
+    
+    def get_comprehensive_focus_data(self, task_id: int, user: Optional[str] = None) -> Dict:
+        """获取综合的专注数据，user 为任务所属会话的 session_id，有训练好的模型时用模型预测专注度"""
         eeg_data = self.get_latest_eeg_data()
         emotion_data = self.get_latest_emotion_data()
         
         # 计算综合指标
         focus_score = eeg_data["current"]["attention"] * 0.6 + \
                      eeg_data["current"]["engagement"] * 0.4
+        prediction = self.get_model_focus(user)
         
         stress_level = eeg_data["current"]["stress"]
         
+        # 数据库中有与最新 met 时间对齐的情绪时，用它代替最新一条情绪
+        store = self._get_store()
+        if store is not None:
+            self.fusion.update_from(store)
+        aligned = self.fusion.latest(max_age=self.fusion.max_age)
+        if aligned is not None and aligned["dominant"] is not None:
+            emotion_data["current_emotion"] = aligned["dominant"]
+            emotion_data["emotion_scores"] = {field: aligned[field] for field in EMOTION_FIELDS}
+            emotion_data["data_source"] = "aligned"
+        
+        if prediction is not None:
+            # 模型从用户自己的专注评分学习，不再按情绪调整
+            focus_score = prediction["focus"]
         # 根据情绪调整
-        if emotion_data["current_emotion"] in ["happy", "neutral"]:
+        elif emotion_data["current_emotion"] in ["happy", "neutral"]:
             focus_score *= 1.1  # 积极情绪提升专注度
         elif emotion_data["current_emotion"] in ["sad", "angry"]:
             focus_score *= 0.9  # 消极情绪降低专注度
@@ -221,6 +367,7 @@ class RealBioDataReader:
                 "emotion_source": emotion_data["data_source"],
                 "eeg_samples": eeg_data["sample_count"],
                 "emotion_samples": emotion_data["sample_count"],
+                "focus_source": "attention_model" if prediction is not None else "met_formula",
                 "last_updated": datetime.now().isoformat()
             }
         }
\ No newline at end of file
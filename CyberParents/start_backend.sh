@@ -18,4 +18,6 @@ pip install -r requirements.txt
 
 # 启动服务
 echo "启动FastAPI服务器 (http://localhost:8000)..."
+# live_state.py、biometric_store.py 在项目根目录
+export PYTHONPATH="$(cd ../.. && pwd)${PYTHONPATH:+:$PYTHONPATH}"
 python main.py
\ No newline at end of file
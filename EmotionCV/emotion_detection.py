@@ -14,6 +14,12 @@ import tensorflow as tf
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import img_to_array
 import csv
+import atexit
+try:
+    # biometric_store.py is in the project root, run with the root on PYTHONPATH to use it
+    from biometric_store import BiometricStore
+except ImportError:
+    BiometricStore = None
 
 # 🔹 Configuration
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
@@ -98,6 +104,12 @@ with open(CSV_FILE, 'w', newline='') as f:
     writer = csv.writer(f)
     writer.writerow(CSV_HEADER)
 
+# 🔹 Biometric store, keeps every session (the csv above is recreated on each start)
+store = None
+if BiometricStore is not None:
+    store = BiometricStore()
+    atexit.register(store.close)
+
 # 🔹 Thread-safe emotion analysis with multiple models
 def analyze_emotion(face):
     global detected_emotion, emotion_probabilities
@@ -194,6 +206,8 @@ def analyze_emotion(face):
                     writer = csv.writer(f)
                     row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"), detected_emotion] + [combined_emotions.get(emotion, 0) for emotion in CSV_HEADER[2:]]
                     writer.writerow(row)
+                if store is not None:
+                    store.write_emotion(time.time(), detected_emotion, combined_emotions)
                 
     except Exception as e:
         print(f"⚠️ Analysis error: {str(e)}")
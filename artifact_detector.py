@@ -0,0 +1,226 @@
+import collections
+
+import numpy as np
+from pydispatch import Dispatcher
+from scipy import signal
+
+from eeg_filters import StreamingFilter
+
+# electrodes close to the eyes, the ones present in the eeg labels are used
+FRONTAL_CHANNELS = ('AF3', 'AF4', 'FP1', 'FP2', 'F7', 'F8')
+ACC_LABELS = ('ACCX', 'ACCY', 'ACCZ')
+
+
+class IntervalTracker():
+    """
+    Merges flagged samples into intervals. Flagged samples closer than gap seconds belong to one
+    interval, which is closed once gap seconds pass without a flagged sample and then widened by
+    padding on both sides.
+    """
+    def __init__(self, kind, gap, padding):
+        self.kind = kind
+        self.gap = gap
+        self.padding = padding
+        self.start = None
+        self.last = None
+        self.peak = 0.0
+
+    def close(self):
+        interval = {'kind': self.kind, 'start': self.start - self.padding, 'end': self.last + self.padding,
+                    'peak': float(self.peak)}
+        self.start = None
+        self.last = None
+        self.peak = 0.0
+        return interval
+
+    def update(self, times, bad, severity):
+        closed = []
+        idx = np.flatnonzero(bad)
+        if len(idx) > 0:
+            bad_times = times[idx]
+            bad_severity = severity[idx]
+            if self.start is not None and bad_times[0] - self.last > self.gap:
+                closed.append(self.close())
+            # runs of flagged samples separated by more than gap
+            splits = np.flatnonzero(np.diff(bad_times) > self.gap) + 1
+            bounds = np.concatenate(([0], splits))
+            peaks = np.maximum.reduceat(bad_severity, bounds)
+            ends = np.concatenate((splits, [len(bad_times)])) - 1
+            for run in range(len(bounds)):
+                if self.start is None:
+                    self.start = float(bad_times[bounds[run]])
+                self.last = float(bad_times[ends[run]])
+                self.peak = max(self.peak, peaks[run])
+                if run < len(bounds) - 1:
+                    closed.append(self.close())
+        if self.start is not None and times[-1] - self.last > self.gap:
+            closed.append(self.close())
+        return closed
+
+
+class ArtifactDetector(Dispatcher):
+    """
+    Flags blinks in the frontal eeg channels and head motion in the mot stream, online.
+
+    eeg: the frontal channels are low-pass filtered with the DC removed, and a sample is flagged
+    when any of them exceeds amplitude µV or changes faster than slope µV per second.
+    mot: a sample is flagged when the accelerometer magnitude deviates from its slow moving
+    average, mostly gravity, by more than acc_threshold g.
+
+    Flagged samples are merged into intervals and emitted with new_artifact once they end:
+        {'kind': 'blink' or 'motion', 'start': 1627457774.1, 'end': 1627457774.6, 'peak': 182.5}
+    The recent intervals are kept so focus scoring and storage can skip or down-weight windows:
+        detector.contamination(start, end) -> fraction of [start, end] covered by artifacts
+
+    Methods
+    -------
+    attach(cortex, headset_id=None):
+        To check the eeg and mot streams of a Cortex, or of one headset of MultiHeadsetCortex.
+    process_eeg(times, values), process_mot(times, values):
+        To check a block of samples whose columns match the stream labels.
+    contamination(start, end, kinds=None):
+        To get the fraction of a time range covered by artifact intervals.
+    """
+    _events_ = ['new_artifact']
+
+    def __init__(self, eeg_fs=128.0, mot_fs=64.0, amplitude=100.0, slope=2000.0, lowpass=15.0,
+                 acc_threshold=0.1, acc_tau=2.0, gap=0.2, padding=0.1, history=1000):
+        self.eeg_fs = eeg_fs
+        self.mot_fs = mot_fs
+        self.amplitude = amplitude
+        self.slope = slope / eeg_fs
+        self.lowpass = lowpass
+        self.acc_threshold = acc_threshold
+        # exponential moving average of the accelerometer magnitude
+        alpha = 1.0 - np.exp(-1.0 / (acc_tau * mot_fs))
+        self._ema_b = np.array([alpha])
+        self._ema_a = np.array([1.0, alpha - 1.0])
+        self._ema_zi = None
+
+        self.blinks = IntervalTracker('blink', gap, padding)
+        self.motion = IntervalTracker('motion', gap, padding)
+        self.intervals = collections.deque(maxlen=history)
+
+        self.frontal_cols = []
+        self.frontal = []
+        self.acc_cols = []
+        self.headset_id = None
+        self._filter = None
+        self._last_frontal = None
+        self._cortex = None
+
+    def set_eeg_labels(self, labels):
+        self.frontal_cols = [i for i, label in enumerate(labels) if label in FRONTAL_CHANNELS]
+        self.frontal = [labels[i] for i in self.frontal_cols]
+        self._filter = None
+        self._last_frontal = None
+        if self.frontal_cols:
+            self._filter = StreamingFilter(self.eeg_fs, len(self.frontal_cols), bandpass=(None, self.lowpass), notch=None)
+
+    def set_mot_labels(self, labels):
+        self.acc_cols = [labels.index(label) for label in ACC_LABELS if label in labels]
+        if len(self.acc_cols) != len(ACC_LABELS):
+            self.acc_cols = []
+        self._ema_zi = None
+
+    def process_eeg(self, times, values):
+        if self._filter is None or len(times) == 0:
+            return []
+        times = np.asarray(times, dtype=np.float64)
+        x = self._filter.process(np.asarray(values, dtype=np.float64)[:, self.frontal_cols])
+        previous = x[:1] if self._last_frontal is None else self._last_frontal
+        slope = np.abs(np.diff(x, axis=0, prepend=previous))
+        self._last_frontal = x[-1:]
+        amplitude = np.abs(x)
+        bad = ((amplitude > self.amplitude) | (slope > self.slope)).any(axis=1)
+        return self.add_intervals(self.blinks.update(times, bad, amplitude.max(axis=1)))
+
+    def process_mot(self, times, values):
+        if not self.acc_cols or len(times) == 0:
+            return []
+        times = np.asarray(times, dtype=np.float64)
+        acc = np.asarray(values, dtype=np.float64)[:, self.acc_cols]
+        magnitude = np.sqrt((acc * acc).sum(axis=1))
+        if self._ema_zi is None:
+            self._ema_zi = signal.lfilter_zi(self._ema_b, self._ema_a) * magnitude[0]
+        baseline, self._ema_zi = signal.lfilter(self._ema_b, self._ema_a, magnitude, zi=self._ema_zi)
+        deviation = np.abs(magnitude - baseline)
+        return self.add_intervals(self.motion.update(times, deviation > self.acc_threshold, deviation))
+
+    def add_intervals(self, intervals):
+        for interval in intervals:
+            interval['channels'] = self.frontal if interval['kind'] == 'blink' else list(ACC_LABELS)
+            if self.headset_id is not None:
+                interval['headset'] = self.headset_id
+            self.intervals.append(interval)
+            self.emit('new_artifact', data=interval)
+        return intervals
+
+    def contamination(self, start, end, kinds=None):
+        if end <= start:
+            return 0.0
+        spans = sorted((max(start, i['start']), min(end, i['end'])) for i in list(self.intervals)
+                       if (kinds is None or i['kind'] in kinds) and i['end'] > start and i['start'] < end)
+        covered = 0.0
+        cursor = start
+        for lo, hi in spans:
+            lo = max(lo, cursor)
+            if hi > lo:
+                covered += hi - lo
+                cursor = hi
+        return covered / (end - start)
+
+    # --- Cortex events ---
+
+    def attach(self, cortex, headset_id=None):
+        self._cortex = cortex
+        self.headset_id = headset_id
+        cortex.bind(new_data_labels=self.on_new_data_labels)
+        cortex.bind(new_eeg_data=self.on_new_eeg_data, new_eeg_block=self.on_new_eeg_block)
+        cortex.bind(new_mot_data=self.on_new_mot_data, new_mot_block=self.on_new_mot_block)
+        cortex.stream_taps.append(self.on_stream_frame)
+
+    def own_event(self, data):
+        return self.headset_id is None or data.get('headset') == self.headset_id
+
+    def on_new_data_labels(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if not self.own_event(data):
+            return
+        if data['streamName'] == 'eeg':
+            self.set_eeg_labels(list(data['labels']))
+        elif data['streamName'] == 'mot':
+            self.set_mot_labels(list(data['labels']))
+
+    def on_stream_frame(self, stream_name, frame):
+        # streams kept only in a Cortex ring buffer (suppress_samples) are not emitted, check their frames here
+        cortex = self._cortex
+        if stream_name not in ('eeg', 'mot') or cortex.sample_mode(stream_name) != 'buffer':
+            return
+        if self.headset_id is not None and cortex.headset_id != self.headset_id:
+            return
+        if stream_name == 'eeg':
+            self.process_eeg([frame['time']], [frame['eeg'][:-1]])
+        else:
+            self.process_mot([frame['time']], [frame['mot']])
+
+    def on_new_eeg_data(self, *args, **kwargs):
+        data = kwargs.get('data')
+        # in block mode the same samples arrive again as new_eeg_block
+        if self.own_event(data) and self._cortex.sample_mode('eeg') != 'block':
+            self.process_eeg([data['time']], [data['eeg']])
+
+    def on_new_eeg_block(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.own_event(data):
+            self.process_eeg(data['time'], data['data'])
+
+    def on_new_mot_data(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.own_event(data) and self._cortex.sample_mode('mot') != 'block':
+            self.process_mot([data['time']], [data['mot']])
+
+    def on_new_mot_block(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.own_event(data):
+            self.process_mot(data['time'], data['data'])
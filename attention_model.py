@@ -0,0 +1,316 @@
+import argparse
+import glob
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+from pydispatch import Dispatcher
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from eeg_features import DEFAULT_BANDS, DEFAULT_RATIOS
+from stream_recorder import StreamRecorder, StreamReader
+
+# averaged over channels so the model does not depend on the headset
+FEATURE_NAMES = ['rel_' + band for band in DEFAULT_BANDS] + \
+                ['log_' + ratio for ratio in DEFAULT_RATIOS] + ['spectral_entropy']
+FEATURE_STREAM = 'features'
+# next to the other modules, so the Cortex process and the CyberParents backend use the same models
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# completed focus sessions of the CyberParents backend, through their task, goal and conversation
+SESSIONS_QUERY = '''
+    SELECT fs.id, fs.start_time, fs.end_time, fs.focus_score
+    FROM focus_sessions fs
+    JOIN tasks t ON fs.task_id = t.id
+    JOIN goals g ON t.goal_id = g.id
+    JOIN conversations c ON g.conversation_id = c.id
+    WHERE fs.end_time IS NOT NULL AND c.session_id = ?
+    ORDER BY fs.id
+'''
+ALL_SESSIONS_QUERY = '''
+    SELECT id, start_time, end_time, focus_score FROM focus_sessions
+    WHERE end_time IS NOT NULL
+    ORDER BY id
+'''
+
+
+def feature_vector(features):
+    """
+    To reduce the output of EEGFeatureEngine.compute to the model inputs, see FEATURE_NAMES
+
+    Returns
+    -------
+    numpy array of shape (len(FEATURE_NAMES),)
+    """
+    relative = features['relative_power'].mean(axis=0)
+    ratios = [np.log(np.nanmean(features['ratios'][name])) for name in DEFAULT_RATIOS]
+    entropy = float(np.mean(features['spectral_entropy']))
+    return np.concatenate((relative, ratios, [entropy]))
+
+
+def sqlite_time(text):
+    # CURRENT_TIMESTAMP of sqlite is UTC 'YYYY-MM-DD HH:MM:SS'
+    return datetime.strptime(text[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+
+
+class AttentionModel(Dispatcher):
+    """
+    A per user focus model trained incrementally from local EEG features.
+
+    The features of EEGFeatureEngine are recorded under model_dir/features, shared by the users
+    of the headset, and predicted on every hop, a few times per second. The model of a user is
+    kept in model_dir/user/model.joblib. Completed focus sessions of the CyberParents backend
+    are the labels: the features recorded between start_time and end_time of a session are
+    fitted to its focus_score with partial_fit, so each session is learned once and the model
+    keeps improving without retraining from scratch.
+
+    The focus_score of a session is the average of the focus_level values posted to
+    PUT /focus/update/{session_id} while it ran, computed by POST /focus/end. A session whose
+    client posted no focus_level has no score; it is counted as unlabeled and not fitted.
+
+        engine = EEGFeatureEngine(window=2.0, hop=0.25)
+        engine.attach(cortex)
+        model = AttentionModel(user='8c3f...')      # conversations.session_id of the backend
+        model.attach(engine)
+        model.bind(new_focus_prediction=on_focus)
+        ...
+        model.train_from_sessions('CyberParents/backend/todos.db', session_user='8c3f...')
+
+    Another process, such as the backend, predicts from the newest recorded features:
+        AttentionModel(user='8c3f...', record=False).predict_latest(max_age=10.0)
+
+    new_focus_prediction is emitted once the model has been trained:
+        {'time': 1627457774.5, 'focus': 0.71}
+
+    Attributes
+    ----------
+    latest : dictionary
+        the last prediction, None before the first one
+    n_samples : int
+        number of feature vectors fitted
+    learned_sessions : set
+        ids of the focus sessions fitted, or without features to fit
+
+    Methods
+    -------
+    attach(engine):
+        To record and predict the features of an EEGFeatureEngine.
+    predict(x):
+        To predict focus in [0, 1] for feature vectors of shape (n, len(FEATURE_NAMES)).
+    predict_latest(max_age=None):
+        To predict focus from the newest recorded feature vector.
+    partial_fit(X, y):
+        To update the model with labelled feature vectors.
+    train_from_sessions(db_path, session_user=None):
+        To fit the focus sessions completed since the last call, then save the model.
+    save(), load(), reload():
+        To persist the model to model_dir/user/model.joblib, reload when another process saved it.
+    """
+    _events_ = ['new_focus_prediction']
+
+    def __init__(self, user='default', model_dir=MODEL_DIR, record=True, alpha=1e-4, eta0=0.01):
+        self.user = user
+        self.model_dir = model_dir
+        self.directory = os.path.join(model_dir, user)
+        self.path = os.path.join(self.directory, 'model.joblib')
+        self.alpha = alpha
+        self.eta0 = eta0
+        self.latest = None
+        self.recorder = None
+        if record:
+            # every row is written at once, predict_latest of other processes reads the newest one
+            self.recorder = StreamRecorder(model_dir, streams=(FEATURE_STREAM,), flush_rows=1)
+            self.recorder.set_labels(FEATURE_STREAM, FEATURE_NAMES)
+        self._mtime = None
+        self.reset()
+        self.load()
+
+    def reset(self):
+        self.scaler = StandardScaler()
+        self.model = SGDRegressor(alpha=self.alpha, eta0=self.eta0, learning_rate='invscaling')
+        self.n_samples = 0
+        self.learned_sessions = set()
+
+    def fitted(self):
+        return self.n_samples > 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        self._mtime = os.path.getmtime(self.path)
+        state = joblib.load(self.path)
+        if state.get('features') != FEATURE_NAMES:
+            print('attention model: {0} was trained on other features, starting over'.format(self.path))
+            return False
+        self.scaler = state['scaler']
+        self.model = state['model']
+        self.n_samples = state['n_samples']
+        self.learned_sessions = set(state['learned_sessions'])
+        print('attention model: loaded {0}, {1} samples'.format(self.path, self.n_samples))
+        return True
+
+    def reload(self):
+        # train_from_sessions may run in another process, pick up the model it saved
+        if os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+            return self.load()
+        return False
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        state = {'features': FEATURE_NAMES, 'scaler': self.scaler, 'model': self.model,
+                 'n_samples': self.n_samples, 'learned_sessions': sorted(self.learned_sessions)}
+        tmp = self.path + '.tmp'
+        joblib.dump(state, tmp)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def partial_fit(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.clip(np.asarray(y, dtype=np.float64), 0.0, 1.0)
+        keep = np.isfinite(X).all(axis=1) & np.isfinite(y)
+        if not keep.any():
+            return
+        X, y = X[keep], y[keep]
+        self.scaler.partial_fit(X)
+        self.model.partial_fit(self.scaler.transform(X), y)
+        self.n_samples += len(X)
+
+    def predict(self, x):
+        x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+        return np.clip(self.model.predict(self.scaler.transform(x)), 0.0, 1.0)
+
+    def latest_features(self):
+        """
+        Returns
+        -------
+        (time, feature vector) of the newest recorded row, None when nothing was recorded
+        """
+        # segment names start with the UTC time of their first row, only the newest is opened
+        paths = sorted(glob.glob(os.path.join(self.model_dir, FEATURE_STREAM, '*.npy')))
+        for path in reversed(paths):
+            segment = StreamReader.open_segment(path)
+            if segment is not None:
+                record = segment['records'][-1]
+                return float(record['time']), np.array(record['data'], dtype=np.float64)
+        return None
+
+    def predict_latest(self, max_age=None):
+        """
+        To predict focus from the newest recorded feature vector
+
+        Parameters
+        ----------
+        max_age : float, optional
+            seconds after which the newest features are too old, for example when the headset is off
+
+        Returns
+        -------
+        {'time': 1627457774.5, 'focus': 0.71}, None when the model is not trained or there are no recent features
+        """
+        self.reload()
+        if not self.fitted():
+            return None
+        latest = self.latest_features()
+        if latest is None:
+            return None
+        sample_time, x = latest
+        if max_age is not None and time.time() - sample_time > max_age:
+            return None
+        return {'time': sample_time, 'focus': float(self.predict(x)[0])}
+
+    def train_from_sessions(self, db_path, session_user=None):
+        """
+        To fit the completed focus sessions not fitted yet
+
+        Parameters
+        ----------
+        db_path : string, required
+            todos.db of the CyberParents backend
+        session_user : string, optional
+            conversations.session_id the sessions belong to. All sessions are used when None.
+
+        Returns
+        -------
+        number of sessions fitted
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            if session_user is None:
+                rows = conn.execute(ALL_SESSIONS_QUERY).fetchall()
+            else:
+                rows = conn.execute(SESSIONS_QUERY, (session_user,)).fetchall()
+        finally:
+            conn.close()
+        # sessions end in any order, so the learned ones are skipped by id rather than by the last id
+        rows = [row for row in rows if row[0] not in self.learned_sessions]
+        # no focus_level was posted for these sessions, they may get none later
+        labelled = [row for row in rows if row[3] is not None]
+        unlabeled = len(rows) - len(labelled)
+        if not labelled:
+            if unlabeled:
+                print('attention model: {0} completed sessions have no focus_score'.format(unlabeled))
+            return 0
+
+        if self.recorder is not None:
+            self.recorder.flush()
+        if not os.path.isdir(os.path.join(self.model_dir, FEATURE_STREAM)):
+            print('attention model: no features recorded in {0}'.format(self.model_dir))
+            return 0
+        reader = StreamReader(self.model_dir, FEATURE_STREAM)
+
+        fitted = 0
+        for session_id, start_time, end_time, focus_score in labelled:
+            # a session without recorded features will not get any later
+            self.learned_sessions.add(session_id)
+            _, X = reader.read(sqlite_time(start_time), sqlite_time(end_time))
+            if len(X) == 0:
+                continue
+            self.partial_fit(X, np.full(len(X), float(focus_score)))
+            fitted += 1
+        self.save()
+        print('attention model: fitted {0} of {1} sessions, {2} without focus_score, {3} samples in total'.format(
+            fitted, len(labelled), unlabeled, self.n_samples))
+        return fitted
+
+    # --- EEGFeatureEngine events ---
+
+    def attach(self, engine):
+        engine.bind(new_eeg_features=self.on_new_eeg_features)
+
+    def on_new_eeg_features(self, *args, **kwargs):
+        features = kwargs.get('data')
+        x = feature_vector(features)
+        if not np.isfinite(x).all():
+            return
+        if self.recorder is not None:
+            self.recorder.append(FEATURE_STREAM, features['time'], x)
+        if not self.fitted():
+            return
+        result = {'time': features['time'], 'focus': float(self.predict(x)[0])}
+        if 'headset' in features:
+            result['headset'] = features['headset']
+        self.latest = result
+        self.emit('new_focus_prediction', data=result)
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the attention model of a user with the completed focus sessions')
+    parser.add_argument('--db', default=os.path.join('CyberParents', 'backend', 'todos.db'), help='todos.db of the backend')
+    parser.add_argument('--user', default='default', help='model name, under --model-dir')
+    parser.add_argument('--session-user', default=None, help='conversations.session_id to take sessions from, all when omitted')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    args = parser.parse_args()
+
+    model = AttentionModel(args.user, args.model_dir, record=False)
+    model.train_from_sessions(args.db, args.session_user)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from cortex import Cortex
+from cortex_simulator import CortexSimulator, SimulatedStream, DEFAULT_RATES, channel_names
+
+# modes of Cortex that change what happens to a sample after it is parsed
+MODES = ('dict', 'ring_buffer', 'block')
+BUFFERED_STREAMS = ('eeg', 'mot', 'met', 'pow')
+
+
+def make_frames(stream_name, count, eeg_channels=5, replay=None):
+    """
+    Build encoded stream frames as the Cortex service sends them
+
+    Returns
+    -------
+    cols: list
+        columns of the subscribe result
+    frames: list of string
+    """
+    stream = SimulatedStream(stream_name, DEFAULT_RATES[stream_name], channel_names(eeg_channels),
+                             replay.get(stream_name) if replay else None)
+    t0 = 1700000000.0
+    frames = []
+    for n in range(count):
+        t = t0 + n / stream.rate
+        frames.append(json.dumps({stream_name: stream.frame(n, t), 'sid': 'bench', 'time': round(t, 4)}))
+    return stream.cols, frames
+
+
+def make_cortex(stream_name, cols, mode, decoder, block_size):
+    kwargs = {'json_decoder': decoder}
+    # buffered modes skip the per sample dict, as a consumer reading only the buffer or the blocks would
+    if mode == 'ring_buffer':
+        kwargs['ring_buffer'] = {stream_name: 4096}
+        kwargs['suppress_samples'] = {stream_name}
+    elif mode == 'block':
+        kwargs['block_size'] = {stream_name: block_size}
+        kwargs['suppress_samples'] = {stream_name}
+    c = Cortex('bench', 'bench', **kwargs)
+    c.extract_data_labels(stream_name, cols)
+    return c
+
+
+def run_case(stream_name, mode, decoder, frames, cols, block_size, with_alloc):
+    c = make_cortex(stream_name, cols, mode, decoder, block_size)
+    delivered = [0]
+
+    # a consumer standing in for the Subcribe handlers, kept alive for pydispatch weak references
+    def on_data(*args, **kwargs):
+        delivered[0] += 1
+
+    events = {'new_' + stream_name + '_data': on_data}
+    if stream_name in BUFFERED_STREAMS:
+        events['new_' + stream_name + '_block'] = on_data
+    c.bind(**events)
+    on_message = c.on_message
+
+    # warm up caches and the decoder
+    for frame in frames[:min(1000, len(frames))]:
+        on_message(None, frame)
+
+    latencies = np.empty(len(frames), dtype=np.int64)
+    clock = time.perf_counter_ns
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    start = clock()
+    for i, frame in enumerate(frames):
+        t = clock()
+        on_message(None, frame)
+        latencies[i] = clock() - t
+    elapsed = (clock() - start) / 1e9
+    if gc_was_enabled:
+        gc.enable()
+
+    result = {
+        'stream': stream_name,
+        'mode': mode,
+        'decoder': decoder,
+        'messages': len(frames),
+        'seconds': round(elapsed, 6),
+        'msgs_per_sec': round(len(frames) / elapsed, 1),
+        'p50_us': round(float(np.percentile(latencies, 50)) / 1000, 3),
+        'p99_us': round(float(np.percentile(latencies, 99)) / 1000, 3),
+        'max_us': round(float(latencies.max()) / 1000, 3),
+    }
+
+    if with_alloc:
+        # a separate pass, tracing slows every allocation down
+        n = min(len(frames), 5000)
+        peaks = np.empty(n, dtype=np.int64)
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        for i in range(n):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            on_message(None, frames[i])
+            peaks[i] = tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        result['peak_bytes_per_msg'] = round(float(peaks.mean()), 1)
+        result['retained_blocks_per_msg'] = round((sys.getallocatedblocks() - blocks) / n, 3)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the cases whose throughput dropped by more than threshold compared to a previous run
+    Returns the number of regressions
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['stream'], r['mode'], r['decoder']): r for r in baseline['results']}
+    regressions = 0
+    for r in results:
+        old = previous.get((r['stream'], r['mode'], r['decoder']))
+        if old is None:
+            continue
+        change = r['msgs_per_sec'] / old['msgs_per_sec'] - 1.0
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('{0:4} {1:12} {2:8} {3:>12.0f} -> {4:>12.0f} msg/s {5:+7.1%}{6}'.format(
+            r['stream'], r['mode'], r['decoder'], old['msgs_per_sec'], r['msgs_per_sec'], change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Cortex ingest path: on_message -> handle_stream_data -> emit')
+    parser.add_argument('--streams', default='eeg,mot,met,pow,dev', help='comma separated stream names')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma separated modes: dict, ring_buffer, block')
+    parser.add_argument('--decoders', default='json', help='comma separated decoders: json, orjson, msgspec')
+    parser.add_argument('--messages', type=int, default=50000, help='frames per case')
+    parser.add_argument('--block-size', type=int, default=32)
+    parser.add_argument('--eeg-channels', type=int, default=5)
+    parser.add_argument('--replay', help='file with one recorded JSON frame per line instead of synthetic frames')
+    parser.add_argument('--no-alloc', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--output', default='bench_ingest.json')
+    parser.add_argument('--compare', help='previous result file to compare throughput with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative throughput drop reported as regression')
+    args = parser.parse_args()
+
+    replay = CortexSimulator.load_replay(args.replay) if args.replay else None
+    results = []
+    for stream_name in args.streams.split(','):
+        cols, frames = make_frames(stream_name, args.messages, args.eeg_channels, replay)
+        for mode in args.modes.split(','):
+            if mode != 'dict' and stream_name not in BUFFERED_STREAMS:
+                continue
+            for decoder in args.decoders.split(','):
+                result = run_case(stream_name, mode, decoder, frames, cols, args.block_size, not args.no_alloc)
+                results.append(result)
+                print('{stream:4} {mode:12} {decoder:8} {msgs_per_sec:>12.0f} msg/s  p50 {p50_us:.2f} us  p99 {p99_us:.2f} us'.format(**result))
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'messages': args.messages,
+            'block_size': args.block_size,
+            'eeg_channels': args.eeg_channels,
+            'replay': args.replay,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('written to ' + args.output)
+
+    if args.compare:
+        if compare(results, args.compare, args.threshold) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import csv
+import glob
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from met_writer import MET_CSV_COLUMNS, MET_CSV_INDEXES
+from scheduler import TimerScheduler
+
+# next to this file, shared by sub_data.py, EmotionCV and the CyberParents backend
+BIOMETRIC_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'biometrics.db')
+
+MET_FIELDS = MET_CSV_COLUMNS[:-1]
+EMOTION_FIELDS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+# time is Unix time in seconds; the tables are clustered on it so range scans read contiguous pages
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS met (time REAL PRIMARY KEY, {0}) WITHOUT ROWID'.format(
+        ', '.join(field + ' REAL' for field in MET_FIELDS)),
+    'CREATE TABLE IF NOT EXISTS emotion (time REAL PRIMARY KEY, dominant TEXT, {0}) WITHOUT ROWID'.format(
+        ', '.join(field + ' REAL' for field in EMOTION_FIELDS)),
+]
+
+
+class BiometricStore():
+    """
+    Stores performance metrics and emotion scores in an SQLite database in WAL mode.
+
+    Writers append rows, which are committed in batches of flush_rows or after flush_seconds;
+    readers in other processes see every committed row without blocking the writer.
+
+        store = BiometricStore()
+        store.write_met(data['time'], data['met'])                    # sub_data.py
+        store.write_emotion(time.time(), 'happy', {'happy': 81.2, ...})  # EmotionCV
+        store.latest_met(10)                                          # CyberParents backend
+        store.met_range(start, end)
+
+    Times are Unix time in seconds. Existing csv files are imported with migrate(), or
+        python biometric_store.py migrate --base-dir .
+
+    Methods
+    -------
+    write_met(time, met):
+        To add a met sample as emitted by Cortex.
+    write_emotion(time, dominant, scores):
+        To add emotion scores, a dictionary with the keys of EMOTION_FIELDS.
+    met_range(start=None, end=None), emotion_range(start=None, end=None):
+        To get the rows in [start, end) as a dictionary of numpy arrays, one per column.
+    latest_met(n=10), latest_emotion(n=10):
+        To get the last n rows as dictionaries, oldest first.
+    migrate(base_dir):
+        To import the daily met csv files and EmotionCV/emotion_log.csv.
+    flush(), close():
+        To commit the pending rows, and close the database.
+    """
+    def __init__(self, path=BIOMETRIC_DB, flush_rows=16, flush_seconds=1.0):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+        self.pending = {'met': [], 'emotion': []}
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self._timer = None
+
+    # --- writers ---
+
+    def insert_sql(self, table):
+        fields = MET_FIELDS if table == 'met' else ['dominant'] + EMOTION_FIELDS
+        return 'INSERT OR IGNORE INTO {0} (time, {1}) VALUES ({2})'.format(
+            table, ', '.join(fields), ', '.join('?' * (len(fields) + 1)))
+
+    def write_met(self, time, met):
+        self.append('met', [float(time)] + [met[i] for i in MET_CSV_INDEXES])
+
+    def write_emotion(self, time, dominant, scores):
+        self.append('emotion', [float(time), dominant] + [float(scores.get(field, 0.0)) for field in EMOTION_FIELDS])
+
+    def append(self, table, row):
+        with self._lock:
+            self.pending[table].append(row)
+            if sum(len(rows) for rows in self.pending.values()) >= self.flush_rows:
+                self._flush()
+            elif self._timer is None:
+                if self._scheduler is None:
+                    self._scheduler = TimerScheduler(name='BiometricStoreFlush')
+                self._timer = self._scheduler.call_later(self.flush_seconds, self.flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self.conn:
+            for table, rows in self.pending.items():
+                if rows:
+                    self.conn.executemany(self.insert_sql(table), rows)
+        self.pending = {'met': [], 'emotion': []}
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self.conn is None:
+                return
+            self._flush()
+            self.conn.close()
+            self.conn = None
+        if self._scheduler is not None:
+            self._scheduler.shutdown()
+
+    # --- readers ---
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def range_sql(table, start, end):
+        sql = 'SELECT * FROM {0}'.format(table)
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('time >= ?')
+            params.append(float(start))
+        if end is not None:
+            conditions.append('time < ?')
+            params.append(float(end))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return sql + ' ORDER BY time', params
+
+    def met_range(self, start=None, end=None):
+        rows = self.query(*self.range_sql('met', start, end))
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(MET_FIELDS))
+        result = {'time': np.array([row[0] for row in rows], dtype=np.float64)}
+        for i, field in enumerate(MET_FIELDS):
+            result[field] = values[:, i]
+        return result
+
+    def emotion_range(self, start=None, end=None):
+        rows = self.query(*self.range_sql('emotion', start, end))
+        values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(EMOTION_FIELDS))
+        result = {'time': np.array([row[0] for row in rows], dtype=np.float64),
+                  'dominant': [row[1] for row in rows]}
+        for i, field in enumerate(EMOTION_FIELDS):
+            result[field] = values[:, i]
+        return result
+
+    def latest_met(self, n=10):
+        rows = self.query('SELECT * FROM met ORDER BY time DESC LIMIT ?', (n,))
+        return [dict(zip(['time'] + MET_FIELDS, row)) for row in reversed(rows)]
+
+    def latest_emotion(self, n=10):
+        rows = self.query('SELECT * FROM emotion ORDER BY time DESC LIMIT ?', (n,))
+        return [dict(zip(['time', 'dominant'] + EMOTION_FIELDS, row)) for row in reversed(rows)]
+
+    # --- migration ---
+
+    def import_met_csv(self, path):
+        # written by MetCsvWriter, times are UTC
+        rows = []
+        with open(path, newline='') as f:
+            for record in csv.DictReader(f):
+                try:
+                    stamp = datetime.fromisoformat(record['time']).replace(tzinfo=timezone.utc)
+                    rows.append([stamp.timestamp()] + [float(record[field]) for field in MET_FIELDS])
+                except (KeyError, TypeError, ValueError):
+                    continue
+        with self._lock, self.conn:
+            self.conn.executemany(self.insert_sql('met'), rows)
+        return len(rows)
+
+    def import_emotion_csv(self, path):
+        # written by emotion_detection.py, times are local
+        rows = []
+        with open(path, newline='') as f:
+            for record in csv.DictReader(f):
+                try:
+                    stamp = datetime.fromisoformat(record['Timestamp'])
+                    scores = [float(record[field.capitalize()]) for field in EMOTION_FIELDS]
+                    rows.append([stamp.timestamp(), record['Dominant Emotion']] + scores)
+                except (KeyError, TypeError, ValueError):
+                    continue
+        with self._lock, self.conn:
+            self.conn.executemany(self.insert_sql('emotion'), rows)
+        return len(rows)
+
+    def migrate(self, base_dir='.'):
+        """
+        To import the csv files of base_dir; rows already in the database are skipped, so it can run again
+
+        Returns
+        -------
+        dictionary, number of rows read per table
+        """
+        counts = {'met': 0, 'emotion': 0}
+        for path in sorted(glob.glob(os.path.join(base_dir, '????-??-??.csv'))):
+            counts['met'] += self.import_met_csv(path)
+        emotion_file = os.path.join(base_dir, 'EmotionCV', 'emotion_log.csv')
+        if os.path.isfile(emotion_file):
+            counts['emotion'] += self.import_emotion_csv(emotion_file)
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Biometric store maintenance')
+    parser.add_argument('command', choices=['migrate', 'info'])
+    parser.add_argument('--db', default=BIOMETRIC_DB)
+    parser.add_argument('--base-dir', default=os.path.dirname(BIOMETRIC_DB), help='directory of the daily met csv files')
+    args = parser.parse_args()
+
+    store = BiometricStore(args.db)
+    if args.command == 'migrate':
+        counts = store.migrate(args.base_dir)
+        print('imported {0} met rows and {1} emotion rows into {2}'.format(counts['met'], counts['emotion'], args.db))
+    for table in ('met', 'emotion'):
+        count, first, last = store.query('SELECT COUNT(*), MIN(time), MAX(time) FROM ' + table)[0]
+        if count:
+            print('{0}: {1} rows from {2} to {3}'.format(table, count, datetime.fromtimestamp(first), datetime.fromtimestamp(last)))
+        else:
+            print('{0}: empty'.format(table))
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,17 @@ try:
 except ImportError:
     print(f"[ERROR] Required library 'python-dispatch' is not installed. Please run: {sys.executable} -m pip install python-dispatch", file=sys.stderr)
     sys.exit(1)
+
+# 4. Optional fast JSON decoders, stdlib json is used when neither is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 # --- END: Simplified environment checks ---
 
 import threading
@@ -28,6 +39,31 @@ import time
 import json
 from datetime import datetime
 
+from stream_buffer import StreamRingBuffer, StreamBlockCollector, StreamGapTracker
+from scheduler import TimerScheduler
+from latency import LatencyTracker
+
+def make_json_decoder(name=None):
+    """
+    Return a function decoding one Cortex websocket frame into python objects.
+    name is 'orjson', 'msgspec' or 'json'. When name is None the fastest installed decoder is used.
+    """
+    if name is None:
+        name = 'orjson' if orjson is not None else 'msgspec' if msgspec is not None else 'json'
+
+    if name == 'orjson':
+        if orjson is None:
+            raise ValueError("JSON decoder 'orjson' is not installed. Please run: " + sys.executable + " -m pip install orjson")
+        return orjson.loads
+    elif name == 'msgspec':
+        if msgspec is None:
+            raise ValueError("JSON decoder 'msgspec' is not installed. Please run: " + sys.executable + " -m pip install msgspec")
+        return msgspec.json.Decoder().decode
+    elif name == 'json':
+        return json.loads
+    else:
+        raise ValueError('Unknown JSON decoder ' + str(name))
+
 # define request id
 QUERY_HEADSET_ID                    =   1
 CONNECT_HEADSET_ID                  =   2
@@ -79,6 +115,21 @@ HEADSET_CANNOT_WORK_WITH_BTLE = 112
 HEADSET_CANNOT_CONNECT_DISABLE_MOTION = 113
 HEADSET_SCANNING_FINISHED = 142
 
+# define connection state
+# closed -> checking_access -> (requesting_access) -> authorizing -> authorized -> querying_headset
+#   -> (connecting_headset) -> creating_session -> session_ready -> subscribing -> streaming
+STATE_CLOSED = 'closed'
+STATE_CHECKING_ACCESS = 'checking_access'
+STATE_REQUESTING_ACCESS = 'requesting_access'
+STATE_AUTHORIZING = 'authorizing'
+STATE_AUTHORIZED = 'authorized'
+STATE_QUERYING_HEADSET = 'querying_headset'
+STATE_CONNECTING_HEADSET = 'connecting_headset'
+STATE_CREATING_SESSION = 'creating_session'
+STATE_SESSION_READY = 'session_ready'
+STATE_SUBSCRIBING = 'subscribing'
+STATE_STREAMING = 'streaming'
+
 class Cortex(Dispatcher):
 
     _events_ = ['inform_error','create_session_done', 'query_profile_done', 'load_unload_profile_done', 
@@ -86,7 +137,9 @@ class Cortex(Dispatcher):
                 'mc_training_threshold_done', 'create_record_done', 'stop_record_done','warn_cortex_stop_all_sub', 'warn_record_post_processing_done',
                 'inject_marker_done', 'update_marker_done', 'export_record_done', 'new_data_labels', 
                 'new_com_data', 'new_fe_data', 'new_eeg_data', 'new_mot_data', 'new_dev_data', 
-                'new_met_data', 'new_pow_data', 'new_sys_data']
+                'new_met_data', 'new_pow_data', 'new_sys_data',
+                'new_eeg_block', 'new_mot_block', 'new_met_block', 'new_pow_block', 'state_changed',
+                'stream_gap', 'reconnect_done']
     def __init__(self, client_id, client_secret, debug_mode=False, **kwargs):
         
         self.session_id = ''
@@ -95,6 +148,80 @@ class Cortex(Dispatcher):
         self.debit = 10
         self.license = os.getenv("EMOTIV_LICENSE")
         self.isHeadsetConnected = False
+        self.url = "wss://localhost:6868"
+        self.state = STATE_CLOSED
+        # headset polling while it is connecting, in seconds
+        self.headset_poll_interval = 1.0
+        self.headset_connect_timeout = 30.0
+        self.scheduler = TimerScheduler(name='CortexScheduler')
+        self._headset_poll = None
+        self._headset_poll_deadline = None
+        # reconnect with exponential backoff, in seconds
+        self.auto_reconnect = False
+        self.reconnect_delay = 1.0
+        self.reconnect_max_delay = 60.0
+        self.reconnect_attempt = 0
+        # attempts of the last outage, reported by reconnect_done
+        self.restore_attempts = 0
+        self.subscribed_streams = []
+        self.restore_streams = []
+        self.track_gaps = False
+        self.gap_trackers = {}
+        self.outage_streams = set()
+        self._closing = threading.Event()
+        self.ca_certs = "./certificates/rootCA.pem"
+        # stream name -> ring buffer capacity, for example {'eeg': 128 * 60}
+        self.buffer_capacity = {}
+        self.buffers = {}
+        # stream name -> samples / milliseconds per block, for example {'eeg': 32}
+        self.block_size = {}
+        self.block_ms = {}
+        self.collectors = {}
+        # a partial block is emitted when its stream sends no sample for block_idle seconds
+        self.block_idle = 1.0
+        self._block_lock = threading.RLock()
+        # streams whose new_[stream]_data events are skipped while they have a ring buffer or block mode,
+        # opt-in for consumers reading only the buffer or the blocks
+        self.suppress_samples = set()
+        self.decode = make_json_decoder()
+        # callables receiving (stream name, frame) of every stream frame, see StreamFanoutServer
+        self.stream_taps = []
+        # LatencyTracker filled by on_message, None to skip the measurement
+        self.latency = None
+
+        # dispatch tables for responses and stream data
+        self.result_handlers = {
+            HAS_ACCESS_RIGHT_ID: self.handle_access_result,
+            REQUEST_ACCESS_ID: self.handle_request_access_result,
+            AUTHORIZE_ID: self.handle_authorize_result,
+            QUERY_HEADSET_ID: self.handle_query_headset_result,
+            CREATE_SESSION_ID: self.handle_create_session_result,
+            SUB_REQUEST_ID: self.handle_sub_result,
+            UNSUB_REQUEST_ID: self.handle_unsub_result,
+            QUERY_PROFILE_ID: self.handle_query_profile_result,
+            SETUP_PROFILE_ID: self.handle_setup_profile_result,
+            GET_CURRENT_PROFILE_ID: self.handle_current_profile_result,
+            DISCONNECT_HEADSET_ID: self.handle_disconnect_headset_result,
+            MENTAL_COMMAND_ACTIVE_ACTION_ID: lambda result_dic: self.emit('get_mc_active_action_done', data=result_dic),
+            MENTAL_COMMAND_TRAINING_THRESHOLD: lambda result_dic: self.emit('mc_training_threshold_done', data=result_dic),
+            MENTAL_COMMAND_BRAIN_MAP_ID: lambda result_dic: self.emit('mc_brainmap_done', data=result_dic),
+            SENSITIVITY_REQUEST_ID: lambda result_dic: self.emit('mc_action_sensitivity_done', data=result_dic),
+            CREATE_RECORD_REQUEST_ID: self.handle_create_record_result,
+            STOP_RECORD_REQUEST_ID: lambda result_dic: self.emit('stop_record_done', data=result_dic['record']),
+            EXPORT_RECORD_ID: self.handle_export_record_result,
+            INJECT_MARKER_REQUEST_ID: lambda result_dic: self.emit('inject_marker_done', data=result_dic['marker']),
+            UPDATE_MARKER_REQUEST_ID: lambda result_dic: self.emit('update_marker_done', data=result_dic['marker']),
+        }
+        self.stream_handlers = {
+            'com': self.handle_com_data,
+            'fac': self.handle_fac_data,
+            'eeg': self.handle_eeg_data,
+            'mot': self.handle_mot_data,
+            'dev': self.handle_dev_data,
+            'met': self.handle_met_data,
+            'pow': self.handle_pow_data,
+            'sys': self.handle_sys_data,
+        }
 
         if client_id == '':
             raise ValueError('Empty your_app_client_id. Please fill in your_app_client_id before running the example.')
@@ -114,31 +241,142 @@ class Cortex(Dispatcher):
                 self.debit = value
             elif  key == 'headset_id':
                 self.headset_id = value
+            elif key == 'ring_buffer':
+                self.buffer_capacity = dict(value)
+            elif key == 'block_size':
+                self.block_size = dict(value)
+            elif key == 'block_ms':
+                self.block_ms = dict(value)
+            elif key == 'block_idle':
+                self.block_idle = value
+            elif key == 'suppress_samples':
+                self.suppress_samples = set(value)
+            elif key == 'url':
+                self.url = value
+            elif key == 'ca_certs':
+                self.ca_certs = value
+            elif key == 'headset_poll_interval':
+                self.headset_poll_interval = value
+            elif key == 'headset_connect_timeout':
+                self.headset_connect_timeout = value
+            elif key == 'auto_reconnect':
+                self.auto_reconnect = value
+            elif key == 'reconnect_delay':
+                self.reconnect_delay = value
+            elif key == 'reconnect_max_delay':
+                self.reconnect_max_delay = value
+            elif key == 'track_gaps':
+                self.track_gaps = value
+            elif key == 'json_decoder':
+                self.decode = make_json_decoder(value)
+            elif key == 'latency':
+                # True for the default window, or a LatencyTracker
+                if isinstance(value, LatencyTracker):
+                    self.latency = value
+                elif value:
+                    self.latency = LatencyTracker()
 
     def open(self):
-        url = "wss://localhost:6868"
-        # websocket.enableTrace(True)
-        self.ws = websocket.WebSocketApp(url, 
-                                        on_message=self.on_message,
-                                        on_open = self.on_open,
-                                        on_error=self.on_error,
-                                        on_close=self.on_close)
-        thread_name = "WebsockThread:-{:%Y%m%d%H%M%S}".format(datetime.now())
-        
-        # As default, a Emotiv self-signed certificate is required.
-        # If you don't want to use the certificate, please replace by the below line  by sslopt={"cert_reqs": ssl.CERT_NONE}
-        sslopt = {'ca_certs': "./certificates/rootCA.pem", "cert_reqs": ssl.CERT_REQUIRED}
+        self._closing.clear()
+        while True:
+            # websocket.enableTrace(True)
+            self.ws = websocket.WebSocketApp(self.url, 
+                                            on_message=self.on_message,
+                                            on_open = self.on_open,
+                                            on_error=self.on_error,
+                                            on_close=self.on_close)
+            thread_name = "WebsockThread:-{:%Y%m%d%H%M%S}".format(datetime.now())
+            
+            # As default, a Emotiv self-signed certificate is required.
+            # If you don't want to use the certificate, please replace by the below line  by sslopt={"cert_reqs": ssl.CERT_NONE}
+            sslopt = {'ca_certs': self.ca_certs, "cert_reqs": ssl.CERT_REQUIRED}
+
+            self.websock_thread  = threading.Thread(target=self.ws.run_forever, args=(None, sslopt), name=thread_name)
+            self.websock_thread .start()
+            self.websock_thread.join()
 
-        self.websock_thread  = threading.Thread(target=self.ws.run_forever, args=(None, sslopt), name=thread_name)
-        self.websock_thread .start()
-        self.websock_thread.join()
+            if not self.auto_reconnect or self._closing.is_set():
+                break
+            delay = self.next_reconnect_delay()
+            print('reconnect in {0:.1f} seconds, attempt {1}'.format(delay, self.reconnect_attempt))
+            if self._closing.wait(delay):
+                break
 
     def close(self):
+        self._closing.set()
+        self.flush_blocks()
+        self.scheduler.cancel_all()
         self.ws.close()
 
+    def next_reconnect_delay(self):
+        delay = min(self.reconnect_max_delay, self.reconnect_delay * (2 ** self.reconnect_attempt))
+        self.reconnect_attempt += 1
+        return delay
+
+    def reset_reconnect_backoff(self):
+        # a new session ends the outage, the next one starts again from reconnect_delay
+        if self.reconnect_attempt > 0:
+            self.restore_attempts = self.reconnect_attempt
+        self.reconnect_attempt = 0
+
+    def restore_session(self):
+        # the session is gone but the token is still valid, go through query headset again
+        if self._closing.is_set() or self.session_id != '':
+            return
+        self.query_headset()
+
+    def send_request(self, request):
+        self.ws.send(json.dumps(request))
+
+    def set_state(self, state):
+        if state == self.state:
+            return
+        old_state = self.state
+        self.state = state
+        if self.debug:
+            print('state: {0} -> {1}'.format(old_state, state))
+        self.emit('state_changed', data={'old': old_state, 'new': state})
+
+    def cancel_headset_poll(self):
+        if self._headset_poll is not None:
+            self._headset_poll.cancel()
+            self._headset_poll = None
+        self._headset_poll_deadline = None
+
+    def schedule_headset_poll(self):
+        # query the headset again later instead of blocking the websocket thread
+        now = time.monotonic()
+        if self._headset_poll_deadline is None:
+            self._headset_poll_deadline = now + self.headset_connect_timeout
+        elif now >= self._headset_poll_deadline:
+            self.cancel_headset_poll()
+            warnings.warn('Headset ' + self.headset_id + ' is not connected after ' + str(self.headset_connect_timeout) + ' seconds.')
+            self.set_state(STATE_AUTHORIZED)
+            return
+
+        if self._headset_poll is not None:
+            self._headset_poll.cancel()
+        self._headset_poll = self.scheduler.call_later(self.headset_poll_interval, self.query_headset)
+
     def set_wanted_headset(self, headset_id):
         self.headset_id = headset_id
 
+    def get_buffer(self, stream_name):
+        return self.buffers.get(stream_name)
+
+    def sample_mode(self, stream_name):
+        """
+        To tell how the samples of a stream reach consumers:
+        'block' when they are emitted as new_[stream]_block, 'buffer' when they are only written to
+        the ring buffer (suppress_samples without block mode, read them from a stream tap),
+        otherwise 'data' for new_[stream]_data.
+        """
+        if stream_name in self.collectors:
+            return 'block'
+        if stream_name in self.buffers and stream_name in self.suppress_samples:
+            return 'buffer'
+        return 'data'
+
     def set_wanted_profile(self, profile_name):
         self.profile_name = profile_name
 
@@ -153,181 +391,227 @@ class Cortex(Dispatcher):
     def on_close(self, *args, **kwargs):
         print("on_close")
         print(args[1])
+        self.cancel_headset_poll()
+        self.flush_blocks()
+        if self.auto_reconnect and not self._closing.is_set() and len(self.subscribed_streams) > 0:
+            self.restore_streams = list(self.subscribed_streams)
+            self.outage_streams.update(self.restore_streams)
+        # a new connection needs a new session
+        self.session_id = ''
+        self.isHeadsetConnected = False
+        self.subscribed_streams = []
+        self.set_state(STATE_CLOSED)
 
     def handle_result(self, recv_dic):
         if self.debug:
             print(recv_dic)
 
         req_id = recv_dic['id']
-        result_dic = recv_dic['result']
+        handler = self.result_handlers.get(req_id)
+        if handler is None:
+            print('No handling for response of request ' + str(req_id))
+            return
+        handler(recv_dic['result'])
+
+    def handle_access_result(self, result_dic):
+        access_granted = result_dic['accessGranted']
+        if access_granted == True:
+            # authorize
+            self.authorize()
+        else:
+            # request access
+            self.request_access()
+
+    def handle_request_access_result(self, result_dic):
+        access_granted = result_dic['accessGranted']
 
-        if req_id == HAS_ACCESS_RIGHT_ID:
-            access_granted = result_dic['accessGranted']
-            if access_granted == True:
-                # authorize
-                self.authorize()
+        if access_granted == True:
+            # authorize
+            self.authorize()
+        else:
+            # wait approve from Emotiv Launcher
+            msg = result_dic['message']
+            warnings.warn(msg)
+
+    def handle_authorize_result(self, result_dic):
+        print("Authorize successfully.")
+        self.auth = result_dic['cortexToken']
+        self.set_state(STATE_AUTHORIZED)
+        #After successful authorization, the app will call the API refresh headset list for the first time
+        self.refresh_headset_list()
+        # query headsets
+        self.query_headset()
+
+    def handle_query_headset_result(self, result_dic):
+        self.headset_list = result_dic
+        found_headset = False
+        headset_status = ''
+        for ele in self.headset_list:
+            hs_id = ele['id']
+            status = ele['status']
+            connected_by = ele['connectedBy']
+            print('headsetId: {0}, status: {1}, connected_by: {2}'.format(hs_id, status, connected_by))
+            if self.headset_id != '' and self.headset_id == hs_id:
+                found_headset = True
+                headset_status = status
+
+        if len(self.headset_list) == 0:
+            self.isHeadsetConnected = False
+            warnings.warn("No headset available. Please turn on a headset.")
+        elif self.headset_id == '':
+            # set first headset is default headset
+            self.headset_id = self.headset_list[0]['id']
+            # call query headet again
+            self.query_headset()
+        elif found_headset == False:
+            warnings.warn("Can not found the headset " + self.headset_id + ". Please make sure the id is correct.")
+        elif found_headset == True:
+            if headset_status == 'connected':
+                self.isHeadsetConnected = True
+                self.cancel_headset_poll()
+                # create session with the headset, once
+                if self.state in (STATE_CREATING_SESSION, STATE_SESSION_READY, STATE_SUBSCRIBING, STATE_STREAMING):
+                    return
+                self.create_session()
+            elif headset_status == 'discovered':
+                self.connect_headset(self.headset_id)
+                self.schedule_headset_poll()
+            elif headset_status == 'connecting':
+                # query headset again later
+                self.set_state(STATE_CONNECTING_HEADSET)
+                self.schedule_headset_poll()
             else:
-                # request access
-                self.request_access()
-        elif req_id == REQUEST_ACCESS_ID:
-            access_granted = result_dic['accessGranted']
-
-            if access_granted == True:
-                # authorize
-                self.authorize()
+                warnings.warn('query_headset resp: Invalid connection status ' + headset_status)
+
+    def handle_create_session_result(self, result_dic):
+        # close_session shares the request id of create_session
+        if result_dic.get('status') == 'closed':
+            print("The session " + result_dic['id'] + " is closed.")
+            if result_dic['id'] == self.session_id:
+                self.session_id = ''
+                self.set_state(STATE_AUTHORIZED)
+            return
+
+        self.session_id = result_dic['id']
+        print("The session " + self.session_id + " is created successfully.")
+        self.reset_reconnect_backoff()
+        self.set_state(STATE_SESSION_READY)
+        if len(self.restore_streams) > 0:
+            # session recreated after an outage, subscribe the previous streams again
+            print('resubscribe streams: ' + str(self.restore_streams))
+            self.sub_request(self.restore_streams)
+            return
+        self.emit('create_session_done', data=self.session_id)
+
+    def handle_sub_result(self, result_dic):
+        # handle data label
+        for stream in result_dic['success']:
+            stream_name = stream['streamName']
+            stream_labels = stream['cols']
+            print('The data stream '+ stream_name + ' is subscribed successfully.')
+            # ignore com, fac and sys data label because they are handled in on_new_data
+            if stream_name != 'com' and stream_name != 'fac':
+                self.extract_data_labels(stream_name, stream_labels)
+            if stream_name not in self.subscribed_streams:
+                self.subscribed_streams.append(stream_name)
+        if len(result_dic['success']) > 0:
+            self.set_state(STATE_STREAMING)
+        elif self.state == STATE_SUBSCRIBING:
+            self.set_state(STATE_SESSION_READY)
+
+        if len(self.restore_streams) > 0:
+            restored = [stream['streamName'] for stream in result_dic['success']]
+            self.emit('reconnect_done', data={'session_id': self.session_id, 'streams': restored,
+                                              'attempts': self.restore_attempts})
+            self.restore_streams = []
+
+        for stream in result_dic['failure']:
+            stream_name = stream['streamName']
+            stream_msg = stream['message']
+            print('The data stream '+ stream_name + ' is subscribed unsuccessfully. Because: ' + stream_msg)
+
+    def handle_unsub_result(self, result_dic):
+        for stream in result_dic['success']:
+            stream_name = stream['streamName']
+            print('The data stream '+ stream_name + ' is unsubscribed successfully.')
+            if stream_name in self.subscribed_streams:
+                self.subscribed_streams.remove(stream_name)
+            collector = self.collectors.pop(stream_name, None)
+            if collector is not None:
+                self.emit_block(collector)
+
+        for stream in result_dic['failure']:
+            stream_name = stream['streamName']
+            stream_msg = stream['message']
+            print('The data stream '+ stream_name + ' is unsubscribed unsuccessfully. Because: ' + stream_msg)
+
+    def handle_query_profile_result(self, result_dic):
+        profile_list = []
+        for ele in result_dic:
+            if 'name' in ele:
+                profile_name = str(ele['name'])
+                read_only = ele['readOnly']
+                print('profile name :', profile_name, " readonly :", read_only)
+                profile_list.append(profile_name)
             else:
-                # wait approve from Emotiv Launcher
-                msg = result_dic['message']
-                warnings.warn(msg)
-        elif req_id == AUTHORIZE_ID:
-            print("Authorize successfully.")
-            self.auth = result_dic['cortexToken']
-            #After successful authorization, the app will call the API refresh headset list for the first time
-            self.refresh_headset_list()
-            # query headsets
-            self.query_headset()
-        elif req_id == QUERY_HEADSET_ID:
-            self.headset_list = result_dic
-            found_headset = False
-            headset_status = ''
-            for ele in self.headset_list:
-                hs_id = ele['id']
-                status = ele['status']
-                connected_by = ele['connectedBy']
-                print('headsetId: {0}, status: {1}, connected_by: {2}'.format(hs_id, status, connected_by))
-                if self.headset_id != '' and self.headset_id == hs_id:
-                    found_headset = True
-                    headset_status = status
-
-            if len(self.headset_list) == 0:
-                self.isHeadsetConnected = False
-                warnings.warn("No headset available. Please turn on a headset.")
-            elif self.headset_id == '':
-                # set first headset is default headset
-                self.headset_id = self.headset_list[0]['id']
-                # call query headet again
-                self.query_headset()
-            elif found_headset == False:
-                warnings.warn("Can not found the headset " + self.headset_id + ". Please make sure the id is correct.")
-            elif found_headset == True:
-                if headset_status == 'connected':
-                    self.isHeadsetConnected = True
-                    # create session with the headset
-                    self.create_session()
-                elif headset_status == 'discovered':
-                    self.connect_headset(self.headset_id)
-                elif headset_status == 'connecting':
-                    # wait 3 seconds and query headset again
-                    time.sleep(3)
-                    self.query_headset()
-                else:
-                    warnings.warn('query_headset resp: Invalid connection status ' + headset_status)
-        elif req_id == CREATE_SESSION_ID:
-            self.session_id = result_dic['id']
-            print("The session " + self.session_id + " is created successfully.")
-            self.emit('create_session_done', data=self.session_id)
-        elif req_id == SUB_REQUEST_ID:
-            # handle data label
-            for stream in result_dic['success']:
-                stream_name = stream['streamName']
-                stream_labels = stream['cols']
-                print('The data stream '+ stream_name + ' is subscribed successfully.')
-                # ignore com, fac and sys data label because they are handled in on_new_data
-                if stream_name != 'com' and stream_name != 'fac':
-                    self.extract_data_labels(stream_name, stream_labels)
-
-            for stream in result_dic['failure']:
-                stream_name = stream['streamName']
-                stream_msg = stream['message']
-                print('The data stream '+ stream_name + ' is subscribed unsuccessfully. Because: ' + stream_msg)
-        elif req_id == UNSUB_REQUEST_ID:
-            for stream in result_dic['success']:
-                stream_name = stream['streamName']
-                print('The data stream '+ stream_name + ' is unsubscribed successfully.')
-
-            for stream in result_dic['failure']:
-                stream_name = stream['streamName']
-                stream_msg = stream['message']
-                print('The data stream '+ stream_name + ' is unsubscribed unsuccessfully. Because: ' + stream_msg)
-
-        elif req_id == QUERY_PROFILE_ID:
-            profile_list = []
-            for ele in result_dic:
-                if 'name' in ele:
-                    profile_name = str(ele['name'])
-                    read_only = ele['readOnly']
-                    print('profile name :', profile_name, " readonly :", read_only)
-                    profile_list.append(profile_name)
-                else:
-                    print('Result does not contain name field.')
-
-            self.emit('query_profile_done', data=profile_list)
-        elif req_id == SETUP_PROFILE_ID:
-            action = result_dic['action']
-            if action == 'create':
-                profile_name = result_dic['name']
-                if profile_name == self.profile_name:
-                    # load profile
-                    self.setup_profile(profile_name, 'load')
-            elif action == 'load':
-                print('load profile successfully')
+                print('Result does not contain name field.')
+
+        self.emit('query_profile_done', data=profile_list)
+
+    def handle_setup_profile_result(self, result_dic):
+        action = result_dic['action']
+        if action == 'create':
+            profile_name = result_dic['name']
+            if profile_name == self.profile_name:
+                # load profile
+                self.setup_profile(profile_name, 'load')
+        elif action == 'load':
+            print('load profile successfully')
+            self.emit('load_unload_profile_done', isLoaded=True)
+        elif action == 'unload':
+            self.emit('load_unload_profile_done', isLoaded=False)
+        elif action == 'save':
+            self.emit('save_profile_done')
+
+    def handle_current_profile_result(self, result_dic):
+        print(result_dic)
+        name = result_dic['name']
+        if name is None:
+            # no profile loaded with the headset
+            print('get_current_profile: no profile loaded with the headset ' + self.headset_id)
+            self.setup_profile(self.profile_name, 'load')
+        else:
+            loaded_by_this_app = result_dic['loadedByThisApp']
+            print('get current profile rsp: ' + name + ", loadedByThisApp: " + str(loaded_by_this_app))
+            if name != self.profile_name:
+                warnings.warn("There is profile " + name + " is loaded for headset " + self.headset_id)
+            elif loaded_by_this_app == True:
                 self.emit('load_unload_profile_done', isLoaded=True)
-            elif action == 'unload':
-                self.emit('load_unload_profile_done', isLoaded=False)
-            elif action == 'save':
-                self.emit('save_profile_done')
-        elif req_id == GET_CURRENT_PROFILE_ID:
-            print(result_dic)
-            name = result_dic['name']
-            if name is None:
-                # no profile loaded with the headset
-                print('get_current_profile: no profile loaded with the headset ' + self.headset_id)
-                self.setup_profile(self.profile_name, 'load')
             else:
-                loaded_by_this_app = result_dic['loadedByThisApp']
-                print('get current profile rsp: ' + name + ", loadedByThisApp: " + str(loaded_by_this_app))
-                if name != self.profile_name:
-                    warnings.warn("There is profile " + name + " is loaded for headset " + self.headset_id)
-                elif loaded_by_this_app == True:
-                    self.emit('load_unload_profile_done', isLoaded=True)
-                else:
-                    self.setup_profile(self.profile_name, 'unload')
-                    # warnings.warn("The profile " + name + " is loaded by other applications")
-        elif req_id == DISCONNECT_HEADSET_ID:
-            print("Disconnect headset " + self.headset_id)
-            self.headset_id = ''
-        elif req_id == MENTAL_COMMAND_ACTIVE_ACTION_ID:
-            self.emit('get_mc_active_action_done', data=result_dic)
-        elif req_id == MENTAL_COMMAND_TRAINING_THRESHOLD:
-            self.emit('mc_training_threshold_done', data=result_dic)
-        elif req_id == MENTAL_COMMAND_BRAIN_MAP_ID:
-            self.emit('mc_brainmap_done', data=result_dic)
-        elif req_id == SENSITIVITY_REQUEST_ID:
-            self.emit('mc_action_sensitivity_done', data=result_dic)
-        elif req_id == CREATE_RECORD_REQUEST_ID:
-            self.record_id = result_dic['record']['uuid']
-            self.emit('create_record_done', data=result_dic['record'])
-        elif req_id == STOP_RECORD_REQUEST_ID:
-            self.emit('stop_record_done', data=result_dic['record'])
-        elif req_id == EXPORT_RECORD_ID:
-            # handle data lable
-            success_export = []
-            for record in result_dic['success']:
-                record_id = record['recordId']
-                success_export.append(record_id)
-
-            for record in result_dic['failure']:
-                record_id = record['recordId']
-                failure_msg = record['message']
-                print('export_record resp failure cases: '+ record_id + ":" + failure_msg)
-
-            self.emit('export_record_done', data=success_export)
-        elif req_id == INJECT_MARKER_REQUEST_ID:
-            self.emit('inject_marker_done', data=result_dic['marker'])
-        elif req_id == UPDATE_MARKER_REQUEST_ID:
-            self.emit('update_marker_done', data=result_dic['marker'])
-        else:
-            print('No handling for response of request ' + str(req_id))
+                self.setup_profile(self.profile_name, 'unload')
+                # warnings.warn("The profile " + name + " is loaded by other applications")
+
+    def handle_disconnect_headset_result(self, result_dic):
+        print("Disconnect headset " + self.headset_id)
+        self.headset_id = ''
+
+    def handle_create_record_result(self, result_dic):
+        self.record_id = result_dic['record']['uuid']
+        self.emit('create_record_done', data=result_dic['record'])
+
+    def handle_export_record_result(self, result_dic):
+        # handle data lable
+        success_export = []
+        for record in result_dic['success']:
+            record_id = record['recordId']
+            success_export.append(record_id)
+
+        for record in result_dic['failure']:
+            record_id = record['recordId']
+            failure_msg = record['message']
+            print('export_record resp failure cases: '+ record_id + ":" + failure_msg)
+
+        self.emit('export_record_done', data=success_export)
 
     def handle_error(self, recv_dic):
         req_id = recv_dic['id']
@@ -354,6 +638,15 @@ class Cortex(Dispatcher):
             if session_id == self.session_id:
                 self.emit('warn_cortex_stop_all_sub', data=session_id)
                 self.session_id = ''
+                self.set_state(STATE_AUTHORIZED)
+                self.flush_blocks()
+                if self.auto_reconnect and len(self.subscribed_streams) > 0:
+                    self.restore_streams = list(self.subscribed_streams)
+                    self.outage_streams.update(self.restore_streams)
+                    self.subscribed_streams = []
+                    delay = self.next_reconnect_delay()
+                    print('restore session in {0:.1f} seconds'.format(delay))
+                    self.scheduler.call_later(delay, self.restore_session)
         elif warning_code == CORTEX_RECORD_POST_PROCESSING_DONE:
                 record_id = warning_msg['recordId']
                 self.emit('warn_record_post_processing_done', data=record_id)
@@ -364,59 +657,158 @@ class Cortex(Dispatcher):
                 self.refresh_headset_list()
 
     def handle_stream_data(self, result_dic):
-        if result_dic.get('com') != None:
-            com_data = {}
-            com_data['action'] = result_dic['com'][0]
-            com_data['power'] = result_dic['com'][1]
-            com_data['time'] = result_dic['time']
-            self.emit('new_com_data', data=com_data)
-        elif result_dic.get('fac') != None:
-            fe_data = {}
-            fe_data['eyeAct'] = result_dic['fac'][0]    #eye action
-            fe_data['uAct'] = result_dic['fac'][1]      #upper action
-            fe_data['uPow'] = result_dic['fac'][2]      #upper action power
-            fe_data['lAct'] = result_dic['fac'][3]      #lower action
-            fe_data['lPow'] = result_dic['fac'][4]      #lower action power
-            fe_data['time'] = result_dic['time']
-            self.emit('new_fe_data', data=fe_data)
-        elif result_dic.get('eeg') != None:
-            eeg_data = {}
-            eeg_data['eeg'] = result_dic['eeg']
-            eeg_data['eeg'].pop() # remove markers
-            eeg_data['time'] = result_dic['time']
-            self.emit('new_eeg_data', data=eeg_data)
-        elif result_dic.get('mot') != None:
-            mot_data = {}
-            mot_data['mot'] = result_dic['mot']
-            mot_data['time'] = result_dic['time']
-            self.emit('new_mot_data', data=mot_data)
-        elif result_dic.get('dev') != None:
-            dev_data = {}
-            dev_data['signal'] = result_dic['dev'][1]
-            dev_data['dev'] = result_dic['dev'][2]
-            dev_data['batteryPercent'] = result_dic['dev'][3]
-            dev_data['time'] = result_dic['time']
-            self.emit('new_dev_data', data=dev_data)
-        elif result_dic.get('met') != None:
-            met_data = {}
-            met_data['met'] = result_dic['met']
-            met_data['time'] = result_dic['time']
-            self.emit('new_met_data', data=met_data)
-        elif result_dic.get('pow') != None:
-            pow_data = {}
-            pow_data['pow'] = result_dic['pow']
-            pow_data['time'] = result_dic['time']
-            self.emit('new_pow_data', data=pow_data)
-        elif result_dic.get('sys') != None:
-            sys_data = result_dic['sys']
-            self.emit('new_sys_data', data=sys_data)
-        else :
-            print(result_dic)
+        # a stream frame holds 'sid', 'time' and exactly one stream key
+        for key in result_dic:
+            handler = self.stream_handlers.get(key)
+            if handler is not None:
+                # taps see the frame before the handlers modify it
+                for tap in self.stream_taps:
+                    tap(key, result_dic)
+                handler(result_dic)
+                return
+        print(result_dic)
+
+    def handle_com_data(self, result_dic):
+        com_data = {}
+        com_data['action'] = result_dic['com'][0]
+        com_data['power'] = result_dic['com'][1]
+        com_data['time'] = result_dic['time']
+        self.emit('new_com_data', data=com_data)
+
+    def handle_fac_data(self, result_dic):
+        fe_data = {}
+        fe_data['eyeAct'] = result_dic['fac'][0]    #eye action
+        fe_data['uAct'] = result_dic['fac'][1]      #upper action
+        fe_data['uPow'] = result_dic['fac'][2]      #upper action power
+        fe_data['lAct'] = result_dic['fac'][3]      #lower action
+        fe_data['lPow'] = result_dic['fac'][4]      #lower action power
+        fe_data['time'] = result_dic['time']
+        self.emit('new_fe_data', data=fe_data)
+
+    def handle_eeg_data(self, result_dic):
+        tracker = self.gap_trackers.get('eeg')
+        if tracker is not None:
+            self.check_gap(tracker, result_dic['time'], result_dic['eeg'])
+        # markers column is dropped because it is not in the labels
+        if self.store_sample('eeg', result_dic['time'], result_dic['eeg']):
+            return
+        eeg_data = {}
+        eeg_data['eeg'] = result_dic['eeg']
+        eeg_data['eeg'].pop() # remove markers
+        eeg_data['time'] = result_dic['time']
+        self.emit('new_eeg_data', data=eeg_data)
+
+    def handle_mot_data(self, result_dic):
+        tracker = self.gap_trackers.get('mot')
+        if tracker is not None:
+            self.check_gap(tracker, result_dic['time'], result_dic['mot'])
+        if self.store_sample('mot', result_dic['time'], result_dic['mot']):
+            return
+        mot_data = {}
+        mot_data['mot'] = result_dic['mot']
+        mot_data['time'] = result_dic['time']
+        self.emit('new_mot_data', data=mot_data)
+
+    def handle_dev_data(self, result_dic):
+        dev_data = {}
+        dev_data['signal'] = result_dic['dev'][1]
+        dev_data['dev'] = result_dic['dev'][2]
+        dev_data['batteryPercent'] = result_dic['dev'][3]
+        dev_data['time'] = result_dic['time']
+        self.emit('new_dev_data', data=dev_data)
+
+    def handle_met_data(self, result_dic):
+        if self.store_sample('met', result_dic['time'], result_dic['met']):
+            return
+        met_data = {}
+        met_data['met'] = result_dic['met']
+        met_data['time'] = result_dic['time']
+        self.emit('new_met_data', data=met_data)
+
+    def handle_pow_data(self, result_dic):
+        if self.store_sample('pow', result_dic['time'], result_dic['pow']):
+            return
+        pow_data = {}
+        pow_data['pow'] = result_dic['pow']
+        pow_data['time'] = result_dic['time']
+        self.emit('new_pow_data', data=pow_data)
+
+    def handle_sys_data(self, result_dic):
+        sys_data = result_dic['sys']
+        self.emit('new_sys_data', data=sys_data)
+
+    def check_gap(self, tracker, time, values):
+        gap = tracker.update(time, values)
+        if tracker.stream_name in self.outage_streams:
+            # first sample after a restored session closes the outage
+            self.outage_streams.discard(tracker.stream_name)
+            if gap is not None:
+                gap['outage'] = True
+        if gap is not None:
+            print('{0} stream lost {1} samples between {2} and {3}'.format(gap['streamName'], gap['lost'], gap['start'], gap['end']))
+            self.emit('stream_gap', data=gap)
+
+    def store_sample(self, stream_name, sample_time, values):
+        """
+        Write a sample into the ring buffer and block collector of its stream.
+        Returns True when the sample was stored and its stream is in suppress_samples,
+        otherwise the sample is also emitted as a dict.
+        """
+        buffer = self.buffers.get(stream_name)
+        collector = self.collectors.get(stream_name)
+        if buffer is None and collector is None:
+            return False
+
+        if buffer is not None:
+            buffer.append(sample_time, values)
+        if collector is not None:
+            with self._block_lock:
+                collector.arrival = time.monotonic()
+                if collector.add(sample_time, values):
+                    self.emit_block(collector)
+                elif len(collector) == 1:
+                    # first sample of a block, make sure the block leaves even if the stream stalls
+                    self.scheduler.call_later(self.block_idle, self.flush_idle_block, collector, collector.blocks)
+        return stream_name in self.suppress_samples
+
+    def flush_idle_block(self, collector, block):
+        # runs on the scheduler thread
+        with self._block_lock:
+            if collector.blocks != block or len(collector) == 0:
+                return
+            idle = time.monotonic() - collector.arrival
+            if idle < self.block_idle:
+                self.scheduler.call_later(self.block_idle - idle, self.flush_idle_block, collector, block)
+                return
+            self.emit_block(collector)
+
+    def emit_block(self, collector):
+        with self._block_lock:
+            times, data = collector.take()
+            if len(times) == 0:
+                return
+            block = {}
+            block['streamName'] = collector.stream_name
+            block['labels'] = collector.labels
+            block['time'] = times
+            block['data'] = data
+            self.emit('new_' + collector.stream_name + '_block', data=block)
+
+    def flush_blocks(self):
+        # emit partially filled blocks, for example before unsubscribing or closing
+        with self._block_lock:
+            for collector in list(self.collectors.values()):
+                self.emit_block(collector)
 
     def on_message(self, *args):
-        recv_dic = json.loads(args[1])
+        latency = self.latency
+        if latency is not None:
+            arrival = time.monotonic()
+        recv_dic = self.decode(args[1])
         if 'sid' in recv_dic:
             self.handle_stream_data(recv_dic)
+            if latency is not None:
+                latency.record(recv_dic, arrival, time.monotonic())
         elif 'result' in recv_dic:
             self.handle_result(recv_dic)
         elif 'error' in recv_dic:
@@ -437,7 +829,9 @@ class Cortex(Dispatcher):
         if self.debug:
             print('queryHeadsets request \n', json.dumps(query_headset_request, indent=4))
 
-        self.ws.send(json.dumps(query_headset_request, indent=4))
+        if self.state == STATE_AUTHORIZED:
+            self.set_state(STATE_QUERYING_HEADSET)
+        return self.send_request(query_headset_request)
 
     def connect_headset(self, headset_id):
         print('connect headset --------------------------------')
@@ -453,7 +847,8 @@ class Cortex(Dispatcher):
         if self.debug:
             print('controlDevice request \n', json.dumps(connect_headset_request, indent=4))
 
-        self.ws.send(json.dumps(connect_headset_request, indent=4))
+        self.set_state(STATE_CONNECTING_HEADSET)
+        return self.send_request(connect_headset_request)
 
     def request_access(self):
         print('request access --------------------------------')
@@ -467,7 +862,8 @@ class Cortex(Dispatcher):
             "id": REQUEST_ACCESS_ID
         }
 
-        self.ws.send(json.dumps(request_access_request, indent=4))
+        self.set_state(STATE_REQUESTING_ACCESS)
+        return self.send_request(request_access_request)
 
     def has_access_right(self):
         print('check has access right --------------------------------')
@@ -480,7 +876,8 @@ class Cortex(Dispatcher):
             },
             "id": HAS_ACCESS_RIGHT_ID
         }
-        self.ws.send(json.dumps(has_access_request, indent=4))
+        self.set_state(STATE_CHECKING_ACCESS)
+        return self.send_request(has_access_request)
 
     def authorize(self):
         print('authorize --------------------------------')
@@ -499,7 +896,8 @@ class Cortex(Dispatcher):
         if self.debug:
             print('auth request \n', json.dumps(authorize_request, indent=4))
 
-        self.ws.send(json.dumps(authorize_request))
+        self.set_state(STATE_AUTHORIZING)
+        return self.send_request(authorize_request)
 
     def create_session(self):
         if self.session_id != '':
@@ -521,7 +919,8 @@ class Cortex(Dispatcher):
         if self.debug:
             print('create session request \n', json.dumps(create_session_request, indent=4))
 
-        self.ws.send(json.dumps(create_session_request))
+        self.set_state(STATE_CREATING_SESSION)
+        return self.send_request(create_session_request)
 
     def close_session(self):
         print('close session --------------------------------')
@@ -536,7 +935,7 @@ class Cortex(Dispatcher):
             }
         }
 
-        self.ws.send(json.dumps(close_session_request))
+        return self.send_request(close_session_request)
 
     def get_cortex_info(self):
         print('get cortex version --------------------------------')
@@ -546,7 +945,7 @@ class Cortex(Dispatcher):
             "id":GET_CORTEX_INFO_ID
         }
 
-        self.ws.send(json.dumps(get_cortex_info_request))
+        return self.send_request(get_cortex_info_request)
 
     """
         Prepare steps include:
@@ -577,7 +976,7 @@ class Cortex(Dispatcher):
             }
         }
 
-        self.ws.send(json.dumps(disconnect_headset_request))
+        return self.send_request(disconnect_headset_request)
 
     def sub_request(self, stream):
         print('subscribe request --------------------------------')
@@ -594,7 +993,9 @@ class Cortex(Dispatcher):
         if self.debug:
             print('subscribe request \n', json.dumps(sub_request_json, indent=4))
 
-        self.ws.send(json.dumps(sub_request_json))
+        if self.state == STATE_SESSION_READY:
+            self.set_state(STATE_SUBSCRIBING)
+        return self.send_request(sub_request_json)
 
     def unsub_request(self, stream):
         print('unsubscribe request --------------------------------')
@@ -611,7 +1012,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('unsubscribe request \n', json.dumps(unsub_request_json, indent=4))
 
-        self.ws.send(json.dumps(unsub_request_json))
+        return self.send_request(unsub_request_json)
 
     def extract_data_labels(self, stream_name, stream_cols):
         labels = {}
@@ -629,6 +1030,27 @@ class Cortex(Dispatcher):
 
         labels['labels'] = data_labels
         print(labels)
+
+        # streams configured with ring_buffer or block mode, see store_sample
+        if stream_name in ('eeg', 'mot', 'met', 'pow'):
+            capacity = self.buffer_capacity.get(stream_name)
+            buffer = self.buffers.get(stream_name)
+            if capacity is not None and (buffer is None or buffer.labels != list(data_labels)):
+                self.buffers[stream_name] = StreamRingBuffer(stream_name, data_labels, capacity)
+
+            block_size = self.block_size.get(stream_name)
+            block_ms = self.block_ms.get(stream_name)
+            if block_size is not None or block_ms is not None:
+                collector = self.collectors.get(stream_name)
+                if collector is not None:
+                    self.emit_block(collector)
+                self.collectors[stream_name] = StreamBlockCollector(stream_name, data_labels, block_size, block_ms)
+
+        # the tracker is kept across resubscribes so outages are counted
+        if (self.track_gaps or self.auto_reconnect) and stream_name in ('eeg', 'mot') and stream_name not in self.gap_trackers:
+            for counter_label in StreamRingBuffer.COUNTER_LABELS:
+                if counter_label in data_labels:
+                    self.gap_trackers[stream_name] = StreamGapTracker(stream_name, list(data_labels).index(counter_label))
         self.emit('new_data_labels', data=labels)
 
     def query_profile(self):
@@ -646,7 +1068,7 @@ class Cortex(Dispatcher):
             print('query profile request \n', json.dumps(query_profile_json, indent=4))
             print('\n')
 
-        self.ws.send(json.dumps(query_profile_json))
+        return self.send_request(query_profile_json)
 
     def get_current_profile(self):
         print('get current profile:')
@@ -664,7 +1086,7 @@ class Cortex(Dispatcher):
             print('get current profile json:\n', json.dumps(get_profile_json, indent=4))
             print('\n')
 
-        self.ws.send(json.dumps(get_profile_json))
+        return self.send_request(get_profile_json)
 
     def setup_profile(self, profile_name, status):
         print('setup profile: ' + status + ' -------------------------------- ')
@@ -684,7 +1106,7 @@ class Cortex(Dispatcher):
             print('setup profile json:\n', json.dumps(setup_profile_json, indent=4))
             print('\n')
 
-        self.ws.send(json.dumps(setup_profile_json))
+        return self.send_request(setup_profile_json)
 
     def train_request(self, detection, action, status):
         print('train request --------------------------------')
@@ -704,7 +1126,7 @@ class Cortex(Dispatcher):
             print('training request:\n', json.dumps(train_request_json, indent=4))
             print('\n')
 
-        self.ws.send(json.dumps(train_request_json))
+        return self.send_request(train_request_json)
 
     def create_record(self, title, **kwargs):
         print('create record --------------------------------')
@@ -729,7 +1151,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('create record request:\n', json.dumps(create_record_request, indent=4))
 
-        self.ws.send(json.dumps(create_record_request))
+        return self.send_request(create_record_request)
 
     def stop_record(self):
         print('stop record --------------------------------')
@@ -745,7 +1167,7 @@ class Cortex(Dispatcher):
         }
         if self.debug:
             print('stop record request:\n', json.dumps(stop_record_request, indent=4))
-        self.ws.send(json.dumps(stop_record_request))
+        return self.send_request(stop_record_request)
 
     def export_record(self, folder, stream_types, export_format, record_ids,
                       version, **kwargs):
@@ -780,7 +1202,7 @@ class Cortex(Dispatcher):
             print('export record request \n',
                 json.dumps(export_record_request, indent=4))
         
-        self.ws.send(json.dumps(export_record_request))
+        return self.send_request(export_record_request)
 
     def inject_marker_request(self, time, value, label, **kwargs):
         print('inject marker --------------------------------')
@@ -801,7 +1223,7 @@ class Cortex(Dispatcher):
         }
         if self.debug:
             print('inject marker request \n', json.dumps(inject_marker_request, indent=4))
-        self.ws.send(json.dumps(inject_marker_request))
+        return self.send_request(inject_marker_request)
 
     def update_marker_request(self, marker_id, time, **kwargs):
         print('update marker --------------------------------')
@@ -821,7 +1243,7 @@ class Cortex(Dispatcher):
         }
         if self.debug:
             print('update marker request \n', json.dumps(update_marker_request, indent=4))
-        self.ws.send(json.dumps(update_marker_request))
+        return self.send_request(update_marker_request)
 
     def get_mental_command_action_sensitivity(self, profile_name):
         print('get mental command sensitivity ------------------')
@@ -838,7 +1260,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('get mental command sensitivity \n', json.dumps(sensitivity_request, indent=4))
 
-        self.ws.send(json.dumps(sensitivity_request))
+        return self.send_request(sensitivity_request)
 
     def set_mental_command_action_sensitivity(self, profile_name, values):
         print('set mental command sensitivity ------------------')
@@ -857,7 +1279,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('set mental command sensitivity \n', json.dumps(sensitivity_request, indent=4))
             
-        self.ws.send(json.dumps(sensitivity_request))
+        return self.send_request(sensitivity_request)
 
     def get_mental_command_active_action(self, profile_name):
         print('get mental command active action ------------------')
@@ -874,7 +1296,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('get mental command active action \n', json.dumps(command_active_request, indent=4))
 
-        self.ws.send(json.dumps(command_active_request))
+        return self.send_request(command_active_request)
 
     def set_mental_command_active_action(self, actions):
         print('set mental command active action ------------------')
@@ -893,7 +1315,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('set mental command active action \n', json.dumps(command_active_request, indent=4))
 
-        self.ws.send(json.dumps(command_active_request))
+        return self.send_request(command_active_request)
 
     def get_mental_command_brain_map(self, profile_name):
         print('get mental command brain map ------------------')
@@ -909,7 +1331,7 @@ class Cortex(Dispatcher):
         }
         if self.debug:
             print('get mental command brain map \n', json.dumps(brain_map_request, indent=4))
-        self.ws.send(json.dumps(brain_map_request))
+        return self.send_request(brain_map_request)
 
     def get_mental_command_training_threshold(self, profile_name):
         print('get mental command training threshold -------------')
@@ -924,7 +1346,7 @@ class Cortex(Dispatcher):
         }
         if self.debug:
             print('get mental command training threshold \n', json.dumps(training_threshold_request, indent=4))
-        self.ws.send(json.dumps(training_threshold_request))
+        return self.send_request(training_threshold_request)
 
     def refresh_headset_list(self):
         print('refresh headset list --------------------------------')
@@ -939,7 +1361,7 @@ class Cortex(Dispatcher):
         if self.debug:
             print('controlDevice refresh request \n', json.dumps(refresh_request, indent=4))
 
-        self.ws.send(json.dumps(refresh_request, indent=4))
+        return self.send_request(refresh_request)
 
 # -------------------------------------------------------------------
 # -------------------------------------------------------------------
@@ -0,0 +1,316 @@
+import sys
+# --- BEGIN: Simplified environment checks ---
+try:
+    import websockets
+except ImportError:
+    print(f"[ERROR] Required library 'websockets' is not installed. Please run: {sys.executable} -m pip install websockets", file=sys.stderr)
+    sys.exit(1)
+# --- END: Simplified environment checks ---
+
+import asyncio
+import itertools
+import json
+import ssl
+import warnings
+
+from cortex import Cortex, CORTEX_STOP_ALL_STREAMS, CORTEX_RECORD_POST_PROCESSING_DONE
+
+
+class CortexError(Exception):
+    """
+    Raised when Cortex answers a request with an error
+
+    Attributes
+    ----------
+    code : int
+        Cortex error code, for example -32046
+    message : string
+        Cortex error message
+    request_id : int
+        id of the failed request
+    """
+    def __init__(self, error_dic, request_id=None):
+        self.code = error_dic.get('code')
+        self.message = error_dic.get('message')
+        self.request_id = request_id
+        super().__init__('Cortex error {0}: {1}'.format(self.code, self.message))
+
+
+class AsyncCortex(Cortex):
+    """
+    An asyncio client for the Emotiv Cortex service.
+
+    Every request gets a unique, increasing id and a future in a table of pending requests,
+    so several calls, also of the same type, can be in flight over one websocket.
+    All request methods of Cortex return an awaitable resolving to the 'result' of the response:
+
+        cortex = AsyncCortex(client_id, client_secret)
+        await cortex.open()
+        await cortex.do_prepare_steps()
+        headsets, info = await asyncio.gather(cortex.query_headset(), cortex.get_cortex_info())
+
+    asyncio.gather returns the results in the order of the calls, however the service orders its
+    responses. Stream data, ring buffers and block mode work as in Cortex and are emitted through
+    the same events.
+
+    Methods
+    -------
+    open():
+        To connect to the Cortex service and start receiving.
+    close():
+        To close the connection and fail all pending requests.
+    do_prepare_steps():
+        To check access right, authorize, connect the wanted headset and create a session.
+    create_record(title, **kwargs):
+        To create a record in the current session.
+    export_record(folder, stream_types, export_format, record_ids, version, **kwargs):
+        To export records to a folder.
+
+    With auto_reconnect, a session stopped by Cortex or lost with the websocket is restored by a
+    task on the event loop, which connects again if needed, prepares a new session and subscribes
+    the previous streams again.
+    """
+    _events_ = ['new_warning']
+
+    def __init__(self, client_id, client_secret, debug_mode=False, **kwargs):
+        super().__init__(client_id, client_secret, debug_mode=debug_mode, **kwargs)
+        self.ws = None
+        self.loop = None
+        self.pending = {}
+        self._request_ids = itertools.count(1)
+        self._outgoing = None
+        self._send_task = None
+        self._connected = False
+        self._tasks = []
+
+    async def open(self):
+        self._closing.clear()
+        self.loop = asyncio.get_running_loop()
+        await self._connect()
+
+    async def _connect(self):
+        ssl_context = None
+        if self.url.startswith('wss://'):
+            ssl_context = ssl.create_default_context(cafile=self.ca_certs)
+        self.ws = await websockets.connect(self.url, ssl=ssl_context, max_size=None)
+        self._connected = True
+        print("websocket opened")
+
+        # requests queued for a dropped connection are failed already, start with an empty queue
+        if self._send_task is not None:
+            self._send_task.cancel()
+        self._outgoing = asyncio.Queue()
+        self._send_task = asyncio.create_task(self._send_loop())
+        self._tasks = [task for task in self._tasks if not task.done()]
+        self._tasks += [self._send_task, asyncio.create_task(self._recv_loop())]
+
+    async def close(self):
+        self._closing.set()
+        self.scheduler.cancel_all()
+        self.flush_blocks()
+        if self.ws is not None:
+            await self.ws.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._send_task = None
+        self._connected = False
+        self._fail_pending(ConnectionError('Cortex connection closed'))
+
+    def restore_session(self):
+        # called on the scheduler thread, the requests and their futures belong to the event loop
+        if self.loop is None or self.loop.is_closed() or self._closing.is_set():
+            return
+        self.loop.call_soon_threadsafe(self._start_restore)
+
+    def _start_restore(self):
+        task = asyncio.create_task(self._restore_session())
+        self._tasks.append(task)
+        task.add_done_callback(self._forget_task)
+
+    def _forget_task(self, task):
+        if task in self._tasks:
+            self._tasks.remove(task)
+
+    async def _restore_session(self):
+        if self._closing.is_set() or self.session_id != '':
+            return
+        try:
+            if not self._connected:
+                await self._connect()
+            await self.do_prepare_steps()
+            if len(self.restore_streams) > 0:
+                # handle_sub_result emits reconnect_done
+                print('resubscribe streams: ' + str(self.restore_streams))
+                await self.sub_request(self.restore_streams)
+        except (CortexError, OSError, LookupError, PermissionError, websockets.WebSocketException) as e:
+            if self._closing.is_set():
+                return
+            delay = self.next_reconnect_delay()
+            print('restore session failed: {0}, retry in {1:.1f} seconds'.format(e, delay))
+            self.scheduler.call_later(delay, self.restore_session)
+
+    def send_request(self, request):
+        req_id = next(self._request_ids)
+        request['id'] = req_id
+        future = self.loop.create_future()
+        self.pending[req_id] = (future, request['method'])
+        self._outgoing.put_nowait(json.dumps(request))
+        return future
+
+    async def _send_loop(self):
+        # a single writer keeps requests on the wire in the order they were made
+        while True:
+            message = await self._outgoing.get()
+            await self.ws.send(message)
+
+    async def _recv_loop(self):
+        try:
+            async for message in self.ws:
+                try:
+                    self.on_message(self.ws, message)
+                except Exception as e:
+                    # reported like on_error of the threaded client, the next message is read
+                    self.on_error(self.ws, 'on_message failed: {0!r}'.format(e))
+        except websockets.ConnectionClosed as e:
+            reason = e
+        else:
+            reason = None
+        finally:
+            self._connected = False
+            self._fail_pending(ConnectionError('Cortex connection closed'))
+        if self._closing.is_set():
+            return
+        # on_close keeps the subscribed streams for restore_session and clears the session
+        self.on_close(self.ws, reason)
+        if self.auto_reconnect:
+            delay = self.next_reconnect_delay()
+            print('reconnect in {0:.1f} seconds, attempt {1}'.format(delay, self.reconnect_attempt))
+            self.scheduler.call_later(delay, self.restore_session)
+
+    def _fail_pending(self, exc):
+        pending, self.pending = self.pending, {}
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def handle_result(self, recv_dic):
+        if self.debug:
+            print(recv_dic)
+
+        req_id = recv_dic['id']
+        entry = self.pending.pop(req_id, None)
+        if entry is None:
+            print('No pending request for response ' + str(req_id))
+            return
+
+        future, method = entry
+        result_dic = recv_dic['result']
+        # keep the state the inherited request methods rely on
+        if method == 'authorize':
+            self.auth = result_dic['cortexToken']
+        elif method == 'createSession':
+            self.session_id = result_dic['id']
+            self.reset_reconnect_backoff()
+            self.emit('create_session_done', data=self.session_id)
+        elif method == 'subscribe':
+            self.handle_sub_result(result_dic)
+        elif method == 'unsubscribe':
+            self.handle_unsub_result(result_dic)
+        elif method == 'updateSession':
+            # close_session, the session is gone for restore_session as well
+            if result_dic.get('status') == 'closed' and result_dic.get('id') == self.session_id:
+                self.session_id = ''
+        elif method == 'createRecord':
+            self.record_id = result_dic['record']['uuid']
+
+        if not future.done():
+            future.set_result(result_dic)
+
+    def handle_error(self, recv_dic):
+        req_id = recv_dic['id']
+        print('handle_error: request Id ' + str(req_id))
+        self.emit('inform_error', error_data=recv_dic['error'])
+
+        entry = self.pending.pop(req_id, None)
+        if entry is not None and not entry[0].done():
+            entry[0].set_exception(CortexError(recv_dic['error'], req_id))
+
+    def handle_warning(self, warning_dic):
+        # the threaded client reacts to warnings by sending requests, here the caller decides
+        if self.debug:
+            print(warning_dic)
+        self.emit('new_warning', data=warning_dic)
+        if warning_dic['code'] in (CORTEX_STOP_ALL_STREAMS, CORTEX_RECORD_POST_PROCESSING_DONE):
+            super().handle_warning(warning_dic)
+
+    async def create_record(self, title, **kwargs):
+        if len(title) == 0:
+            warnings.warn('Empty record_title. Please fill the record_title before running script.')
+            await self.close()
+            return None
+        return await super().create_record(title, **kwargs)
+
+    async def export_record(self, folder, stream_types, export_format, record_ids, version, **kwargs):
+        if len(folder) == 0:
+            warnings.warn('Invalid folder parameter. Please set a writable destination folder for exporting data.')
+            await self.close()
+            return None
+        return await super().export_record(folder, stream_types, export_format, record_ids, version, **kwargs)
+
+    async def do_prepare_steps(self, connect_interval=1.0, connect_timeout=30.0):
+        """
+        Prepare steps include:
+        Step 1: check access right. If user has not granted for the application, requestAccess will be called
+        Step 2: authorize: to generate a Cortex access token which is required parameter of many APIs
+        Step 3: Connect a headset. If no wanted headet is set, the first headset in the list will be connected.
+        Step 4: Create a working session with the connected headset
+        Returns
+        -------
+        session_id: string
+        """
+        print('do_prepare_steps--------------------------------')
+        result_dic = await self.has_access_right()
+        if not result_dic['accessGranted']:
+            result_dic = await self.request_access()
+            if not result_dic['accessGranted']:
+                raise PermissionError(result_dic['message'])
+
+        await self.authorize()
+        await self.refresh_headset_list()
+
+        waited = 0.0
+        while True:
+            headset_list = await self.query_headset()
+            self.headset_list = headset_list
+            if len(headset_list) == 0:
+                self.isHeadsetConnected = False
+                raise LookupError("No headset available. Please turn on a headset.")
+            if self.headset_id == '':
+                # set first headset is default headset
+                self.headset_id = headset_list[0]['id']
+
+            status = None
+            for ele in headset_list:
+                if ele['id'] == self.headset_id:
+                    status = ele['status']
+            if status is None:
+                raise LookupError("Can not found the headset " + self.headset_id + ". Please make sure the id is correct.")
+
+            if status == 'connected':
+                self.isHeadsetConnected = True
+                break
+            elif status == 'discovered':
+                await self.connect_headset(self.headset_id)
+            elif status != 'connecting':
+                warnings.warn('query_headset resp: Invalid connection status ' + status)
+
+            if waited >= connect_timeout:
+                raise TimeoutError('Headset ' + self.headset_id + ' is not connected after ' + str(connect_timeout) + ' seconds')
+            await asyncio.sleep(connect_interval)
+            waited += connect_interval
+
+        if self.session_id == '':
+            await self.create_session()
+        return self.session_id
@@ -0,0 +1,537 @@
+import sys
+# --- BEGIN: Simplified environment checks ---
+try:
+    import websockets
+except ImportError:
+    print(f"[ERROR] Required library 'websockets' is not installed. Please run: {sys.executable} -m pip install websockets", file=sys.stderr)
+    sys.exit(1)
+# --- END: Simplified environment checks ---
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import ssl
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from cortex import HEADSET_CONNECTED, CORTEX_STOP_ALL_STREAMS
+
+# channel names in the order of an EPOC headset, the first n are used for n channels
+EEG_CHANNELS = ['AF3', 'F7', 'F3', 'FC5', 'T7', 'P7', 'O1', 'O2', 'P8', 'T8', 'FC6', 'F4', 'F8', 'AF4']
+INSIGHT_CHANNELS = ['AF3', 'T7', 'Pz', 'T8', 'AF4']
+BANDS = ['theta', 'alpha', 'betaL', 'betaH', 'gamma']
+# met labels of the current Cortex API, MET_CSV_INDEXES of met_writer.py point into them
+MET_COLS = ['attention.isActive', 'attention', 'eng.isActive', 'eng', 'exc.isActive', 'exc', 'lex',
+            'str.isActive', 'str', 'rel.isActive', 'rel', 'int.isActive', 'int']
+MOT_COLS = ['COUNTER_MEMS', 'INTERPOLATED_MEMS', 'Q0', 'Q1', 'Q2', 'Q3',
+            'ACCX', 'ACCY', 'ACCZ', 'MAGX', 'MAGY', 'MAGZ']
+
+# samples per second of each stream, as sent by an Insight headset
+DEFAULT_RATES = {'eeg': 128.0, 'mot': 64.0, 'dev': 2.0, 'met': 2.0, 'pow': 8.0}
+
+# JSON-RPC error codes of the Cortex service
+ERROR_METHOD_NOT_FOUND = -32601
+ERROR_INVALID_PARAMS = -32602
+ERROR_INVALID_TOKEN = -32014
+ERROR_SESSION_NOT_FOUND = -32005
+ERROR_HEADSET_NOT_FOUND = -32004
+ERROR_HEADSET_NOT_CONNECTED = -32152
+
+
+def channel_names(n):
+    if n == len(INSIGHT_CHANNELS):
+        return list(INSIGHT_CHANNELS)
+    if n <= len(EEG_CHANNELS):
+        return EEG_CHANNELS[:n]
+    return EEG_CHANNELS + ['CH{0}'.format(i) for i in range(len(EEG_CHANNELS) + 1, n + 1)]
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SimulatedStream():
+    """
+    Generates the frames of one subscribed stream
+
+    Attributes
+    ----------
+    name : string
+        stream name, for example 'eeg'
+    rate : float
+        samples per second of device time
+    cols : list
+        columns returned in the subscribe result
+
+    Methods
+    -------
+    frame(n, t):
+        To build the values of sample n at device time t.
+    """
+    def __init__(self, name, rate, channels, replay=None, seed=0):
+        self.name = name
+        self.rate = rate
+        self.channels = channels
+        self.replay = replay
+        self.markers = []
+        # str hashes are salted per process, crc32 keeps the generated values the same across runs
+        self._rng = random.Random((seed << 32) | zlib.crc32(name.encode()))
+        self._met = [0.5] * 6
+
+        if name == 'eeg':
+            self.cols = ['COUNTER', 'INTERPOLATED'] + channels + ['RAW_CQ', 'MARKER_HARDWARE', 'MARKERS']
+        elif name == 'mot':
+            self.cols = list(MOT_COLS)
+        elif name == 'dev':
+            self.cols = ['Battery', 'Signal', channels + ['OVERALL'], 'BatteryPercent']
+        elif name == 'met':
+            self.cols = list(MET_COLS)
+        elif name == 'pow':
+            self.cols = ['{0}/{1}'.format(ch, band) for ch in channels for band in BANDS]
+        else:
+            raise ValueError('Unsupported stream ' + name)
+
+    def frame(self, n, t):
+        if self.replay:
+            values = list(self.replay[n % len(self.replay)])
+            if self.name == 'eeg':
+                values[-1] = self.take_markers()
+            return values
+
+        rng = self._rng
+        if self.name == 'eeg':
+            # COUNTER wraps once per second like on the headset
+            counter = n % int(self.rate)
+            values = [counter, 0]
+            for i in range(len(self.channels)):
+                alpha = 20.0 * math.sin(2 * math.pi * 10.0 * t + i)
+                values.append(round(4200.0 + alpha + rng.gauss(0, 5.0), 3))
+            values += [0.0, 0, self.take_markers()]
+            return values
+        if self.name == 'mot':
+            counter = n % int(self.rate)
+            return [counter, 0, 0.5, 0.5, 0.5, -0.5,
+                    rng.gauss(0, 0.01), rng.gauss(0, 0.01), 1.0 + rng.gauss(0, 0.01),
+                    rng.gauss(-76, 1), rng.gauss(-19, 1), rng.gauss(38, 1)]
+        if self.name == 'dev':
+            return [4, 2.0, [4] * len(self.channels) + [100], 80]
+        if self.name == 'met':
+            # slow random walk in [0, 1] for attention, eng, exc, str, rel, int
+            self._met = [min(1.0, max(0.0, v + rng.gauss(0, 0.02))) for v in self._met]
+            attention, eng, exc, stress, rel, interest = [round(v, 6) for v in self._met]
+            return [True, attention, True, eng, True, exc, 0.0, True, stress, True, rel, True, interest]
+        # pow
+        return [round(abs(rng.gauss(3.0, 1.0)), 3) for _ in self.cols]
+
+    def take_markers(self):
+        markers, self.markers = self.markers, []
+        return markers
+
+
+class SimulatedSession():
+    """
+    A session created by a client, with the streams it subscribed and the running record
+    """
+    def __init__(self, session_id, headset, websocket):
+        self.session_id = session_id
+        self.headset = headset
+        self.websocket = websocket
+        self.streams = {}
+        self.tasks = {}
+        self.record = None
+
+
+class CortexSimulator():
+    """
+    A local stand-in for the Emotiv Cortex service.
+
+    It speaks the JSON-RPC subset used by Cortex (hasAccessRight, requestAccess, authorize,
+    controlDevice, queryHeadsets, createSession, updateSession, subscribe, unsubscribe,
+    injectMarker, createRecord, stopRecord, getCortexInfo) and streams synthetic or replayed
+    eeg / mot / dev / met / pow frames. Point a client at it with the url keyword:
+
+        python cortex_simulator.py --port 6868 --speed 10
+        Cortex(client_id, client_secret, url='ws://localhost:6868')
+
+    Attributes
+    ----------
+    headsets : list
+        simulated headsets, each a dictionary as returned by queryHeadsets
+    rates : dict
+        samples per second of device time for each stream
+    speed : float
+        time multiplier. With speed 10 every stream is sent ten times faster than real time
+        and device timestamps advance ten times faster than the wall clock.
+    seed : int
+        seed of the synthetic values, the same seed gives the same streams in every run
+
+    Methods
+    -------
+    serve():
+        Coroutine to accept connections until cancelled.
+    run():
+        To run serve() in a new event loop.
+    stop_all_streams(session_id=None):
+        To drop sessions and send the CORTEX_STOP_ALL_STREAMS warning, as the service does when a headset is lost.
+    """
+    def __init__(self, host='localhost', port=6868, headsets=1, eeg_channels=5, rates=None, speed=1.0,
+                 replay=None, connect_delay=0.5, ssl_context=None, seed=0):
+        self.host = host
+        self.port = port
+        self.channels = channel_names(eeg_channels)
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        if speed <= 0:
+            raise ValueError('Invalid speed {0}.'.format(speed))
+        self.speed = speed
+        # one device clock for every stream and session, advancing speed times faster than the wall clock
+        self._clock_start = time.monotonic()
+        self._device_epoch = time.time()
+        self.connect_delay = connect_delay
+        self.ssl_context = ssl_context
+        self.replay = self.load_replay(replay) if replay else {}
+        self.seed = seed
+
+        self.headsets = []
+        for i in range(headsets):
+            self.headsets.append({
+                'id': 'INSIGHT-SIM{0:04d}'.format(i + 1),
+                'status': 'discovered',
+                'connectedBy': 'dongle',
+                'dongle': '6ff',
+                'firmware': '930',
+                'motionSensors': MOT_COLS[2:],
+                'sensors': list(self.channels),
+                'settings': {'eegRate': int(self.rates['eeg']), 'memsRate': int(self.rates['mot'])},
+                'customName': '',
+            })
+        self.connections = set()
+        self.sessions = {}
+        self.records = {}
+        self.methods = {
+            'hasAccessRight': self.has_access_right,
+            'requestAccess': self.request_access,
+            'authorize': self.authorize,
+            'getCortexInfo': self.get_cortex_info,
+            'controlDevice': self.control_device,
+            'queryHeadsets': self.query_headsets,
+            'createSession': self.create_session,
+            'updateSession': self.update_session,
+            'subscribe': self.subscribe,
+            'unsubscribe': self.unsubscribe,
+            'injectMarker': self.inject_marker,
+            'createRecord': self.create_record,
+            'stopRecord': self.stop_record,
+        }
+
+    @staticmethod
+    def load_replay(path):
+        """
+        Load frames recorded from a Cortex service, one JSON frame per line, for example
+        {"eeg": [...], "sid": "...", "time": 1627457774.5166}
+        Returns a dictionary of stream name -> list of values
+        """
+        frames = {}
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                frame = json.loads(line)
+                for key, values in frame.items():
+                    if key in DEFAULT_RATES:
+                        frames.setdefault(key, []).append(values)
+        return frames
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        async with websockets.serve(self.handle_connection, self.host, self.port,
+                                    ssl=self.ssl_context, max_size=None):
+            scheme = 'wss' if self.ssl_context else 'ws'
+            print('Cortex simulator listening on {0}://{1}:{2}'.format(scheme, self.host, self.port))
+            await asyncio.Future()
+
+    async def handle_connection(self, websocket):
+        print('client connected')
+        self.connections.add(websocket)
+        sessions = []
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                response = self.handle_request(websocket, request, sessions)
+                await websocket.send(json.dumps(response))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(websocket)
+            for session in sessions:
+                self.close_session(session)
+            print('client disconnected')
+
+    def handle_request(self, websocket, request, sessions):
+        req_id = request.get('id')
+        method = self.methods.get(request.get('method'))
+        if method is None:
+            return self.error(req_id, ERROR_METHOD_NOT_FOUND, 'Method not found.')
+        try:
+            result = method(websocket, request.get('params', {}), sessions)
+        except SimulatorError as e:
+            return self.error(req_id, e.code, e.message)
+        return {'id': req_id, 'jsonrpc': '2.0', 'result': result}
+
+    @staticmethod
+    def error(req_id, code, message):
+        return {'id': req_id, 'jsonrpc': '2.0', 'error': {'code': code, 'message': message}}
+
+    def check_token(self, params):
+        if not params.get('cortexToken'):
+            raise SimulatorError(ERROR_INVALID_TOKEN, 'The Cortex token is invalid.')
+
+    def get_session(self, params):
+        session = self.sessions.get(params.get('session'))
+        if session is None:
+            raise SimulatorError(ERROR_SESSION_NOT_FOUND, 'The session does not exist.')
+        return session
+
+    def get_headset(self, headset_id):
+        for headset in self.headsets:
+            if headset['id'] == headset_id:
+                return headset
+        raise SimulatorError(ERROR_HEADSET_NOT_FOUND, 'The headset ' + str(headset_id) + ' does not exist.')
+
+    # --- access and headsets ---
+
+    def has_access_right(self, websocket, params, sessions):
+        return {'accessGranted': True, 'message': 'The User has granted access right to this application.'}
+
+    def request_access(self, websocket, params, sessions):
+        return {'accessGranted': True, 'message': 'The access right to the application has already been granted.'}
+
+    def authorize(self, websocket, params, sessions):
+        return {'cortexToken': 'sim-' + uuid.uuid4().hex, 'warning': {}}
+
+    def get_cortex_info(self, websocket, params, sessions):
+        return {'buildDate': '', 'buildNumber': '', 'version': 'simulator'}
+
+    def query_headsets(self, websocket, params, sessions):
+        headset_id = params.get('id')
+        return [dict(h) for h in self.headsets if headset_id is None or h['id'] == headset_id]
+
+    def control_device(self, websocket, params, sessions):
+        command = params.get('command')
+        if command == 'refresh':
+            return {'command': 'refresh', 'message': 'Refreshing the headset list.'}
+
+        headset = self.get_headset(params.get('headset'))
+        if command == 'connect':
+            if headset['status'] == 'discovered':
+                headset['status'] = 'connecting'
+                asyncio.get_running_loop().call_later(self.connect_delay, self.finish_connect, websocket, headset)
+            return {'command': 'connect', 'message': 'Start connecting to the headset ' + headset['id'] + '.'}
+        if command == 'disconnect':
+            headset['status'] = 'discovered'
+            for session in [s for s in self.sessions.values() if s.headset is headset]:
+                self.close_session(session)
+            return {'command': 'disconnect', 'message': 'The headset ' + headset['id'] + ' is disconnected.'}
+        raise SimulatorError(ERROR_INVALID_PARAMS, 'Unsupported command ' + str(command) + '.')
+
+    def finish_connect(self, websocket, headset):
+        headset['status'] = 'connected'
+        warning = {'warning': {'code': HEADSET_CONNECTED,
+                               'message': {'headsetId': headset['id'], 'behavior': 'Headset is connected.'}}}
+        asyncio.ensure_future(self.send_quietly(websocket, json.dumps(warning)))
+
+    # --- sessions and streams ---
+
+    def create_session(self, websocket, params, sessions):
+        self.check_token(params)
+        headset_id = params.get('headset')
+        if headset_id is None:
+            connected = [h for h in self.headsets if h['status'] == 'connected']
+            if not connected:
+                raise SimulatorError(ERROR_HEADSET_NOT_CONNECTED, 'No headset is connected.')
+            headset = connected[0]
+        else:
+            headset = self.get_headset(headset_id)
+        if headset['status'] != 'connected':
+            raise SimulatorError(ERROR_HEADSET_NOT_CONNECTED, 'The headset ' + headset['id'] + ' is not connected.')
+
+        session = SimulatedSession(str(uuid.uuid4()), headset, websocket)
+        self.sessions[session.session_id] = session
+        sessions.append(session)
+        return {'id': session.session_id, 'status': 'activated', 'headset': dict(headset),
+                'appId': 'com.simulator', 'owner': 'simulator', 'started': utc_now(), 'recordIds': []}
+
+    def update_session(self, websocket, params, sessions):
+        session = self.get_session(params)
+        if params.get('status') == 'close':
+            self.close_session(session)
+            if session in sessions:
+                sessions.remove(session)
+            return {'id': session.session_id, 'status': 'closed', 'headset': dict(session.headset)}
+        return {'id': session.session_id, 'status': 'activated', 'headset': dict(session.headset)}
+
+    def close_session(self, session):
+        for task in session.tasks.values():
+            task.cancel()
+        session.tasks = {}
+        session.streams = {}
+        self.sessions.pop(session.session_id, None)
+
+    def subscribe(self, websocket, params, sessions):
+        self.check_token(params)
+        session = self.get_session(params)
+        success = []
+        failure = []
+        for name in params.get('streams', []):
+            if name not in self.rates:
+                failure.append({'streamName': name, 'code': -32016, 'message': 'The stream is unavailable or unsupported.'})
+                continue
+            if name not in session.streams:
+                stream = SimulatedStream(name, self.rates[name], self.channels, self.replay.get(name), seed=self.seed)
+                session.streams[name] = stream
+                session.tasks[name] = asyncio.ensure_future(self.stream_loop(websocket, session, stream))
+            success.append({'streamName': name, 'cols': session.streams[name].cols, 'sid': session.session_id})
+        return {'success': success, 'failure': failure}
+
+    def unsubscribe(self, websocket, params, sessions):
+        session = self.get_session(params)
+        success = []
+        failure = []
+        for name in params.get('streams', []):
+            if name not in session.streams:
+                failure.append({'streamName': name, 'code': -32016, 'message': 'The stream is not subscribed.'})
+                continue
+            session.streams.pop(name)
+            session.tasks.pop(name).cancel()
+            success.append({'streamName': name, 'message': 'Unsubscription successful.', 'sid': session.session_id})
+        return {'success': success, 'failure': failure}
+
+    def device_time(self):
+        return self._device_epoch + (time.monotonic() - self._clock_start) * self.speed
+
+    async def stream_loop(self, websocket, session, stream):
+        # frames are sent in bursts, each burst catches up with the samples due at this moment
+        rate = stream.rate * self.speed
+        interval = max(0.001, min(0.01, 1.0 / rate))
+        start = time.monotonic()
+        # samples are numbered on the device clock, so times and counters continue across sessions
+        first = int((self.device_time() - self._device_epoch) * stream.rate) + 1
+        n = 0
+        try:
+            while True:
+                due = int((time.monotonic() - start) * rate) + 1
+                while n < due:
+                    t = self._device_epoch + (first + n) / stream.rate
+                    frame = {stream.name: stream.frame(first + n, t), 'sid': session.session_id, 'time': round(t, 4)}
+                    await websocket.send(json.dumps(frame))
+                    n += 1
+                await asyncio.sleep(interval)
+        except websockets.ConnectionClosed:
+            pass
+
+    def stop_all_streams(self, session_id=None):
+        """
+        To drop one session, or every session, and warn the owning clients like the service does
+        when the headset connection is lost
+        """
+        for session in list(self.sessions.values()):
+            if session_id is not None and session.session_id != session_id:
+                continue
+            self.close_session(session)
+            warning = {'warning': {'code': CORTEX_STOP_ALL_STREAMS,
+                                   'message': {'sessionId': session.session_id,
+                                               'behavior': 'All subscriptions of the session were stopped.'}}}
+            asyncio.ensure_future(self.send_quietly(session.websocket, json.dumps(warning)))
+
+    @staticmethod
+    async def send_quietly(websocket, message):
+        try:
+            await websocket.send(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    # --- markers and records ---
+
+    def inject_marker(self, websocket, params, sessions):
+        session = self.get_session(params)
+        marker = {'uuid': str(uuid.uuid4()), 'type': 'instance', 'label': params.get('label'),
+                  'value': params.get('value'), 'port': params.get('port'),
+                  'startDatetime': utc_now(), 'extras': {}}
+        eeg = session.streams.get('eeg')
+        if eeg is not None:
+            eeg.markers.append({'label': marker['label'], 'value': marker['value'],
+                                'port': marker['port'], 'time': params.get('time')})
+        return {'marker': marker}
+
+    def create_record(self, websocket, params, sessions):
+        session = self.get_session(params)
+        record = {'uuid': str(uuid.uuid4()), 'title': params.get('title'),
+                  'description': params.get('description', ''), 'startDatetime': utc_now(),
+                  'endDatetime': '', 'markers': []}
+        session.record = record
+        self.records[record['uuid']] = record
+        return {'record': record, 'sessionId': session.session_id}
+
+    def stop_record(self, websocket, params, sessions):
+        session = self.get_session(params)
+        if session.record is None:
+            raise SimulatorError(ERROR_INVALID_PARAMS, 'There is no record in the session.')
+        record, session.record = session.record, None
+        record['endDatetime'] = utc_now()
+        return {'record': record, 'sessionId': session.session_id}
+
+
+class SimulatorError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def parse_rates(items):
+    rates = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        if name not in DEFAULT_RATES or not value:
+            raise argparse.ArgumentTypeError('Invalid rate ' + item + ', expected for example eeg=256')
+        rates[name] = float(value)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Emotiv Cortex service simulator')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6868)
+    parser.add_argument('--headsets', type=int, default=1, help='number of simulated headsets')
+    parser.add_argument('--eeg-channels', type=int, default=5, help='number of eeg channels')
+    parser.add_argument('--rate', action='append', metavar='STREAM=HZ', help='sample rate of a stream, for example eeg=256')
+    parser.add_argument('--speed', type=float, default=1.0, help='multiple of real time to stream at')
+    parser.add_argument('--replay', help='file with one recorded JSON frame per line')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated stream values')
+    parser.add_argument('--certfile', help='certificate to serve wss:// instead of ws://')
+    parser.add_argument('--keyfile', help='private key of the certificate')
+    args = parser.parse_args()
+
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+
+    simulator = CortexSimulator(args.host, args.port, headsets=args.headsets, eeg_channels=args.eeg_channels,
+                                rates=parse_rates(args.rate), speed=args.speed, replay=args.replay,
+                                ssl_context=ssl_context, seed=args.seed)
+    simulator.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import collections
+import queue
+import threading
+
+# overflow policies of a StreamQueue
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_LATEST = 'latest'
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_LATEST)
+
+
+class StreamQueue():
+    """
+    A bounded queue of pending handler calls for one stream
+
+    Attributes
+    ----------
+    stream_name : string
+        name of the stream, for example 'met'
+    maxsize : int
+        maximum number of pending calls
+    policy : string
+        what put does when the queue is full:
+        'block' waits for a worker to make room, so the producer slows down,
+        'drop_oldest' discards the oldest pending call,
+        'latest' keeps only the newest call, older ones are coalesced away
+    put_count, delivered, dropped, max_depth : int
+        counters since creation
+    """
+    def __init__(self, stream_name, maxsize=1024, policy=POLICY_BLOCK):
+        if policy not in POLICIES:
+            raise ValueError('Invalid policy {0} for stream {1}. Use one of {2}.'.format(policy, stream_name, POLICIES))
+        if maxsize <= 0:
+            raise ValueError('Invalid maxsize {0} for stream {1}.'.format(maxsize, stream_name))
+        self.stream_name = stream_name
+        self.maxsize = 1 if policy == POLICY_LATEST else maxsize
+        self.policy = policy
+        self.items = collections.deque()
+        self.cond = threading.Condition()
+        # True while the queue is in the ready queue or a worker drains it
+        self.scheduled = False
+        self.put_count = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def depth(self):
+        return len(self.items)
+
+    def stats(self):
+        with self.cond:
+            return {'depth': len(self.items), 'max_depth': self.max_depth, 'maxsize': self.maxsize,
+                    'policy': self.policy, 'put': self.put_count, 'delivered': self.delivered,
+                    'dropped': self.dropped}
+
+
+class QueuedHandler():
+    """
+    A handler bound to Cortex events in place of the real one, see DispatchQueue.wrap
+    """
+    def __init__(self, dispatch, stream_queue, func):
+        self.dispatch = dispatch
+        self.stream_queue = stream_queue
+        self.func = func
+
+    def put(self, *args, **kwargs):
+        self.dispatch.put(self.stream_queue, self.func, args, kwargs)
+
+
+class DispatchQueue():
+    """
+    Delivers Cortex events to handlers on a pool of worker threads, so a slow handler never
+    delays the websocket receive thread.
+
+    Every stream has its own bounded queue with an overflow policy. Calls of one stream run in
+    order and never concurrently; calls of different streams run in parallel on the workers.
+
+        dispatch = DispatchQueue(workers=2)
+        cortex.bind(new_met_data=dispatch.wrap('met', on_new_met_data, policy='block'))
+        cortex.bind(new_pow_data=dispatch.wrap('pow', on_new_pow_data, maxsize=1, policy='latest'))
+
+    Methods
+    -------
+    wrap(stream_name, func, maxsize=1024, policy='block'):
+        To get a handler to bind instead of func.
+    stats(stream_name=None):
+        To get queue depth and put / delivered / dropped counters.
+    shutdown(drain=True):
+        To stop the workers, optionally after every pending call ran.
+    """
+    # calls a worker runs from one stream before it gives other streams a turn
+    BATCH = 64
+
+    def __init__(self, workers=1, name='DispatchWorker'):
+        if workers <= 0:
+            raise ValueError('Invalid number of workers {0}.'.format(workers))
+        self.name = name
+        self.queues = {}
+        # pydispatch keeps weak references only, the wrappers live here
+        self.handlers = []
+        self._ready = queue.Queue()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name='{0}-{1}'.format(name, i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wrap(self, stream_name, func, maxsize=1024, policy=POLICY_BLOCK):
+        """
+        To route the calls of func through the queue of a stream
+
+        Parameters
+        ----------
+        stream_name : string, required
+            queue to use. Handlers wrapped with the same name share its queue and order.
+        func : callable, required
+            the real handler
+        maxsize, policy : optional
+            used when the queue of the stream is created, see StreamQueue
+
+        Returns
+        -------
+        a bound method to pass to Cortex.bind
+        """
+        stream_queue = self.queues.get(stream_name)
+        if stream_queue is None:
+            stream_queue = StreamQueue(stream_name, maxsize, policy)
+            self.queues[stream_name] = stream_queue
+        handler = QueuedHandler(self, stream_queue, func)
+        self.handlers.append(handler)
+        return handler.put
+
+    def put(self, stream_queue, func, args, kwargs):
+        with stream_queue.cond:
+            items = stream_queue.items
+            if len(items) >= stream_queue.maxsize:
+                if stream_queue.policy == POLICY_BLOCK:
+                    while len(items) >= stream_queue.maxsize:
+                        stream_queue.cond.wait()
+                else:
+                    items.popleft()
+                    stream_queue.dropped += 1
+            items.append((func, args, kwargs))
+            stream_queue.put_count += 1
+            if len(items) > stream_queue.max_depth:
+                stream_queue.max_depth = len(items)
+            if stream_queue.scheduled:
+                return
+            stream_queue.scheduled = True
+        self._ready.put(stream_queue)
+
+    def _run(self):
+        while True:
+            stream_queue = self._ready.get()
+            if stream_queue is None:
+                return
+            for _ in range(self.BATCH):
+                with stream_queue.cond:
+                    if not stream_queue.items:
+                        stream_queue.scheduled = False
+                        break
+                    func, args, kwargs = stream_queue.items.popleft()
+                    stream_queue.cond.notify_all()
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    print('{0}: handler {1} of stream {2} failed: {3}'.format(self.name, func, stream_queue.stream_name, e))
+                with stream_queue.cond:
+                    stream_queue.delivered += 1
+            else:
+                # batch used up, queue again behind the other streams
+                with stream_queue.cond:
+                    if not stream_queue.items:
+                        stream_queue.scheduled = False
+                        continue
+                self._ready.put(stream_queue)
+
+    def stats(self, stream_name=None):
+        names = [stream_name] if stream_name is not None else list(self.queues)
+        return {name: self.queues[name].stats() for name in names if name in self.queues}
+
+    def shutdown(self, drain=True):
+        if drain:
+            for stream_queue in list(self.queues.values()):
+                with stream_queue.cond:
+                    while stream_queue.items or stream_queue.scheduled:
+                        stream_queue.cond.wait(0.1)
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
@@ -0,0 +1,240 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pydispatch import Dispatcher
+from scipy import fft
+from scipy.signal import get_window
+
+from stream_buffer import StreamRingBuffer
+
+# frequency bands in Hz, theta to gamma as in the Cortex pow stream
+DEFAULT_BANDS = {
+    'delta': (1.0, 4.0),
+    'theta': (4.0, 8.0),
+    'alpha': (8.0, 12.0),
+    'betaL': (12.0, 16.0),
+    'betaH': (16.0, 25.0),
+    'gamma': (25.0, 45.0),
+}
+# name -> (numerator bands, denominator bands)
+DEFAULT_RATIOS = {
+    'theta/beta': (('theta',), ('betaL', 'betaH')),
+    'alpha/theta': (('alpha',), ('theta',)),
+    'engagement': (('betaL', 'betaH'), ('alpha', 'theta')),
+}
+# columns of the eeg stream that are not electrodes
+NON_EEG_LABELS = ('COUNTER', 'INTERPOLATED', 'RAW_CQ', 'MARKER_HARDWARE', 'MARKERS')
+
+
+class WelchSpectrum():
+    """
+    Welch power spectral density of all channels of a window in one call
+
+    The Hann window, frequency masks and scaling are computed once, so compute() is a strided
+    view, one real FFT and a few reductions.
+
+    Attributes
+    ----------
+    freqs : numpy array
+        frequency of each PSD bin in Hz
+    """
+    def __init__(self, fs, nperseg, noverlap=None):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = nperseg - (nperseg // 2 if noverlap is None else noverlap)
+        self.window = get_window('hann', nperseg).astype(np.float64)
+        self.freqs = fft.rfftfreq(nperseg, 1.0 / fs)
+        scale = 1.0 / (fs * np.sum(self.window ** 2))
+        # one-sided density: every bin but DC and Nyquist counts twice
+        self.scale = np.full(len(self.freqs), 2.0 * scale)
+        self.scale[0] = scale
+        if nperseg % 2 == 0:
+            self.scale[-1] = scale
+
+    def compute(self, x):
+        """
+        Parameters
+        ----------
+        x : numpy array of shape (n_samples, n_channels), n_samples >= nperseg
+
+        Returns
+        -------
+        psd : numpy array of shape (n_channels, n_freqs)
+        """
+        # (n_channels, n_segments, nperseg)
+        segments = sliding_window_view(x.T, self.nperseg, axis=1)[:, ::self.step]
+        segments = segments - segments.mean(axis=2, keepdims=True)
+        spectrum = fft.rfft(segments * self.window, axis=2)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        return power.mean(axis=1) * self.scale
+
+
+class EEGFeatureEngine(Dispatcher):
+    """
+    Computes spectral features of raw EEG over a sliding window, every hop seconds.
+
+    For all channels at once it gives the Welch PSD, absolute and relative band powers,
+    band power ratios such as theta/beta, and the normalized spectral entropy.
+
+        engine = EEGFeatureEngine(window=2.0, hop=0.25)
+        engine.attach(cortex)                      # or attach(multi, headset_id='INSIGHT-...')
+        engine.bind(new_eeg_features=on_features)
+
+    The samples are read from the eeg ring buffer of Cortex when it has one (ring_buffer={'eeg': ...}),
+    otherwise the engine keeps its own buffer fed from new_eeg_data or new_eeg_block.
+
+    Attributes
+    ----------
+    latest : dictionary
+        the last features emitted, None before the first window is full
+
+    Methods
+    -------
+    attach(cortex, headset_id=None):
+        To compute features of the eeg stream of a Cortex.
+    compute(x, time=None):
+        To compute the features of a window of shape (n_samples, n_channels).
+    update():
+        To compute and emit features if a hop of new samples arrived.
+    """
+    _events_ = ['new_eeg_features']
+
+    def __init__(self, fs=128.0, window=2.0, hop=0.25, segment=1.0, bands=None, ratios=None,
+                 entropy_range=(1.0, 45.0)):
+        self.fs = fs
+        self.window_samples = int(round(window * fs))
+        self.hop_samples = max(1, int(round(hop * fs)))
+        nperseg = min(self.window_samples, int(round(segment * fs)))
+        self.welch = WelchSpectrum(fs, nperseg)
+        self.bands = dict(DEFAULT_BANDS if bands is None else bands)
+        self.ratios = dict(DEFAULT_RATIOS if ratios is None else ratios)
+        self.band_names = list(self.bands)
+
+        freqs = self.welch.freqs
+        df = freqs[1] - freqs[0]
+        # (n_bands, n_freqs) weights, band power = psd @ weights.T
+        self.band_weights = np.array([((freqs >= lo) & (freqs < hi)) * df for lo, hi in self.bands.values()])
+        self.ratio_index = {name: ([self.band_names.index(b) for b in num], [self.band_names.index(b) for b in den])
+                            for name, (num, den) in self.ratios.items()}
+        self.entropy_mask = (freqs >= entropy_range[0]) & (freqs <= entropy_range[1])
+
+        self.buffer = None
+        self.channels = []
+        self.channel_cols = None
+        self.headset_id = None
+        self.latest = None
+        self._own_buffer = False
+        self._cortex = None
+        self._last_total = 0
+
+    def compute(self, x, time=None):
+        """
+        To compute the features of one window
+
+        Parameters
+        ----------
+        x : numpy array of shape (n_samples, n_channels)
+        time : float, optional
+            Cortex time of the last sample
+
+        Returns
+        -------
+        dictionary, for example
+            {'time': 1627457774.5, 'channels': ['AF3', ...], 'bands': ['delta', ...],
+             'freqs': array, 'psd': array (n_channels, n_freqs),
+             'band_power': array (n_channels, n_bands), 'relative_power': array (n_channels, n_bands),
+             'ratios': {'theta/beta': array (n_channels,), ...}, 'spectral_entropy': array (n_channels,)}
+        """
+        psd = self.welch.compute(np.asarray(x, dtype=np.float64))
+        band_power = psd @ self.band_weights.T
+        total = band_power.sum(axis=1, keepdims=True)
+        relative = np.divide(band_power, total, out=np.zeros_like(band_power), where=total > 0)
+
+        ratios = {}
+        for name, (num, den) in self.ratio_index.items():
+            n = band_power[:, num].sum(axis=1)
+            d = band_power[:, den].sum(axis=1)
+            ratios[name] = np.divide(n, d, out=np.full_like(n, np.nan), where=d > 0)
+
+        p = psd[:, self.entropy_mask]
+        p_sum = p.sum(axis=1, keepdims=True)
+        p = np.divide(p, p_sum, out=np.zeros_like(p), where=p_sum > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -np.where(p > 0, p * np.log(p), 0.0).sum(axis=1) / np.log(p.shape[1])
+
+        return {'time': time, 'channels': self.channels, 'bands': self.band_names, 'freqs': self.welch.freqs,
+                'psd': psd, 'band_power': band_power, 'relative_power': relative, 'ratios': ratios,
+                'spectral_entropy': entropy}
+
+    def attach(self, cortex, headset_id=None):
+        self._cortex = cortex
+        self.headset_id = headset_id
+        cortex.bind(new_data_labels=self.on_new_data_labels)
+        cortex.bind(new_eeg_data=self.on_new_eeg_data)
+        cortex.bind(new_eeg_block=self.on_new_eeg_block)
+        cortex.stream_taps.append(self.on_stream_frame)
+
+    def own_event(self, data):
+        return self.headset_id is None or data.get('headset') == self.headset_id
+
+    def on_new_data_labels(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if data['streamName'] != 'eeg' or not self.own_event(data):
+            return
+        labels = list(data['labels'])
+        self.channel_cols = [i for i, label in enumerate(labels) if label not in NON_EEG_LABELS]
+        self.channels = [labels[i] for i in self.channel_cols]
+
+        if self.headset_id is None:
+            buffer = self._cortex.get_buffer('eeg')
+        else:
+            buffer = self._cortex.get_buffer('eeg', self.headset_id)
+        self._own_buffer = buffer is None or buffer.capacity < self.window_samples
+        if self._own_buffer:
+            buffer = StreamRingBuffer('eeg', labels, 4 * self.window_samples)
+        self.buffer = buffer
+        self._last_total = buffer.total
+
+    def on_stream_frame(self, stream_name, frame):
+        # streams in suppress_samples emit no per sample event; taps run before the frame is stored,
+        # so features computed on the Cortex buffer lag the newest sample by one frame
+        if stream_name != 'eeg' or self.buffer is None or self._cortex.sample_mode('eeg') != 'buffer':
+            return
+        if self.headset_id is not None and self._cortex.headset_id != self.headset_id:
+            return
+        if self._own_buffer:
+            self.buffer.append(frame['time'], frame['eeg'])
+        self.update()
+
+    def on_new_eeg_data(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.buffer is None or not self.own_event(data):
+            return
+        # in block mode the same samples arrive again as new_eeg_block
+        if self._cortex.sample_mode('eeg') == 'block':
+            return
+        if self._own_buffer:
+            self.buffer.append(data['time'], data['eeg'])
+        self.update()
+
+    def on_new_eeg_block(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.buffer is None or not self.own_event(data):
+            return
+        if self._own_buffer:
+            self.buffer.extend(data['time'], data['data'])
+        self.update()
+
+    def update(self):
+        buffer = self.buffer
+        if buffer is None or buffer.size < self.window_samples:
+            return None
+        if buffer.total - self._last_total < self.hop_samples:
+            return None
+        self._last_total = buffer.total
+        times, data = buffer.latest(self.window_samples)
+        features = self.compute(data[:, self.channel_cols], float(times[-1]))
+        if self.headset_id is not None:
+            features['headset'] = self.headset_id
+        self.latest = features
+        self.emit('new_eeg_features', data=features)
+        return features
@@ -0,0 +1,198 @@
+import numpy as np
+from pydispatch import Dispatcher
+from scipy import signal
+
+from eeg_features import NON_EEG_LABELS
+
+
+def design_sos(fs, bandpass=(1.0, 45.0), notch=50.0, notch_q=30.0, dc_remove=True, order=4, dc_pole=0.995):
+    """
+    To design the cascade of second order sections applied by StreamingFilter
+
+    Parameters
+    ----------
+    fs : float, required
+        sample rate in Hz
+    bandpass : (low, high) in Hz, optional
+        Butterworth band-pass edges. None to skip, low None for a low-pass, high None for a high-pass
+    notch : float or list, optional
+        line frequency in Hz, for example 50 or 60, or a list such as [50, 100]. None to skip
+    notch_q : float, optional
+        quality factor of the notch
+    dc_remove : bool, optional
+        add a DC blocker y[n] = x[n] - x[n-1] + dc_pole * y[n-1]
+    order : int, optional
+        Butterworth order
+
+    Returns
+    -------
+    sos: numpy array of shape (n_sections, 6)
+    """
+    sections = []
+    if dc_remove:
+        sections.append(np.array([[1.0, -1.0, 0.0, 1.0, -dc_pole, 0.0]]))
+    if bandpass is not None:
+        low, high = bandpass
+        if low is not None and high is not None:
+            sections.append(signal.butter(order, [low, high], btype='bandpass', fs=fs, output='sos'))
+        elif low is not None:
+            sections.append(signal.butter(order, low, btype='highpass', fs=fs, output='sos'))
+        elif high is not None:
+            sections.append(signal.butter(order, high, btype='lowpass', fs=fs, output='sos'))
+    if notch is not None:
+        for f0 in np.atleast_1d(notch):
+            if f0 < fs / 2:
+                b, a = signal.iirnotch(f0, notch_q, fs=fs)
+                sections.append(signal.tf2sos(b, a))
+    if not sections:
+        raise ValueError('No filter configured.')
+    return np.vstack(sections)
+
+
+class StreamingFilter():
+    """
+    Filters blocks of multichannel samples with an SOS cascade, keeping the filter state
+    between blocks.
+
+    Filtering a recording block by block gives the same samples as filtering it at once:
+        f = StreamingFilter(128, n_channels=5)
+        y = np.vstack([f.process(block) for block in blocks])
+        y == signal.sosfilt(f.sos, x, axis=0, zi=f.initial_state(x[0]))
+
+    Attributes
+    ----------
+    sos : numpy array of shape (n_sections, 6)
+        the filter, see design_sos
+    zi : numpy array of shape (n_sections, 2, n_channels)
+        filter state, None until the first block
+
+    Methods
+    -------
+    process(block):
+        To filter a block of shape (n_samples, n_channels).
+    reset():
+        To restart from the next block, for example after a gap in the stream.
+    """
+    def __init__(self, fs, n_channels, settle=True, **design):
+        self.fs = fs
+        self.n_channels = n_channels
+        self.settle = settle
+        self.sos = design_sos(fs, **design)
+        self._zi_step = signal.sosfilt_zi(self.sos)
+        self.zi = None
+
+    def initial_state(self, first):
+        """
+        The state the first block starts from. With settle, the filter starts as if the first sample
+        had always been there, so the large electrode offset does not ring through the output.
+        """
+        first = np.asarray(first, dtype=np.float64)
+        if self.settle:
+            return self._zi_step[:, :, np.newaxis] * first[np.newaxis, np.newaxis, :]
+        return np.zeros((len(self.sos), 2, self.n_channels))
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[np.newaxis, :]
+        if len(block) == 0:
+            return block
+        if self.zi is None:
+            self.zi = self.initial_state(block[0])
+        out, self.zi = signal.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return out
+
+    def reset(self):
+        self.zi = None
+
+
+class EEGFilterStage(Dispatcher):
+    """
+    Filters the electrode columns of the eeg stream of a Cortex and emits the result.
+
+        stage = EEGFilterStage(bandpass=(1, 40), notch=50)
+        stage.attach(cortex)
+        stage.bind(new_eeg_filtered_block=on_block, new_eeg_filtered_data=on_sample)
+
+    new_eeg_filtered_block is emitted for every new_eeg_block (block mode), with the same keys
+    and 'labels' reduced to the electrodes. new_eeg_filtered_data is emitted for every
+    new_eeg_data, or every tapped frame when eeg is only kept in the Cortex ring buffer, as
+    {'eeg': [filtered electrode values], 'time': ...}. The filter state is reset
+    when the stream is subscribed again or a gap is reported.
+
+    Methods
+    -------
+    attach(cortex, headset_id=None):
+        To filter the eeg stream of a Cortex, or of one headset of MultiHeadsetCortex.
+    """
+    _events_ = ['new_eeg_filtered_block', 'new_eeg_filtered_data']
+
+    def __init__(self, fs=128.0, **design):
+        self.fs = fs
+        self.design = design
+        self.filter = None
+        self.channels = []
+        self.channel_cols = None
+        self.headset_id = None
+        self._cortex = None
+
+    def attach(self, cortex, headset_id=None):
+        self._cortex = cortex
+        self.headset_id = headset_id
+        cortex.bind(new_data_labels=self.on_new_data_labels)
+        cortex.bind(new_eeg_data=self.on_new_eeg_data)
+        cortex.bind(new_eeg_block=self.on_new_eeg_block)
+        cortex.bind(stream_gap=self.on_stream_gap)
+        cortex.stream_taps.append(self.on_stream_frame)
+
+    def own_event(self, data):
+        return self.headset_id is None or data.get('headset') == self.headset_id
+
+    def on_new_data_labels(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if data['streamName'] != 'eeg' or not self.own_event(data):
+            return
+        labels = list(data['labels'])
+        self.channel_cols = [i for i, label in enumerate(labels) if label not in NON_EEG_LABELS]
+        self.channels = [labels[i] for i in self.channel_cols]
+        self.filter = StreamingFilter(self.fs, len(self.channels), **self.design)
+
+    def on_stream_gap(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if data['streamName'] == 'eeg' and self.filter is not None and self.own_event(data):
+            self.filter.reset()
+
+    def on_new_eeg_block(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.filter is None or not self.own_event(data):
+            return
+        filtered = self.filter.process(data['data'][:, self.channel_cols])
+        block = {'streamName': 'eeg', 'labels': self.channels, 'time': data['time'], 'data': filtered}
+        if self.headset_id is not None:
+            block['headset'] = self.headset_id
+        self.emit('new_eeg_filtered_block', data=block)
+
+    def on_stream_frame(self, stream_name, frame):
+        # streams in suppress_samples emit no per sample event, filter their frames here
+        if stream_name != 'eeg' or self.filter is None or self._cortex.sample_mode('eeg') != 'buffer':
+            return
+        if self.headset_id is not None and self._cortex.headset_id != self.headset_id:
+            return
+        self.filter_sample(frame['time'], frame['eeg'])
+
+    def on_new_eeg_data(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.filter is None or not self.own_event(data):
+            return
+        # in block mode the same samples arrive again as new_eeg_block
+        if self._cortex.sample_mode('eeg') == 'block':
+            return
+        self.filter_sample(data['time'], data['eeg'])
+
+    def filter_sample(self, time, values):
+        sample = [values[i] for i in self.channel_cols]
+        filtered = self.filter.process(sample)[0]
+        result = {'eeg': filtered.tolist(), 'time': time}
+        if self.headset_id is not None:
+            result['headset'] = self.headset_id
+        self.emit('new_eeg_filtered_data', data=result)
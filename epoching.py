@@ -0,0 +1,235 @@
+import numpy as np
+from pydispatch import Dispatcher
+
+from eeg_features import NON_EEG_LABELS
+from stream_buffer import StreamRingBuffer
+
+
+class RunningAverage():
+    """
+    The average of the epochs of one marker label, updated one epoch at a time
+
+    Attributes
+    ----------
+    count : int
+        number of epochs averaged
+    mean : numpy array of shape (n_samples, n_channels)
+    """
+    def __init__(self, label, shape):
+        self.label = label
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+
+    def add(self, epoch):
+        self.count += 1
+        # a new array, so averages emitted earlier with new_erp keep their values
+        self.mean = self.mean + (epoch - self.mean) / self.count
+
+
+class EpochingService(Dispatcher):
+    """
+    Cuts EEG epochs around markers as soon as their samples arrive and keeps the running
+    average (ERP) of every marker label.
+
+    Markers injected with Cortex.inject_marker_request come back in the MARKERS column of the eeg
+    stream and are picked up at the sample they were stamped on. Markers from elsewhere can be
+    added with add_marker(time, label).
+
+        epochs = EpochingService(tmin=-0.2, tmax=0.8, baseline=(None, 0.0))
+        epochs.attach(cortex)
+        epochs.bind(new_epoch=on_epoch, new_erp=on_erp)
+        cortex.inject_marker_request(time.time() * 1000, 1, 'stimulus')
+
+    new_epoch is emitted for every epoch:
+        {'label': 'stimulus', 'value': 1, 'time': 1627457774.5, 'times': array (n_samples,),
+         'channels': ['AF3', ...], 'data': array (n_samples, n_channels)}
+    and new_erp right after it with the updated average of the label:
+        {'label': 'stimulus', 'count': 12, 'times': array, 'channels': [...], 'data': array}
+
+    Attributes
+    ----------
+    pending : list
+        markers waiting for their post-marker samples, sorted by time
+    averages : dictionary
+        marker label -> RunningAverage
+
+    Methods
+    -------
+    attach(cortex, headset_id=None):
+        To cut epochs from the eeg stream of a Cortex, or of one headset of MultiHeadsetCortex.
+    add_marker(time, label, value=None):
+        To cut an epoch around a Cortex time in seconds.
+    erp(label):
+        To get the current average of a label, None before its first epoch.
+    reset(label=None):
+        To clear the average of one label, or of all of them.
+    """
+    _events_ = ['new_epoch', 'new_erp']
+
+    def __init__(self, fs=128.0, tmin=-0.2, tmax=0.8, baseline=(None, 0.0), buffer_seconds=10.0):
+        if tmax <= tmin:
+            raise ValueError('tmax must be greater than tmin.')
+        self.fs = fs
+        self.tmin = tmin
+        self.tmax = tmax
+        self.baseline = baseline
+        self.n_samples = int(round((tmax - tmin) * fs))
+        # sample times relative to the marker
+        self.times = tmin + np.arange(self.n_samples) / fs
+        if baseline is not None:
+            lo = tmin if baseline[0] is None else baseline[0]
+            hi = tmax if baseline[1] is None else baseline[1]
+            self.baseline_mask = (self.times >= lo) & (self.times <= hi)
+            if not self.baseline_mask.any():
+                raise ValueError('The baseline {0} has no samples in the epoch.'.format(baseline))
+        self.buffer_samples = max(int(buffer_seconds * fs), 2 * self.n_samples)
+
+        self.pending = []
+        self.averages = {}
+        self.buffer = None
+        self.channels = []
+        self.channel_cols = None
+        self.headset_id = None
+        self._own_buffer = False
+        self._cortex = None
+
+    def add_marker(self, time, label, value=None):
+        self.add_pending(time, label, value)
+        self.update()
+
+    def add_pending(self, time, label, value):
+        self.pending.append((float(time), label, value))
+        if len(self.pending) > 1 and self.pending[-2][0] > self.pending[-1][0]:
+            self.pending.sort(key=lambda marker: marker[0])
+
+    def erp(self, label):
+        average = self.averages.get(label)
+        if average is None or average.count == 0:
+            return None
+        return {'label': label, 'count': average.count, 'times': self.times, 'channels': self.channels,
+                'data': average.mean}
+
+    def reset(self, label=None):
+        if label is None:
+            self.averages = {}
+        else:
+            self.averages.pop(label, None)
+
+    def cut(self, time):
+        """
+        To get the baseline corrected epoch around a marker time
+
+        Returns
+        -------
+        numpy array of shape (n_samples, n_channels), None when samples are missing
+        """
+        times, data = self.buffer.window_by_time(time + self.tmin - 0.5 / self.fs, time + self.tmax + 0.5 / self.fs)
+        if len(times) < self.n_samples:
+            return None
+        epoch = np.array(data[:self.n_samples, self.channel_cols], dtype=np.float64)
+        # a gap inside the window shows as a last sample far beyond tmax
+        if times[self.n_samples - 1] - time > self.tmax + 1.5 / self.fs:
+            return None
+        if self.baseline is not None:
+            epoch -= epoch[self.baseline_mask].mean(axis=0)
+        return epoch
+
+    def update(self):
+        buffer = self.buffer
+        if buffer is None or buffer.size == 0 or not self.pending:
+            return
+        times, _ = buffer.latest()
+        oldest, newest = times[0], times[-1]
+        while self.pending and self.pending[0][0] + self.tmax <= newest:
+            time, label, value = self.pending.pop(0)
+            if time + self.tmin < oldest:
+                print('epoching: marker {0} at {1} is older than the buffered eeg, dropped'.format(label, time))
+                continue
+            epoch = self.cut(time)
+            if epoch is None:
+                print('epoching: eeg samples missing around marker {0} at {1}, dropped'.format(label, time))
+                continue
+            self.emit_epoch(time, label, value, epoch)
+
+    def emit_epoch(self, time, label, value, epoch):
+        average = self.averages.get(label)
+        if average is None:
+            average = self.averages[label] = RunningAverage(label, epoch.shape)
+        average.add(epoch)
+
+        result = {'label': label, 'value': value, 'time': time, 'times': self.times,
+                  'channels': self.channels, 'data': epoch}
+        erp = self.erp(label)
+        if self.headset_id is not None:
+            result['headset'] = self.headset_id
+            erp['headset'] = self.headset_id
+        self.emit('new_epoch', data=result)
+        self.emit('new_erp', data=erp)
+
+    # --- Cortex events ---
+
+    def attach(self, cortex, headset_id=None):
+        self._cortex = cortex
+        self.headset_id = headset_id
+        cortex.bind(new_data_labels=self.on_new_data_labels)
+        cortex.bind(new_eeg_data=self.on_new_eeg_data)
+        cortex.bind(new_eeg_block=self.on_new_eeg_block)
+        cortex.stream_taps.append(self.on_stream_frame)
+
+    def own_event(self, data):
+        return self.headset_id is None or data.get('headset') == self.headset_id
+
+    def on_new_data_labels(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if data['streamName'] != 'eeg' or not self.own_event(data):
+            return
+        labels = list(data['labels'])
+        self.channel_cols = [i for i, label in enumerate(labels) if label not in NON_EEG_LABELS]
+        self.channels = [labels[i] for i in self.channel_cols]
+        self.averages = {}
+
+        if self.headset_id is None:
+            buffer = self._cortex.get_buffer('eeg')
+        else:
+            buffer = self._cortex.get_buffer('eeg', self.headset_id)
+        self._own_buffer = buffer is None or buffer.capacity < 2 * self.n_samples
+        if self._own_buffer:
+            buffer = StreamRingBuffer('eeg', labels, self.buffer_samples)
+        self.buffer = buffer
+
+    def on_stream_frame(self, stream_name, frame):
+        if stream_name != 'eeg':
+            return
+        if self.headset_id is not None and self._cortex.headset_id != self.headset_id:
+            return
+        # injected markers arrive in the MARKERS column, the last one of the eeg frame
+        markers = frame['eeg'][-1]
+        if isinstance(markers, list):
+            for marker in markers:
+                if isinstance(marker, dict):
+                    self.add_pending(frame['time'], marker.get('label'), marker.get('value'))
+        # streams in suppress_samples emit no per sample event, the frame is stored after the taps
+        if self.buffer is None or self._cortex.sample_mode('eeg') != 'buffer':
+            return
+        if self._own_buffer:
+            self.buffer.append(frame['time'], frame['eeg'])
+        self.update()
+
+    def on_new_eeg_data(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.buffer is None or not self.own_event(data):
+            return
+        # in block mode the same samples arrive again as new_eeg_block
+        if self._cortex.sample_mode('eeg') == 'block':
+            return
+        if self._own_buffer:
+            self.buffer.append(data['time'], data['eeg'])
+        self.update()
+
+    def on_new_eeg_block(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.buffer is None or not self.own_event(data):
+            return
+        if self._own_buffer:
+            self.buffer.extend(data['time'], data['data'])
+        self.update()
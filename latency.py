@@ -0,0 +1,207 @@
+import bisect
+import collections
+import math
+import threading
+import time
+
+
+class LatencyHistogram():
+    """
+    Counts latencies in log spaced buckets, by default 20 per decade from 10 us to 100 s.
+
+    Values below the first bound, including negative ones, are counted in the first bucket.
+    Percentiles are reported as the upper bound of their bucket, about 12% resolution.
+
+    Methods
+    -------
+    record(value):
+        To count one latency in seconds.
+    percentile(q):
+        To get the latency below which q percent of the values are.
+    to_dict():
+        To get count, mean, min, max and percentiles in milliseconds.
+    """
+    def __init__(self, low=1e-5, high=100.0, buckets_per_decade=20):
+        decades = int(round(math.log10(high / low)))
+        n = decades * buckets_per_decade
+        self.bounds = [low * 10 ** (i / buckets_per_decade) for i in range(n + 1)]
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if self.count == 0:
+            return None
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n > 0:
+                if i >= len(self.bounds):
+                    return self.max
+                return min(self.bounds[i], self.max)
+        return self.max
+
+    def to_dict(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000.0,
+            'min_ms': self.min * 1000.0,
+            'p50_ms': self.percentile(50) * 1000.0,
+            'p90_ms': self.percentile(90) * 1000.0,
+            'p99_ms': self.percentile(99) * 1000.0,
+            'max_ms': self.max * 1000.0,
+        }
+
+
+class ClockOffsetEstimator():
+    """
+    Estimates the offset between the Cortex time of samples and the host monotonic clock.
+
+    Every sample gives arrival - device_time = offset + transit delay. The delay is never
+    negative, so the minimum over a sliding window is the best estimate of the offset; the
+    window lets the estimate follow drift between the two clocks.
+
+    Attributes
+    ----------
+    offset : float
+        current estimate in seconds, None before the first sample
+    window : float
+        length of the sliding window in seconds of host time
+    """
+    def __init__(self, window=30.0):
+        self.window = window
+        self.offset = None
+        # (arrival, offset) pairs with increasing offsets, the first one is the window minimum
+        self._candidates = collections.deque()
+
+    def update(self, device_time, arrival):
+        offset = arrival - device_time
+        candidates = self._candidates
+        while candidates and candidates[-1][1] >= offset:
+            candidates.pop()
+        candidates.append((arrival, offset))
+        horizon = arrival - self.window
+        while candidates[0][0] < horizon:
+            candidates.popleft()
+        self.offset = candidates[0][1]
+        return self.offset
+
+
+class StreamLatency():
+    """
+    Latency histograms of one stream, see LatencyTracker
+    """
+    def __init__(self, stream_name, window):
+        self.stream_name = stream_name
+        self.clock = ClockOffsetEstimator(window)
+        self.transit = LatencyHistogram()
+        self.device_to_arrival = LatencyHistogram()
+        self.arrival_to_handled = LatencyHistogram()
+
+    def reset(self):
+        self.transit.reset()
+        self.device_to_arrival.reset()
+        self.arrival_to_handled.reset()
+
+
+class LatencyTracker():
+    """
+    Per stream latency of Cortex stream frames, filled by Cortex.on_message when Cortex is
+    created with latency=True.
+
+    Three histograms are kept for every stream:
+        transit: host wall clock at arrival minus the Cortex time of the sample. Exact when the
+            Cortex service runs on this host, it includes the radio link and the service.
+        device_to_arrival: delay above the fastest sample seen in the clock offset window. It
+            shows queueing and bursts between the headset and our websocket thread, independent
+            of any fixed offset between the two clocks.
+        arrival_to_handled: from the frame being received until handle_stream_data and every
+            bound handler returned, that is the time spent in our own code.
+
+    Methods
+    -------
+    record(frame, arrival, handled):
+        To count one stream frame. Times are from time.monotonic().
+    snapshot(stream_name=None):
+        To get the clock offset and histograms of one or every stream.
+    reset():
+        To clear the histograms and keep the clock offsets.
+    """
+    def __init__(self, window=30.0):
+        self.window = window
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._wall_offset = time.time() - time.monotonic()
+
+    def record(self, frame, arrival, handled):
+        device_time = frame.get('time')
+        if device_time is None:
+            return
+        stream_name = None
+        for key in frame:
+            if key != 'sid' and key != 'time':
+                stream_name = key
+                break
+
+        with self._lock:
+            stream = self.streams.get(stream_name)
+            if stream is None:
+                stream = StreamLatency(stream_name, self.window)
+                self.streams[stream_name] = stream
+            offset = stream.clock.update(device_time, arrival)
+            stream.transit.record(arrival + self._wall_offset - device_time)
+            stream.device_to_arrival.record(arrival - device_time - offset)
+            stream.arrival_to_handled.record(handled - arrival)
+
+    def snapshot(self, stream_name=None):
+        """
+        To get the current latency statistics
+
+        Parameters
+        ----------
+        stream_name : string, optional
+            name of the stream, all streams when None
+
+        Returns
+        -------
+        dictionary of stream name -> {'clock_offset', 'transit', 'device_to_arrival', 'arrival_to_handled'}
+        For example:
+            {'eeg': {'clock_offset': 1234.5678, 'transit': {'count': 1280, 'mean_ms': 21.3, 'p50_ms': 19.9, ...}, ...}}
+        """
+        with self._lock:
+            names = [stream_name] if stream_name is not None else list(self.streams)
+            result = {}
+            for name in names:
+                stream = self.streams.get(name)
+                if stream is None:
+                    continue
+                result[name] = {
+                    'clock_offset': stream.clock.offset,
+                    'transit': stream.transit.to_dict(),
+                    'device_to_arrival': stream.device_to_arrival.to_dict(),
+                    'arrival_to_handled': stream.arrival_to_handled.to_dict(),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            for stream in self.streams.values():
+                stream.reset()
+            self._wall_offset = time.time() - time.monotonic()
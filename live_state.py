@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from met_writer import MET_CSV_COLUMNS, MET_CSV_INDEXES
+
+LIVE_STATE_NAME = 'eeg_web_llm_live'
+LIVE_STATE_MAGIC = 0x4c495645  # 'LIVE'
+LIVE_STATE_VERSION = 2
+# the met columns of the daily csv, without time
+LIVE_FIELDS = MET_CSV_COLUMNS[:-1]
+
+HEADER_DTYPE = np.dtype([('magic', '<u4'), ('version', '<u4'), ('seq', '<u8'), ('count', '<u8'),
+                         ('n_fields', '<u4'), ('trend_len', '<u4'), ('updated', '<f8'), ('pid', '<u4')])
+FIELDS_LEN = 512
+
+
+def row_dtype(n_fields):
+    return np.dtype([('time', '<f8'), ('values', '<f8', (n_fields,))])
+
+
+def open_untracked(name):
+    """
+    To open an existing segment without registering it with the resource tracker, which would
+    remove it when this process exits
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def process_alive(pid):
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        # os.kill would terminate the process; a segment on Windows only exists while a process has it open
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def segment_writer_pid(name):
+    """
+    Returns
+    -------
+    pid of the writer recorded in an existing segment, 0 when the header holds none
+    """
+    shm = open_untracked(name)
+    try:
+        if shm.size < HEADER_DTYPE.itemsize:
+            return 0
+        header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        valid = header['magic'] == LIVE_STATE_MAGIC and header['version'] == LIVE_STATE_VERSION
+        pid = int(header['pid']) if valid else 0
+        del header
+        return pid
+    finally:
+        shm.close()
+
+
+class LiveStateWriter():
+    """
+    Publishes the latest performance metrics and a short trend window in shared memory.
+
+    The segment is a header, the field names and a ring of the last trend_len rows, guarded by
+    a sequence lock: seq is odd while a row is written, so a reader retries instead of seeing a
+    half written row and the writer never waits for readers. There must be a single writer: the
+    header holds its pid, and a second writer raises FileExistsError while that process is alive.
+    A segment left behind by a writer that did not exit cleanly is replaced.
+
+        live = LiveStateWriter()
+        live.write_met(data['time'], data['met'])     # in on_new_met_data
+        ...
+        live.close()
+
+    Methods
+    -------
+    write(time, values):
+        To publish a row, values is a dictionary of fields; fields not given keep their last value.
+    write_met(time, met):
+        To publish a met sample as emitted by Cortex.
+    close():
+        To remove the segment.
+    """
+    def __init__(self, name=LIVE_STATE_NAME, fields=LIVE_FIELDS, trend_len=64):
+        self.name = name
+        self.fields = list(fields)
+        self.trend_len = trend_len
+        names = json.dumps(self.fields).encode()
+        if len(names) > FIELDS_LEN:
+            raise ValueError('Too many live state fields.')
+
+        self.row_dtype = row_dtype(len(self.fields))
+        size = HEADER_DTYPE.itemsize + FIELDS_LEN + trend_len * self.row_dtype.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            pid = segment_writer_pid(name)
+            if process_alive(pid):
+                raise FileExistsError('Live state {0} is written by process {1}.'.format(name, pid))
+            # left behind by a writer that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        buf = self.shm.buf
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=buf)
+        buf[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize + len(names)] = names
+        self.rows = np.ndarray((trend_len,), self.row_dtype, buffer=buf, offset=HEADER_DTYPE.itemsize + FIELDS_LEN)
+        self.rows['values'] = np.nan
+        self.last = np.full(len(self.fields), np.nan)
+        self.header['seq'] = 0
+        self.header['count'] = 0
+        self.header['n_fields'] = len(self.fields)
+        self.header['trend_len'] = trend_len
+        self.header['version'] = LIVE_STATE_VERSION
+        self.header['pid'] = os.getpid()
+        # written last, a reader attaching during the setup sees no magic yet
+        self.header['magic'] = LIVE_STATE_MAGIC
+
+    def write(self, time_, values):
+        for key, value in values.items():
+            self.last[self.fields.index(key)] = value
+        header = self.header
+        count = int(header['count'])
+        header['seq'] += 1
+        row = self.rows[count % self.trend_len]
+        row['time'] = time_
+        row['values'] = self.last
+        header['count'] = count + 1
+        header['updated'] = time.time()
+        header['seq'] += 1
+
+    def write_met(self, time_, met):
+        self.write(time_, {field: met[i] for field, i in zip(self.fields, MET_CSV_INDEXES)})
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.header['magic'] = 0
+        self.header = None
+        self.rows = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class LiveStateReader():
+    """
+    Reads the state published by LiveStateWriter, from any process.
+
+    The segment is attached on the first read and again after the writer restarts, so the
+    reader can be created before the writer runs.
+
+        live = LiveStateReader()
+        state = live.snapshot(n=10, max_age=10.0)
+        if state is not None:
+            state['latest']['attention'], state['rows'][-10:]
+
+    Methods
+    -------
+    snapshot(n=None, max_age=None):
+        To get the latest row and the last n rows, None when there is no writer or the state is
+        older than max_age seconds.
+    """
+    RETRIES = 1000
+
+    def __init__(self, name=LIVE_STATE_NAME):
+        self.name = name
+        self.shm = None
+        self.fields = None
+
+    def attach(self):
+        try:
+            # a reader must not remove the segment of the writer when it exits
+            shm = open_untracked(self.name)
+        except FileNotFoundError:
+            return False
+        header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        if header['magic'] != LIVE_STATE_MAGIC or header['version'] != LIVE_STATE_VERSION:
+            del header
+            shm.close()
+            return False
+        start = HEADER_DTYPE.itemsize
+        names = bytes(shm.buf[start:start + FIELDS_LEN]).rstrip(b'\0')
+        self.fields = json.loads(names)
+        self.trend_len = int(header['trend_len'])
+        self.header = header
+        self.rows = np.ndarray((self.trend_len,), row_dtype(len(self.fields)), buffer=shm.buf,
+                               offset=start + FIELDS_LEN)
+        self.shm = shm
+        return True
+
+    def detach(self):
+        if self.shm is not None:
+            self.header = None
+            self.rows = None
+            self.shm.close()
+            self.shm = None
+
+    def read(self):
+        header = self.header
+        for _ in range(self.RETRIES):
+            seq = int(header['seq'])
+            if seq & 1:
+                continue
+            count = int(header['count'])
+            updated = float(header['updated'])
+            rows = self.rows.copy()
+            if int(header['seq']) == seq:
+                return count, updated, rows
+        return None
+
+    def snapshot(self, n=None, max_age=None):
+        """
+        Returns
+        -------
+        None, or a dictionary such as
+            {'updated': 1627459390.5, 'count': 1234,
+             'latest': {'attention': 0.61, ..., 'time': 1627459390.4229},
+             'rows': [{'attention': 0.58, ..., 'time': ...}, ...]}    oldest first
+        """
+        if self.shm is None and not self.attach():
+            return None
+        if int(self.header['magic']) != LIVE_STATE_MAGIC:
+            # the writer closed, a restarted writer creates a new segment under the same name
+            self.detach()
+            if not self.attach():
+                return None
+        result = self.read()
+        if result is None:
+            return None
+        count, updated, rows = result
+        if max_age is not None and time.time() - updated > max_age:
+            # attach again next time, in case the writer was restarted
+            self.detach()
+            return None
+        if count == 0:
+            return None
+
+        size = min(count, self.trend_len)
+        if n is not None:
+            size = min(size, n)
+        # oldest first, ending at the newest row
+        index = np.arange(count - size, count) % self.trend_len
+        selected = rows[index]
+        records = [dict(zip(self.fields, values.tolist()), time=t) for t, values in
+                   zip(selected['time'].tolist(), selected['values'])]
+        return {'updated': updated, 'count': count, 'latest': records[-1], 'rows': records}
+
+    def close(self):
+        self.detach()
@@ -0,0 +1,94 @@
+import csv
+import os
+import threading
+from datetime import datetime, timezone
+
+from scheduler import TimerScheduler
+
+# columns of the daily csv, read by CyberParents RealBioDataReader
+MET_CSV_COLUMNS = ['attention', 'engagement', 'excitement', 'interest', 'relaxation', 'stress', 'time']
+# index of each column in the met stream, see Subcribe.on_new_data_labels
+MET_CSV_INDEXES = [1, 3, 5, 8, 10, 12]
+
+
+class MetCsvWriter():
+    """
+    Writes performance metrics to one csv per day, named YYYY-MM-DD.csv after the UTC date
+    of the samples.
+
+    The file stays open; rows are buffered and written when flush_rows rows are pending,
+    flush_seconds after the first pending row, on close() and before rolling over to the
+    file of the next day.
+
+    Methods
+    -------
+    write(time, met):
+        To add one met sample as emitted by Cortex.
+    flush():
+        To write the pending rows.
+    close():
+        To write the pending rows and close the file.
+    """
+    def __init__(self, directory='.', flush_rows=32, flush_seconds=5.0):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.date = None
+        self.path = None
+        self.rows = []
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self._scheduler = TimerScheduler(name='MetCsvFlush')
+        self._timer = None
+
+    def write(self, time, met):
+        stamp = datetime.fromtimestamp(time, timezone.utc)
+        date = stamp.strftime('%Y-%m-%d')
+        row = [met[i] for i in MET_CSV_INDEXES]
+        row.append(stamp.strftime('%Y-%m-%d %H:%M:%S.%f'))
+
+        with self._lock:
+            if date != self.date:
+                # midnight, finish the file of the previous day
+                self._flush()
+                self._open(date)
+            self.rows.append(row)
+            if len(self.rows) >= self.flush_rows:
+                self._flush()
+            elif self._timer is None:
+                self._timer = self._scheduler.call_later(self.flush_seconds, self.flush)
+
+    def _open(self, date):
+        if self._file is not None:
+            self._file.close()
+        self.date = date
+        self.path = os.path.join(self.directory, date + '.csv')
+        new_file = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(MET_CSV_COLUMNS)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.rows and self._writer is not None:
+            self._writer.writerows(self.rows)
+            self._file.flush()
+        self.rows = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._writer = None
+                self.date = None
+        self._scheduler.shutdown()
@@ -0,0 +1,372 @@
+import os
+import warnings
+from contextlib import contextmanager
+
+from cortex import Cortex, CREATE_SESSION_ID, CORTEX_STOP_ALL_STREAMS, STATE_CREATING_SESSION, STATE_SESSION_READY
+
+# events whose data dictionary is tagged with the headset id
+HEADSET_TAGGED_EVENTS = {
+    'new_data_labels', 'new_com_data', 'new_fe_data', 'new_eeg_data', 'new_mot_data', 'new_dev_data',
+    'new_met_data', 'new_pow_data', 'new_eeg_block', 'new_mot_block', 'new_met_block', 'new_pow_block',
+    'stream_gap',
+}
+
+
+class HeadsetSession():
+    """
+    Per headset state of MultiHeadsetCortex
+
+    Attributes
+    ----------
+    headset_id : string
+        id of the headset
+    session_id : string
+        id of the Cortex session, empty until createSession is answered
+    pending : bool
+        True while createSession is in flight
+    subscribed_streams : list
+        streams subscribed in the session
+    restore_streams : list
+        streams to subscribe again once the session is recreated after an outage
+    outage_streams : set
+        restored streams whose first sample has not arrived yet, see Cortex.check_gap
+    buffers, collectors, gap_trackers : dict
+        ring buffers, block collectors and gap trackers of this headset, see Cortex
+    """
+    def __init__(self, headset_id):
+        self.headset_id = headset_id
+        self.session_id = ''
+        self.pending = False
+        self.subscribed_streams = []
+        self.restore_streams = []
+        self.outage_streams = set()
+        self.buffers = {}
+        self.collectors = {}
+        self.gap_trackers = {}
+
+
+class MultiHeadsetCortex(Cortex):
+    """
+    Runs one Cortex session per headset over a single websocket.
+
+    Every headset returned by queryHeadsets, or only those in headset_ids, is connected and gets
+    its own session. Stream frames are routed by their session id, so ring buffers, block mode
+    and gap tracking are kept per headset, and every emitted data dictionary carries a
+    'headset' key with the id of the headset it came from.
+
+    Attributes
+    ----------
+    sessions : dict
+        headset id -> HeadsetSession
+
+    Methods
+    -------
+    start(streams):
+        To subscribe the streams in every current and future headset session and open the connection.
+    sub_request(stream, headset_id=None):
+        To subscribe streams for one headset, or for every headset with a session.
+    unsub_request(stream, headset_id=None):
+        To unsubscribe streams for one headset, or for every headset with a session.
+    select_headset(headset_id):
+        To direct the single session requests of Cortex, such as create_record, to one headset.
+    headset(headset_id):
+        A context manager keeping one headset selected while requests are made from another
+        thread than the websocket thread, which selects the session of every frame it routes:
+
+            with c.headset(headset_id):
+                c.create_record('title')
+    get_buffer(stream_name, headset_id):
+        To get the ring buffer of a stream of one headset.
+    """
+    _events_ = ['headset_session_done']
+
+    def __init__(self, client_id, client_secret, headset_ids=None, debug_mode=False, **kwargs):
+        super().__init__(client_id, client_secret, debug_mode=debug_mode, **kwargs)
+        self.wanted_headsets = list(headset_ids) if headset_ids else None
+        self.sessions = {}
+        self.sessions_by_sid = {}
+        self.streams = []
+        self.current = None
+
+    def start(self, streams):
+        self.streams = list(streams)
+        self.open()
+
+    def use_session(self, session):
+        # point the single session attributes of Cortex at one headset
+        self.current = session
+        self.headset_id = session.headset_id
+        self.session_id = session.session_id
+        self.buffers = session.buffers
+        self.collectors = session.collectors
+        self.gap_trackers = session.gap_trackers
+        self.subscribed_streams = session.subscribed_streams
+        self.restore_streams = session.restore_streams
+        self.outage_streams = session.outage_streams
+
+    def save_session(self):
+        # keep attributes Cortex may have replaced while a session was selected
+        session = self.current
+        if session is not None:
+            session.subscribed_streams = self.subscribed_streams
+            session.restore_streams = self.restore_streams
+
+    def select_headset(self, headset_id):
+        # the websocket thread swaps the selected session under _block_lock while routing frames
+        with self._block_lock:
+            self.use_session(self.sessions[headset_id])
+
+    @contextmanager
+    def headset(self, headset_id):
+        with self._block_lock:
+            session = self.sessions[headset_id]
+            self.use_session(session)
+            yield session
+
+    def get_buffer(self, stream_name, headset_id=None):
+        if headset_id is None:
+            return super().get_buffer(stream_name)
+        session = self.sessions.get(headset_id)
+        if session is None:
+            return None
+        return session.buffers.get(stream_name)
+
+    def emit(self, name, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.current is not None and name in HEADSET_TAGGED_EVENTS and isinstance(data, dict):
+            data['headset'] = self.current.headset_id
+        return super().emit(name, *args, **kwargs)
+
+    def handle_stream_data(self, result_dic):
+        session = self.sessions_by_sid.get(result_dic.get('sid'))
+        if session is None:
+            if self.debug:
+                print('stream data of unknown session ' + str(result_dic.get('sid')))
+            return
+        # the selected session must not change while an idle block of another headset is emitted
+        with self._block_lock:
+            if session is not self.current:
+                self.use_session(session)
+            super().handle_stream_data(result_dic)
+
+    def flush_blocks(self):
+        with self._block_lock:
+            current = self.current
+            for session in self.sessions.values():
+                self.current = session
+                for collector in list(session.collectors.values()):
+                    self.emit_block(collector)
+            self.current = current
+
+    def flush_idle_block(self, collector, block):
+        # tag the block with the headset it belongs to
+        with self._block_lock:
+            current = self.current
+            for session in self.sessions.values():
+                if collector in session.collectors.values():
+                    self.current = session
+                    super().flush_idle_block(collector, block)
+            self.current = current
+
+    def handle_query_headset_result(self, result_dic):
+        self.headset_list = result_dic
+        waiting = False
+        found = set()
+        for ele in self.headset_list:
+            hs_id = ele['id']
+            status = ele['status']
+            print('headsetId: {0}, status: {1}, connected_by: {2}'.format(hs_id, status, ele['connectedBy']))
+            if self.wanted_headsets is not None and hs_id not in self.wanted_headsets:
+                continue
+            found.add(hs_id)
+
+            if status == 'connected':
+                session = self.sessions.get(hs_id)
+                if session is None:
+                    session = HeadsetSession(hs_id)
+                    self.sessions[hs_id] = session
+                if session.session_id == '' and not session.pending:
+                    self.create_session_for(session)
+            elif status == 'discovered':
+                self.connect_headset(hs_id)
+                waiting = True
+            elif status == 'connecting':
+                waiting = True
+            else:
+                warnings.warn('query_headset resp: Invalid connection status ' + status + ' of headset ' + hs_id)
+
+        if len(self.headset_list) == 0:
+            warnings.warn("No headset available. Please turn on a headset.")
+        if self.wanted_headsets is not None:
+            for hs_id in self.wanted_headsets:
+                if hs_id not in found:
+                    warnings.warn("Can not found the headset " + hs_id + ". Please make sure the id is correct.")
+
+        self.isHeadsetConnected = any(session.session_id != '' or session.pending for session in self.sessions.values())
+        if waiting:
+            self.schedule_headset_poll()
+        else:
+            self.cancel_headset_poll()
+
+    def create_session_for(self, session):
+        print('create session for headset ' + session.headset_id + ' --------------------------------')
+        create_session_request = {
+            "jsonrpc": "2.0",
+            "id": CREATE_SESSION_ID,
+            "method": "createSession",
+            "params": {
+                "cortexToken": self.auth,
+                "headset": session.headset_id,
+                "status": "active"
+            }
+        }
+        session.pending = True
+        self.set_state(STATE_CREATING_SESSION)
+        return self.send_request(create_session_request)
+
+    def handle_create_session_result(self, result_dic):
+        sid = result_dic['id']
+        if result_dic.get('status') == 'closed':
+            session = self.sessions_by_sid.pop(sid, None)
+            if session is not None:
+                print("The session " + sid + " of headset " + session.headset_id + " is closed.")
+                session.session_id = ''
+            return
+
+        hs_id = result_dic['headset']['id']
+        session = self.sessions.get(hs_id)
+        if session is None:
+            session = HeadsetSession(hs_id)
+            self.sessions[hs_id] = session
+        session.session_id = sid
+        session.pending = False
+        self.sessions_by_sid[sid] = session
+        print("The session " + sid + " of headset " + hs_id + " is created successfully.")
+        self.reset_reconnect_backoff()
+        self.set_state(STATE_SESSION_READY)
+        self.emit('headset_session_done', data={'headset': hs_id, 'session_id': sid})
+
+        streams = session.restore_streams if len(session.restore_streams) > 0 else self.streams
+        if len(streams) > 0:
+            self.sub_request(streams, headset_id=hs_id)
+
+    def sub_request(self, stream, headset_id=None):
+        if headset_id is None:
+            targets = [s for s in self.sessions.values() if s.session_id != '']
+        else:
+            targets = [self.sessions[headset_id]]
+        with self._block_lock:
+            for session in targets:
+                self.use_session(session)
+                super().sub_request(stream)
+
+    def unsub_request(self, stream, headset_id=None):
+        if headset_id is None:
+            targets = [s for s in self.sessions.values() if s.session_id != '']
+        else:
+            targets = [self.sessions[headset_id]]
+        with self._block_lock:
+            for session in targets:
+                self.use_session(session)
+                super().unsub_request(stream)
+
+    def handle_per_session(self, handler, result_dic):
+        # split a subscribe / unsubscribe result by the session id of each stream
+        by_sid = {}
+        for stream in result_dic['success']:
+            by_sid.setdefault(stream.get('sid'), []).append(stream)
+        with self._block_lock:
+            for sid, streams in by_sid.items():
+                session = self.sessions_by_sid.get(sid)
+                if session is None:
+                    print('result for unknown session ' + str(sid))
+                    continue
+                self.use_session(session)
+                handler({'success': streams, 'failure': []})
+                self.save_session()
+
+        for stream in result_dic['failure']:
+            print('The data stream ' + stream['streamName'] + ' failed. Because: ' + stream['message'])
+
+    def handle_sub_result(self, result_dic):
+        self.handle_per_session(super().handle_sub_result, result_dic)
+
+    def handle_unsub_result(self, result_dic):
+        self.handle_per_session(super().handle_unsub_result, result_dic)
+
+    def handle_warning(self, warning_dic):
+        if warning_dic['code'] != CORTEX_STOP_ALL_STREAMS:
+            return super().handle_warning(warning_dic)
+
+        session = self.sessions_by_sid.pop(warning_dic['message']['sessionId'], None)
+        if session is None:
+            return
+        self.emit('warn_cortex_stop_all_sub', data=session.session_id)
+        session.session_id = ''
+        with self._block_lock:
+            self.current = session
+            for collector in session.collectors.values():
+                self.emit_block(collector)
+        if self.auto_reconnect and len(session.subscribed_streams) > 0:
+            session.restore_streams = list(session.subscribed_streams)
+            session.subscribed_streams = []
+            session.outage_streams.update(session.restore_streams)
+            delay = self.next_reconnect_delay()
+            print('restore session of headset {0} in {1:.1f} seconds'.format(session.headset_id, delay))
+            self.scheduler.call_later(delay, self.restore_session)
+
+    def restore_session(self):
+        if self._closing.is_set():
+            return
+        self.query_headset()
+
+    def on_close(self, *args, **kwargs):
+        self.flush_blocks()
+        for session in self.sessions.values():
+            if self.auto_reconnect and not self._closing.is_set() and len(session.subscribed_streams) > 0:
+                session.restore_streams = list(session.subscribed_streams)
+                session.outage_streams.update(session.restore_streams)
+            session.session_id = ''
+            session.pending = False
+            session.subscribed_streams = []
+        self.sessions_by_sid = {}
+        with self._block_lock:
+            self.current = None
+            self.buffers = {}
+            self.collectors = {}
+            self.subscribed_streams = []
+            self.restore_streams = []
+            # the outages are kept per session, detach the one of the last selected session
+            self.outage_streams = set()
+        super().on_close(*args, **kwargs)
+
+# -----------------------------------------------------------
+#
+# GETTING STARTED
+#   - Turn on every headset and make sure they are listed in Emotiv Launcher.
+#   - Set EMOTIV_CLIENT_ID and EMOTIV_CLIENT_SECRET in .env, optionally EMOTIV_HEADSETS=id1,id2
+# RESULT
+#   - every data dictionary has a 'headset' key with the id of the headset it came from
+#
+# -----------------------------------------------------------
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=".env")
+    headsets = os.getenv("EMOTIV_HEADSETS")
+    headset_ids = headsets.split(',') if headsets else None
+
+    c = MultiHeadsetCortex(os.getenv("EMOTIV_CLIENT_ID"), os.getenv("EMOTIV_CLIENT_SECRET"), headset_ids=headset_ids)
+
+    def on_new_met_data(*args, **kwargs):
+        data = kwargs.get('data')
+        print('{}: met {} time {}'.format(data['headset'], data['met'], data['time']))
+
+    c.bind(new_met_data=on_new_met_data)
+    c.start(['met'])
+
+if __name__ == '__main__':
+    main()
+
+# -----------------------------------------------------------
@@ -0,0 +1,100 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class ScheduledCall():
+    """
+    A call registered with TimerScheduler.call_later
+
+    Methods
+    -------
+    cancel():
+        To prevent the call from running. Has no effect when it already ran.
+    """
+    def __init__(self, when, func, args, kwargs):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler():
+    """
+    Runs delayed calls on one background thread, so callers such as websocket callbacks never sleep.
+
+    Calls run one after another in the order of their due time. A call that raises is reported
+    and does not stop the scheduler.
+
+    Methods
+    -------
+    call_later(delay, func, *args, **kwargs):
+        To run func after delay seconds. Returns a ScheduledCall.
+    cancel_all():
+        To cancel every pending call.
+    shutdown():
+        To cancel every pending call and stop the thread.
+    """
+    def __init__(self, name='TimerScheduler'):
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def call_later(self, delay, func, *args, **kwargs):
+        call = ScheduledCall(time.monotonic() + delay, func, args, kwargs)
+        with self._cond:
+            heapq.heappush(self._heap, (call.when, next(self._seq), call))
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return call
+
+    def cancel_all(self):
+        with self._cond:
+            for _, _, call in self._heap:
+                call.cancel()
+            self._heap = []
+            self._cond.notify()
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            for _, _, call in self._heap:
+                call.cancel()
+            self._heap = []
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if not self._running:
+                    return
+                _, _, call = heapq.heappop(self._heap)
+
+            if call.cancelled:
+                continue
+            try:
+                call.func(*call.args, **call.kwargs)
+            except Exception as e:
+                print('{0}: scheduled call {1} failed: {2}'.format(self.name, call.func, e))
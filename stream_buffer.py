@@ -0,0 +1,424 @@
+import numpy as np
+
+
+class StreamRingBuffer():
+    """
+    A preallocated ring buffer holding the most recent samples of one Cortex data stream.
+
+    Every sample is written twice, at slot i and at slot i + capacity, so the newest
+    `capacity` samples are always laid out contiguously in memory and any window can be
+    returned as a numpy view without copying.
+
+    Attributes
+    ----------
+    stream_name : string
+        name of the stream, for example 'eeg'
+    labels : list
+        column labels as returned by Cortex.extract_data_labels
+    capacity : int
+        maximum number of samples kept
+    size : int
+        number of valid samples currently held
+    total : int
+        number of samples written since creation or last clear()
+
+    Methods
+    -------
+    append(time, values):
+        To write one sample.
+    extend(times, values):
+        To write a 2-D block of samples.
+    latest(n):
+        To get the newest n samples.
+    window_by_time(start, stop):
+        To get the samples whose Cortex time is in [start, stop).
+    window_by_counter(start, stop):
+        To get the samples whose unwrapped COUNTER is in [start, stop).
+    column(label):
+        To get the index of a column label.
+    """
+    COUNTER_LABELS = ('COUNTER', 'COUNTER_MEMS')
+
+    def __init__(self, stream_name, labels, capacity, dtype=np.float64, counter_modulus=None):
+        if capacity <= 0:
+            raise ValueError('Invalid capacity {0} for stream {1}.'.format(capacity, stream_name))
+
+        self.stream_name = stream_name
+        self.labels = list(labels)
+        self.capacity = capacity
+        self.counter_modulus = counter_modulus
+
+        n_cols = len(self.labels)
+        self._data = np.zeros((2 * capacity, n_cols), dtype=dtype)
+        self._time = np.zeros(2 * capacity, dtype=np.float64)
+        self._counter = np.zeros(2 * capacity, dtype=np.int64)
+
+        self._counter_col = None
+        for label in self.COUNTER_LABELS:
+            if label in self.labels:
+                self._counter_col = self.labels.index(label)
+                break
+
+        self.clear()
+
+    def clear(self):
+        self._pos = 0
+        self.size = 0
+        self.total = 0
+        self._last_raw_counter = None
+        self._max_raw_counter = -1
+        self._counter_offset = 0
+
+    def column(self, label):
+        return self.labels.index(label)
+
+    def _unwrap_counter(self, raw):
+        # COUNTER restarts from zero once per wrap, keep a monotonic copy of it. A repeated or
+        # slightly lower value is a duplicate or reordered sample, only a drop of more than half
+        # the period is a wrap
+        raw = int(raw)
+        last = self._last_raw_counter
+        if last is not None and raw < last:
+            modulus = self.counter_modulus or (self._max_raw_counter + 1)
+            if last - raw > modulus // 2:
+                self._counter_offset += modulus
+        self._last_raw_counter = raw
+        if raw > self._max_raw_counter:
+            self._max_raw_counter = raw
+        return raw + self._counter_offset
+
+    def append(self, time, values):
+        """
+        To write one sample
+
+        Parameters
+        ----------
+        time : float, required
+            Cortex timestamp of the sample
+        values : sequence, required
+            values in the same order as labels. Extra trailing values are ignored.
+
+        Returns
+        -------
+        None
+        """
+        s = self._pos
+        cap = self.capacity
+        row = self._data[s]
+        row[:] = values[:len(self.labels)]
+        self._data[s + cap] = row
+        self._time[s] = self._time[s + cap] = time
+        if self._counter_col is not None:
+            self._counter[s] = self._counter[s + cap] = self._unwrap_counter(row[self._counter_col])
+        else:
+            self._counter[s] = self._counter[s + cap] = self.total
+
+        self._pos = (s + 1) % cap
+        self.total += 1
+        if self.size < cap:
+            self.size += 1
+
+    def extend(self, times, values):
+        """
+        To write a block of samples
+
+        Parameters
+        ----------
+        times : array like, required
+            1-D array of Cortex timestamps
+        values : array like, required
+            2-D array with one row per sample
+
+        Returns
+        -------
+        None
+        """
+        values = np.asarray(values)
+        times = np.asarray(times, dtype=np.float64)
+        n = len(times)
+        if n > self.capacity:
+            # only the newest samples can be kept, but counters must still see every sample
+            for i in range(n - self.capacity):
+                if self._counter_col is not None:
+                    self._unwrap_counter(values[i, self._counter_col])
+            self.total += n - self.capacity
+            values = values[-self.capacity:]
+            times = times[-self.capacity:]
+            n = self.capacity
+
+        if self._counter_col is None:
+            counters = np.arange(self.total, self.total + n, dtype=np.int64)
+        else:
+            counters = np.fromiter((self._unwrap_counter(c) for c in values[:, self._counter_col]),
+                                   dtype=np.int64, count=n)
+
+        cap = self.capacity
+        s = self._pos
+        first = min(n, cap - s)
+        for dst in (s, s + cap):
+            self._data[dst:dst + first] = values[:first, :len(self.labels)]
+            self._time[dst:dst + first] = times[:first]
+            self._counter[dst:dst + first] = counters[:first]
+        rest = n - first
+        if rest > 0:
+            for dst in (0, cap):
+                self._data[dst:dst + rest] = values[first:, :len(self.labels)]
+                self._time[dst:dst + rest] = times[first:]
+                self._counter[dst:dst + rest] = counters[first:]
+
+        self._pos = (s + n) % cap
+        self.total += n
+        self.size = min(cap, self.size + n)
+
+    def _span(self, n):
+        stop = self._pos + self.capacity
+        return stop - n, stop
+
+    def latest(self, n=None):
+        """
+        To get the newest samples
+
+        Parameters
+        ----------
+        n : int, optional
+            number of samples. All buffered samples are returned when n is None.
+
+        Returns
+        -------
+        times: numpy array of shape (n,)
+        data: numpy array of shape (n, len(labels))
+            Both arrays are views into the buffer. They stay valid until capacity - n newer
+            samples have been written; copy them if they must be kept longer.
+        """
+        if n is None or n > self.size:
+            n = self.size
+        start, stop = self._span(n)
+        return self._time[start:stop], self._data[start:stop]
+
+    def window_by_time(self, start, stop):
+        """
+        To get the samples whose Cortex time t satisfies start <= t < stop
+
+        Returns
+        -------
+        times, data: numpy array views, see latest()
+        """
+        first, last = self._span(self.size)
+        times = self._time[first:last]
+        i = first + int(np.searchsorted(times, start, side='left'))
+        j = first + int(np.searchsorted(times, stop, side='left'))
+        return self._time[i:j], self._data[i:j]
+
+    def window_by_counter(self, start, stop):
+        """
+        To get the samples whose unwrapped COUNTER c satisfies start <= c < stop
+        For streams without a COUNTER column the running sample number is used instead.
+
+        Returns
+        -------
+        times, data: numpy array views, see latest()
+        """
+        first, last = self._span(self.size)
+        counters = self._counter[first:last]
+        i = first + int(np.searchsorted(counters, start, side='left'))
+        j = first + int(np.searchsorted(counters, stop, side='left'))
+        return self._time[i:j], self._data[i:j]
+
+    def latest_counter(self):
+        if self.size == 0:
+            return None
+        return int(self._counter[self._pos + self.capacity - 1])
+
+
+class StreamBlockCollector():
+    """
+    Coalesces samples of one Cortex data stream into blocks before they are dispatched.
+
+    A block is complete when it holds block_size samples or when it spans block_ms
+    milliseconds of Cortex time, whichever comes first. A stream that stalls leaves a partial
+    block behind, Cortex emits it after block_idle seconds without samples.
+
+    Attributes
+    ----------
+    stream_name : string
+        name of the stream, for example 'eeg'
+    labels : list
+        column labels as returned by Cortex.extract_data_labels
+    block_size : int
+        number of samples per block, None to use block_ms only
+    block_ms : float
+        maximum time span of a block in milliseconds, None to use block_size only
+    blocks : int
+        number of blocks taken, identifies the block being collected
+    arrival : float
+        time.monotonic() of the last added sample, set by the caller
+
+    Methods
+    -------
+    add(time, values):
+        To add one sample. Returns True when the block is complete.
+    take():
+        To get the collected block and start a new one.
+    """
+    DEFAULT_CAPACITY = 256
+
+    def __init__(self, stream_name, labels, block_size=None, block_ms=None, dtype=np.float64):
+        if block_size is None and block_ms is None:
+            raise ValueError('Either block_size or block_ms is required for stream {0}.'.format(stream_name))
+        if block_size is not None and block_size <= 0:
+            raise ValueError('Invalid block_size {0} for stream {1}.'.format(block_size, stream_name))
+
+        self.stream_name = stream_name
+        self.labels = list(labels)
+        self.block_size = block_size
+        self.block_ms = block_ms
+        self.dtype = dtype
+        self.blocks = 0
+        self.arrival = None
+        self._allocate(block_size or self.DEFAULT_CAPACITY)
+
+    def _allocate(self, capacity):
+        self._data = np.empty((capacity, len(self.labels)), dtype=self.dtype)
+        self._time = np.empty(capacity, dtype=np.float64)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def add(self, time, values):
+        n = self._n
+        if n == len(self._time):
+            # only reachable when the block is bounded by block_ms
+            data, times = self._data, self._time
+            self._allocate(2 * n)
+            self._data[:n] = data
+            self._time[:n] = times
+        self._data[n] = values[:len(self.labels)]
+        self._time[n] = time
+        self._n = n + 1
+
+        if self.block_size is not None and self._n >= self.block_size:
+            return True
+        if self.block_ms is not None and (time - self._time[0]) * 1000.0 >= self.block_ms:
+            return True
+        return False
+
+    def take(self):
+        """
+        To get the collected samples and start a new block
+
+        Returns
+        -------
+        times: numpy array of shape (n,)
+        data: numpy array of shape (n, len(labels))
+            The arrays are handed over to the caller, the collector continues with new storage.
+        """
+        n = self._n
+        times, data = self._time[:n], self._data[:n]
+        self._allocate(len(self._time))
+        self.blocks += 1
+        return times, data
+
+
+class StreamGapTracker():
+    """
+    Counts the samples lost in a stream from its wrapping COUNTER column.
+
+    A jump in COUNTER gives the number of lost samples modulo the counter period. For outages
+    longer than one period the number of whole periods is recovered from the Cortex time gap
+    and the sample rate measured on contiguous samples, so the count stays exact across
+    reconnects.
+
+    Attributes
+    ----------
+    stream_name : string
+        name of the stream, for example 'eeg'
+    counter_col : int
+        index of the COUNTER column in a sample
+    gaps : int
+        number of gaps seen
+    lost : int
+        total number of lost samples
+
+    Methods
+    -------
+    update(time, values):
+        To check one sample. Returns a gap dictionary or None.
+    """
+    def __init__(self, stream_name, counter_col, counter_modulus=None, sample_rate=None):
+        self.stream_name = stream_name
+        self.counter_col = counter_col
+        self.counter_modulus = counter_modulus
+        self.sample_rate = sample_rate
+        self.gaps = 0
+        self.lost = 0
+        self._last_counter = None
+        self._last_time = None
+        self._max_counter = -1
+        self._steps = 0
+        self._step_time = 0.0
+
+    def modulus(self):
+        if self.counter_modulus is not None:
+            return self.counter_modulus
+        if self._max_counter >= 0 and self._steps > self._max_counter:
+            # at least one wrap was seen
+            return self._max_counter + 1
+        return None
+
+    def rate(self):
+        if self.sample_rate is not None:
+            return self.sample_rate
+        if self._steps > 0 and self._step_time > 0:
+            return self._steps / self._step_time
+        return None
+
+    def update(self, time, values):
+        counter = int(values[self.counter_col])
+        last_counter, last_time = self._last_counter, self._last_time
+        if last_counter is None:
+            self._last_counter, self._last_time = counter, time
+            self._max_counter = max(self._max_counter, counter)
+            return None
+
+        modulus = self.modulus()
+        if counter == last_counter + 1 or (modulus is not None and counter == (last_counter + 1) % modulus) \
+                or (modulus is None and counter == 0 and last_counter > 0):
+            self._last_counter, self._last_time = counter, time
+            self._max_counter = max(self._max_counter, counter)
+            self._steps += 1
+            self._step_time += time - last_time
+            return None
+
+        rate = self.rate()
+        dt = time - last_time
+        # a repeated or slightly lower COUNTER is a duplicate or reordered sample, not a gap, as in
+        # StreamRingBuffer._unwrap_counter. The position stays at the newest sample
+        period = modulus or (self._max_counter + 1)
+        if modulus is not None:
+            behind = (last_counter - counter) % modulus
+        else:
+            behind = last_counter - counter
+        if 0 <= behind < period // 2 and (rate is None or dt * rate < period // 2):
+            return None
+
+        self._last_counter, self._last_time = counter, time
+        self._max_counter = max(self._max_counter, counter)
+        if modulus is None:
+            if rate is None:
+                lost = max(0, counter - last_counter - 1)
+            else:
+                lost = max(0, int(round(dt * rate)) - 1)
+        else:
+            lost = (counter - last_counter - 1) % modulus
+            if rate is not None:
+                periods = int(round((dt * rate - 1 - lost) / modulus))
+                lost += max(0, periods) * modulus
+                # the time gap bounds the count when COUNTER is off by a reorder
+                lost = min(lost, int(round(dt * rate)))
+        if lost == 0:
+            return None
+
+        self.gaps += 1
+        self.lost += lost
+        return {'streamName': self.stream_name, 'lost': lost, 'start': last_time, 'end': time}
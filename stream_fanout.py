@@ -0,0 +1,367 @@
+import sys
+# --- BEGIN: Simplified environment checks ---
+# Optional msgpack framing, JSON is used when it is not installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+# --- END: Simplified environment checks ---
+
+import argparse
+import collections
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+# every frame is a 4 byte big endian length followed by the payload
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def make_codec(encoding=None):
+    """
+    Returns
+    -------
+    name, encode, decode of 'msgpack' when installed, else 'json'
+    """
+    if encoding is None:
+        encoding = 'msgpack' if msgpack is not None else 'json'
+    if encoding == 'msgpack':
+        if msgpack is None:
+            raise ImportError(f"msgpack is not installed. Please run: {sys.executable} -m pip install msgpack")
+        return 'msgpack', lambda obj: msgpack.packb(obj, use_bin_type=True), lambda data: msgpack.unpackb(data, raw=False)
+    if encoding == 'json':
+        return 'json', lambda obj: json.dumps(obj, separators=(',', ':')).encode(), json.loads
+    raise ValueError('Invalid encoding ' + str(encoding))
+
+
+def parse_address(address):
+    """
+    'host:port' or ('host', port) is a TCP address, anything else a Unix socket path
+    """
+    if isinstance(address, tuple):
+        return socket.AF_INET, address
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_frame(sock):
+    (length,) = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    if length > MAX_FRAME:
+        raise ConnectionError('frame of {0} bytes is too large'.format(length))
+    return recv_exact(sock, length)
+
+
+class FanoutClientConnection():
+    """
+    A subscriber attached to StreamFanoutServer, with its own bounded send queue
+    """
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.streams = set()
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, data):
+        with self.cond:
+            if self.closed:
+                return
+            if len(self.queue) >= self.server.max_queue:
+                # a slow subscriber loses its oldest frames, the publisher never waits
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append(data)
+            self.cond.notify()
+
+    def send_loop(self):
+        try:
+            while True:
+                with self.cond:
+                    while not self.queue and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    batch = list(self.queue)
+                    self.queue.clear()
+                self.sock.sendall(b''.join(batch))
+                self.sent += len(batch)
+        except OSError:
+            pass
+        finally:
+            self.server.detach(self)
+
+    def recv_loop(self):
+        decode = json.loads
+        try:
+            while True:
+                request = decode(recv_frame(self.sock))
+                self.server.handle_request(self, request)
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.server.detach(self)
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class StreamFanoutServer():
+    """
+    Publishes Cortex stream frames to any number of local subscribers over TCP or a Unix socket.
+
+    Frames are taken from Cortex.handle_stream_data, so they are decoded once and encoded once
+    per frame however many subscribers there are. Subscribers attach and detach at any time and
+    choose their streams; a subscriber that does not keep up drops its oldest frames.
+
+        server = StreamFanoutServer('127.0.0.1:7000')   # or a path such as '/tmp/cortex.sock'
+        server.attach(cortex)
+        server.start()
+
+    Protocol, every message framed by a 4 byte big endian length:
+        server -> client  hello, JSON: {'encoding': 'msgpack', 'streams': [...]}
+        client -> server  JSON: {'subscribe': ['eeg', 'met']} or {'unsubscribe': [...]}; '*' is every stream
+        server -> client  {'labels': {'streamName': 'eeg', 'labels': [...]}} once per subscribed stream
+        server -> client  the Cortex frames, for example {'eeg': [...], 'sid': '...', 'time': 1627457774.5166}
+
+    Methods
+    -------
+    attach(cortex):
+        To publish the stream frames and data labels of a Cortex.
+    start():
+        To listen and accept subscribers on a background thread.
+    publish(stream_name, frame):
+        To send a frame to the subscribers of its stream.
+    stats():
+        To get the subscribers with their streams, queue depth, sent and dropped frames.
+    close():
+        To disconnect every subscriber and stop listening.
+    """
+    def __init__(self, address='127.0.0.1:7000', encoding=None, max_queue=4096):
+        self.family, self.address = parse_address(address)
+        self.encoding, self.encode, _ = make_codec(encoding)
+        self.max_queue = max_queue
+        # stream name -> data labels, guarded by _lock
+        self.labels = {}
+        self.clients = []
+        # stream name -> subscribers, replaced on every change so publish can read it without locking
+        self.subscribers = {}
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+
+    def attach(self, cortex):
+        cortex.stream_taps.append(self.publish)
+        cortex.bind(new_data_labels=self.on_new_data_labels)
+
+    def start(self):
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+        self._sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self.address)
+        self._sock.listen()
+        if self.family == socket.AF_INET:
+            self.address = self._sock.getsockname()
+        print('stream fanout listening on {0} ({1})'.format(self.address, self.encoding))
+        self._thread = threading.Thread(target=self.accept_loop, name='StreamFanoutAccept', daemon=True)
+        self._thread.start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                sock, address = self._sock.accept()
+            except OSError:
+                return
+            if self.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = FanoutClientConnection(self, sock, address)
+            with self._lock:
+                self.clients.append(client)
+                hello = {'encoding': self.encoding, 'streams': sorted(self.labels)}
+            client.push(frame(json.dumps(hello).encode()))
+            threading.Thread(target=client.send_loop, name='StreamFanoutSend', daemon=True).start()
+            threading.Thread(target=client.recv_loop, name='StreamFanoutRecv', daemon=True).start()
+
+    def handle_request(self, client, request):
+        with self._lock:
+            for stream_name in request.get('subscribe', []):
+                # labels are sent once, when the client starts receiving a stream
+                if '*' in client.streams or stream_name in client.streams:
+                    names = []
+                elif stream_name == '*':
+                    names = [name for name in self.labels if name not in client.streams]
+                else:
+                    names = [stream_name] if stream_name in self.labels else []
+                client.streams.add(stream_name)
+                for name in names:
+                    client.push(frame(self.encode({'labels': self.labels[name]})))
+            for stream_name in request.get('unsubscribe', []):
+                client.streams.discard(stream_name)
+            self.rebuild()
+
+    def rebuild(self):
+        subscribers = {}
+        for client in self.clients:
+            # a client of '*' is listed there only, so publish sends each frame to it once
+            streams = ['*'] if '*' in client.streams else client.streams
+            for stream_name in streams:
+                subscribers.setdefault(stream_name, []).append(client)
+        self.subscribers = subscribers
+
+    def detach(self, client):
+        client.close()
+        with self._lock:
+            if client in self.clients:
+                self.clients.remove(client)
+                self.rebuild()
+
+    def on_new_data_labels(self, *args, **kwargs):
+        labels = kwargs.get('data')
+        # the accept and receive threads read labels under the lock
+        with self._lock:
+            self.labels[labels['streamName']] = labels
+        message = frame(self.encode({'labels': labels}))
+        for client in self.subscribers.get(labels['streamName'], []) + self.subscribers.get('*', []):
+            client.push(message)
+
+    def publish(self, stream_name, frame_dic):
+        subscribers = self.subscribers
+        clients = subscribers.get(stream_name)
+        every = subscribers.get('*')
+        if not clients and not every:
+            return
+        message = frame(self.encode(frame_dic))
+        for client in (clients or []) + (every or []):
+            client.push(message)
+
+    def stats(self):
+        with self._lock:
+            return [{'address': str(c.address), 'streams': sorted(c.streams), 'queued': len(c.queue),
+                     'sent': c.sent, 'dropped': c.dropped} for c in self.clients]
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        for client in list(self.clients):
+            self.detach(client)
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class StreamFanoutClient():
+    """
+    Receives Cortex stream frames from a StreamFanoutServer
+
+        client = StreamFanoutClient('127.0.0.1:7000')
+        client.subscribe(['met'])
+        for message in client:
+            if 'labels' in message:
+                ...
+            else:
+                print(message['met'], message['time'])
+
+    Methods
+    -------
+    subscribe(streams), unsubscribe(streams):
+        To change the streams received, at any time.
+    recv():
+        To wait for the next message.
+    close():
+        To detach from the server.
+    """
+    def __init__(self, address='127.0.0.1:7000', timeout=None):
+        family, self.address = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(self.address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.hello = json.loads(recv_frame(self.sock))
+        self.encoding, _, self.decode = make_codec(self.hello['encoding'])
+        self._send_lock = threading.Lock()
+
+    def request(self, request):
+        with self._send_lock:
+            self.sock.sendall(frame(json.dumps(request).encode()))
+
+    def subscribe(self, streams):
+        self.request({'subscribe': list(streams)})
+
+    def unsubscribe(self, streams):
+        self.request({'unsubscribe': list(streams)})
+
+    def recv(self):
+        return self.decode(recv_frame(self.sock))
+
+    def __iter__(self):
+        try:
+            while True:
+                yield self.recv()
+        except ConnectionError:
+            return
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the rate of frames received from a stream fanout server')
+    parser.add_argument('address', nargs='?', default='127.0.0.1:7000', help='host:port or Unix socket path')
+    parser.add_argument('--streams', default='*', help="comma separated stream names, '*' for all")
+    args = parser.parse_args()
+
+    client = StreamFanoutClient(args.address)
+    print('connected, encoding {0}, streams {1}'.format(client.encoding, client.hello['streams']))
+    client.subscribe(args.streams.split(','))
+    counts = collections.Counter()
+    last = time.monotonic()
+    for message in client:
+        if 'labels' in message:
+            print('{streamName} labels: {labels}'.format(**message['labels']))
+            continue
+        for key in message:
+            if key != 'sid' and key != 'time':
+                counts[key] += 1
+        now = time.monotonic()
+        if now - last >= 1.0:
+            print(', '.join('{0}: {1:.0f}/s'.format(k, v / (now - last)) for k, v in sorted(counts.items())))
+            counts.clear()
+            last = now
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+import glob
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+# streams with numeric samples that can be recorded
+RECORDABLE_STREAMS = ('eeg', 'mot', 'met', 'pow')
+
+# every segment starts with a fixed size npy header, so it can be rewritten in place
+HEADER_LEN = 256
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def segment_dtype(n_cols, value_dtype=np.float32):
+    return np.dtype([('time', '<f8'), ('data', np.dtype(value_dtype).newbyteorder('<'), (n_cols,))])
+
+
+def npy_header(dtype, rows):
+    header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': ({1},), }}".format(
+        np.lib.format.dtype_to_descr(dtype), rows)
+    body_len = HEADER_LEN - len(NPY_MAGIC) - 2
+    if len(header) + 1 > body_len:
+        raise ValueError('Too many columns for a segment header: ' + header)
+    header = header.ljust(body_len - 1) + '\n'
+    return NPY_MAGIC + body_len.to_bytes(2, 'little') + header.encode('latin1')
+
+
+class SegmentWriter():
+    """
+    Appends samples of one stream to a single .npy segment
+
+    The file is a regular npy array of records (time float64, data value_dtype[n_cols]).
+    Rows are buffered and written in blocks. The row count in the header is written when the
+    segment is closed; StreamReader trusts the file size, so a segment stays readable while it
+    is written and after a crash.
+    """
+    def __init__(self, path, labels, value_dtype=np.float32, flush_rows=256):
+        self.path = path
+        self.labels = list(labels)
+        self.dtype = segment_dtype(len(self.labels), value_dtype)
+        self.rows = 0
+        self.first_time = None
+        self.last_time = None
+        self._pending = np.zeros(flush_rows, dtype=self.dtype)
+        self._n = 0
+
+        # never overwrite a segment, raises FileExistsError when the name is taken
+        self._file = open(path, 'xb')
+        self._file.write(npy_header(self.dtype, 0))
+        with open(path[:-len('.npy')] + '.json', 'w') as f:
+            json.dump({'labels': self.labels, 'dtype': np.dtype(value_dtype).str}, f)
+
+    def nbytes(self):
+        return HEADER_LEN + (self.rows + self._n) * self.dtype.itemsize
+
+    def append(self, time, values):
+        row = self._pending[self._n]
+        row['time'] = time
+        row['data'] = values[:len(self.labels)]
+        self._n += 1
+        if self.first_time is None:
+            self.first_time = time
+        self.last_time = time
+        if self._n == len(self._pending):
+            self.flush()
+
+    def extend(self, times, values):
+        self.flush()
+        block = np.empty(len(times), dtype=self.dtype)
+        block['time'] = times
+        block['data'] = np.asarray(values)[:, :len(self.labels)]
+        if len(times) > 0:
+            if self.first_time is None:
+                self.first_time = float(times[0])
+            self.last_time = float(times[-1])
+        self._write(block)
+
+    def flush(self):
+        if self._n > 0:
+            self._write(self._pending[:self._n])
+            self._n = 0
+
+    def _write(self, block):
+        self._file.write(block.tobytes())
+        self.rows += len(block)
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.seek(0)
+        self._file.write(npy_header(self.dtype, self.rows))
+        self._file.close()
+
+
+class StreamRecorder():
+    """
+    Records Cortex data streams to chunked, memory-mappable .npy segments.
+
+    Every stream gets a directory under root, with one segment per file:
+        root/eeg/20240101-120000-0000.npy   samples as records (time, data[n_cols])
+        root/eeg/20240101-120000-0000.json  labels of the data columns
+    A new segment is started when the current one reaches max_bytes, when it spans
+    max_seconds of Cortex time, or when the labels of the stream change.
+    Use StreamReader, or numpy.load(path, mmap_mode='r'), to open the segments.
+
+        recorder = StreamRecorder('recordings/session1')
+        recorder.attach(cortex, dispatch)
+
+    With a DispatchQueue the segments are written on its workers, so a slow disk never delays
+    the websocket receive thread.
+
+    Samples are taken from the new_[stream]_block events in block mode, otherwise from new_[stream]_data,
+    so streams in suppress_samples without block mode are not recorded.
+
+    Methods
+    -------
+    attach(cortex, dispatch=None):
+        To record the streams subscribed by a Cortex, on the workers of dispatch when given.
+    append(stream_name, time, values), extend(stream_name, times, values):
+        To record samples directly.
+    flush():
+        To write buffered samples of every stream.
+    close():
+        To close every segment.
+    """
+    def __init__(self, root, streams=RECORDABLE_STREAMS, max_bytes=256 * 1024 * 1024, max_seconds=3600.0,
+                 value_dtype=np.float32, flush_rows=256):
+        self.root = root
+        self.streams = tuple(streams)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.value_dtype = value_dtype
+        self.flush_rows = flush_rows
+        self.labels = {}
+        self.writers = {}
+        self._seq = {}
+        self._cortex = None
+
+    def attach(self, cortex, dispatch=None):
+        self._cortex = cortex
+        on_new_data_labels, on_new_data, on_new_block = self.on_new_data_labels, self.on_new_data, self.on_new_block
+        if dispatch is not None:
+            # one queue keeps the labels of a stream ahead of its samples
+            on_new_data_labels = dispatch.wrap('record', on_new_data_labels, maxsize=4096, policy='block')
+            on_new_data = dispatch.wrap('record', on_new_data)
+            on_new_block = dispatch.wrap('record', on_new_block)
+        cortex.bind(new_data_labels=on_new_data_labels)
+        events = {}
+        for stream_name in self.streams:
+            events['new_' + stream_name + '_data'] = on_new_data
+            events['new_' + stream_name + '_block'] = on_new_block
+        cortex.bind(**events)
+
+    def on_new_data_labels(self, *args, **kwargs):
+        data = kwargs.get('data')
+        stream_name = data['streamName']
+        if stream_name not in self.streams:
+            return
+        labels = list(data['labels'])
+        if self.labels.get(stream_name) != labels:
+            self.labels[stream_name] = labels
+            self.rotate(stream_name)
+
+    def on_new_data(self, *args, **kwargs):
+        data = kwargs.get('data')
+        for stream_name in self.streams:
+            if stream_name in data:
+                # in block mode the same samples arrive again as new_[stream]_block
+                if self._cortex is not None and self._cortex.sample_mode(stream_name) == 'block':
+                    return
+                self.append(stream_name, data['time'], data[stream_name])
+                return
+
+    def on_new_block(self, *args, **kwargs):
+        data = kwargs.get('data')
+        if data['streamName'] in self.streams:
+            self.extend(data['streamName'], data['time'], data['data'])
+
+    def writer(self, stream_name, time):
+        writer = self.writers.get(stream_name)
+        if writer is not None:
+            if writer.nbytes() >= self.max_bytes or \
+                    (writer.first_time is not None and time - writer.first_time >= self.max_seconds):
+                writer = self.rotate(stream_name, time)
+            return writer
+        return self.rotate(stream_name, time)
+
+    def rotate(self, stream_name, time=None):
+        writer = self.writers.pop(stream_name, None)
+        if writer is not None:
+            writer.close()
+        if time is None:
+            # labels changed, the next sample opens the segment
+            return None
+
+        labels = self.labels.get(stream_name)
+        if labels is None:
+            raise KeyError('No labels for stream {0}. Subscribe it or call set_labels first.'.format(stream_name))
+        directory = os.path.join(self.root, stream_name)
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(time, timezone.utc).strftime('%Y%m%d-%H%M%S')
+        seq = self._seq.get(stream_name, 0)
+        while True:
+            # a name taken by an earlier run or another recorder in the same root is skipped
+            path = os.path.join(directory, '{0}-{1:04d}.npy'.format(stamp, seq))
+            seq += 1
+            try:
+                writer = SegmentWriter(path, labels, self.value_dtype, self.flush_rows)
+                break
+            except FileExistsError:
+                continue
+        self._seq[stream_name] = seq
+        self.writers[stream_name] = writer
+        return writer
+
+    def set_labels(self, stream_name, labels):
+        self.labels[stream_name] = list(labels)
+        self.rotate(stream_name)
+
+    def append(self, stream_name, time, values):
+        self.writer(stream_name, time).append(time, values)
+
+    def extend(self, stream_name, times, values):
+        if len(times) == 0:
+            return
+        self.writer(stream_name, float(times[0])).extend(times, values)
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+class StreamReader():
+    """
+    Opens the segments of one recorded stream as memory maps
+
+    Attributes
+    ----------
+    segments : list
+        dictionaries with 'path', 'labels', 'rows', 'start' and 'end' time, in time order
+
+    Methods
+    -------
+    iter_segments(start=None, stop=None):
+        To get (times, data) memory mapped views of every segment overlapping [start, stop).
+    read(start=None, stop=None):
+        To get the samples in [start, stop) as arrays.
+    """
+    def __init__(self, root, stream_name):
+        self.root = root
+        self.stream_name = stream_name
+        self.segments = []
+        for path in sorted(glob.glob(os.path.join(root, stream_name, '*.npy'))):
+            segment = self.open_segment(path)
+            if segment is not None:
+                self.segments.append(segment)
+        self.segments.sort(key=lambda s: s['start'])
+        self.labels = self.segments[-1]['labels'] if self.segments else []
+
+    @staticmethod
+    def open_segment(path):
+        with open(path[:-len('.npy')] + '.json') as f:
+            meta = json.load(f)
+        dtype = segment_dtype(len(meta['labels']), np.dtype(meta['dtype']))
+        # the file size is authoritative, the header may lag after a crash
+        rows = (os.path.getsize(path) - HEADER_LEN) // dtype.itemsize
+        if rows <= 0:
+            return None
+        records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_LEN, shape=(rows,))
+        return {'path': path, 'labels': meta['labels'], 'rows': rows, 'records': records,
+                'start': float(records['time'][0]), 'end': float(records['time'][-1])}
+
+    def iter_segments(self, start=None, stop=None):
+        for segment in self.segments:
+            if start is not None and segment['end'] < start:
+                continue
+            if stop is not None and segment['start'] >= stop:
+                continue
+            times = segment['records']['time']
+            i = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+            j = len(times) if stop is None else int(np.searchsorted(times, stop, side='left'))
+            records = segment['records'][i:j]
+            yield records['time'], records['data']
+
+    def read(self, start=None, stop=None):
+        """
+        To get the samples whose Cortex time t satisfies start <= t < stop
+
+        Returns
+        -------
+        times: numpy array of shape (n,)
+        data: numpy array of shape (n, len(labels))
+            A single segment is returned as memory mapped views, several segments are concatenated.
+        """
+        parts = list(self.iter_segments(start, stop))
+        if len(parts) == 1:
+            return parts[0]
+        if len(parts) == 0:
+            return np.zeros(0), np.zeros((0, len(self.labels)), dtype=np.float32)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
@@ -1,5 +1,15 @@
 from cortex import Cortex
-import pandas as pd
+from dispatch_queue import DispatchQueue
+from stream_recorder import StreamRecorder
+from met_writer import MetCsvWriter
+from subscription_manager import SubscriptionManager
+from stream_fanout import StreamFanoutServer
+from live_state import LiveStateWriter, LIVE_STATE_NAME
+from biometric_store import BiometricStore, BIOMETRIC_DB
+from eeg_features import EEGFeatureEngine
+from attention_model import AttentionModel
+import atexit
+import sqlite3
 import os
 from dotenv import load_dotenv
 
@@ -11,6 +21,22 @@ class Subcribe():
     ----------
     c : Cortex
         Cortex communicate with Emotiv Cortex Service
+    dispatch : DispatchQueue
+        runs slow handlers, such as writing performance metrics to csv, off the websocket thread
+    subscriptions : SubscriptionManager
+        subscribes a stream while it has consumers
+    met_writer : MetCsvWriter
+        writes performance metrics to the daily csv read by CyberParents
+    recorder : StreamRecorder
+        records eeg, mot, met and pow to .npy segments when record_dir is given, otherwise None
+    fanout : StreamFanoutServer
+        publishes the stream frames to local subscribers when fanout_address is given, otherwise None
+    live_state : LiveStateWriter
+        shares the latest performance metrics with the CyberParents backend, None when live_state_name is None
+    store : BiometricStore
+        keeps the performance metrics in the database read by CyberParents, None when store_path is None
+    attention : AttentionModel
+        records eeg features and predicts focus with the model of attention_user, otherwise None
 
     Methods
     -------
@@ -30,21 +56,76 @@ class Subcribe():
         To handle performance metrics data emitted from Cortex
     on_new_pow_data(*args, **kwargs):
         To handle band power data emitted from Cortex
+    on_new_eeg_block(*args, **kwargs):
+        To handle blocks of eeg data emitted from Cortex in block mode
     """
-    def __init__(self, app_client_id, app_client_secret, **kwargs):
+    def __init__(self, app_client_id, app_client_secret, record_dir=None, fanout_address=None,
+                 live_state_name=LIVE_STATE_NAME, store_path=BIOMETRIC_DB, attention_user=None, **kwargs):
         """
         Constructs cortex client and bind a function to handle subscribed data streams
         If you do not want to log request and response message , set debug_mode = False. The default is True
+        The per sample met and eeg block prints are only shown in debug mode
+        If record_dir is set, the subscribed streams are recorded there, see StreamRecorder
+        If fanout_address is set, for example '127.0.0.1:7000', other processes can receive the streams, see StreamFanoutServer
+        The latest performance metrics are shared in memory under live_state_name, see LiveStateWriter
+        The performance metrics are stored in the database at store_path, see BiometricStore
+        If attention_user is set, eeg is subscribed too and its features are recorded for the focus model
+        of that user, which CyberParents uses in place of the met formula once trained, see AttentionModel
         """
         print("Subscribe __init__")
-        self.c = Cortex(app_client_id, app_client_secret, debug_mode=True, **kwargs)
+        kwargs.setdefault('debug_mode', True)
+        self.c = Cortex(app_client_id, app_client_secret, **kwargs)
         self.c.bind(create_session_done=self.on_create_session_done)
+        self.subscriptions = SubscriptionManager(self.c)
+        self.consumers = []
         self.c.bind(new_data_labels=self.on_new_data_labels)
         self.c.bind(new_eeg_data=self.on_new_eeg_data)
         self.c.bind(new_mot_data=self.on_new_mot_data)
         self.c.bind(new_dev_data=self.on_new_dev_data)
-        self.c.bind(new_met_data=self.on_new_met_data)
+        # met is written to csv, keep every sample but never block the websocket thread on disk
+        self.met_writer = MetCsvWriter()
+        atexit.register(self.met_writer.close)
+        # the live state and the database are optional sinks, the csv is written without them
+        self.live_state = None
+        if live_state_name is not None:
+            try:
+                self.live_state = LiveStateWriter(live_state_name)
+                atexit.register(self.live_state.close)
+            except OSError as e:
+                print('live state {0} is not available: {1}'.format(live_state_name, e))
+        self.store = None
+        if store_path is not None:
+            try:
+                self.store = BiometricStore(store_path)
+                atexit.register(self.store.close)
+            except sqlite3.Error as e:
+                print('biometric store {0} is not available: {1}'.format(store_path, e))
+        # a recorder stalled on disk must not hold up the met sinks, give it a worker of its own
+        self.dispatch = DispatchQueue(workers=2 if record_dir is not None else 1)
+        self.recorder = None
+        if record_dir is not None:
+            self.recorder = StreamRecorder(record_dir)
+            self.recorder.attach(self.c, self.dispatch)
+            atexit.register(self.recorder.close)
+        self.fanout = None
+        if fanout_address is not None:
+            self.fanout = StreamFanoutServer(fanout_address)
+            self.fanout.attach(self.c)
+            self.fanout.start()
+            atexit.register(self.fanout.close)
+        self.features = None
+        self.attention = None
+        if attention_user is not None:
+            self.features = EEGFeatureEngine()
+            self.features.attach(self.c)
+            self.attention = AttentionModel(attention_user)
+            self.attention.attach(self.features)
+            atexit.register(self.attention.close)
+        # registered last so it runs first at exit: drain the queue, then close the csv and the recorder
+        atexit.register(self.dispatch.shutdown)
+        self.c.bind(new_met_data=self.dispatch.wrap('met', self.on_new_met_data, maxsize=4096, policy='block'))
         self.c.bind(new_pow_data=self.on_new_pow_data)
+        self.c.bind(new_eeg_block=self.on_new_eeg_block)
         self.c.bind(inform_error=self.on_inform_error)
 
     def start(self, streams, headset_id=''):
@@ -70,7 +151,11 @@ class Subcribe():
         -------
         None
         """
+        if self.attention is not None and 'eeg' not in streams:
+            streams = list(streams) + ['eeg']
         self.streams = streams
+        # the streams are subscribed by the subscription manager once the session is created
+        self.consumers = [self.subscriptions.acquire(stream) for stream in streams]
 
         if headset_id != '':
             self.c.set_wanted_headset(headset_id)
@@ -95,11 +180,12 @@ class Subcribe():
         -------
         None
         """
-        self.c.sub_request(streams)
+        self.consumers += [self.subscriptions.acquire(stream) for stream in streams]
 
     def unsub(self, streams):
         """
         To unsubscribe to one or more data streams
+        A stream still used by another consumer of the subscription manager stays subscribed
         'eeg': EEG
         'mot' : Motion
         'dev' : Device information
@@ -115,7 +201,9 @@ class Subcribe():
         -------
         None
         """
-        self.c.unsub_request(streams)
+        for consumer in [c for c in self.consumers if c.stream_name in streams]:
+            consumer.release()
+            self.consumers.remove(consumer)
 
     def on_new_data_labels(self, *args, **kwargs):
         """
@@ -186,30 +274,25 @@ class Subcribe():
         if not data:
             return
 
-        print(f'pm data: {data["met"]} time: {data["time"]}\n')
+        if self.c.debug:
+            print(f'pm data: {data["met"]} time: {data["time"]}\n')
 
-        # 构建新的一行数据
-        new_row = pd.DataFrame([{
-            'attention': data['met'][1],
-            'engagement': data['met'][3],
-            'excitement': data['met'][5],
-            'interest': data['met'][8],
-            'relaxation': data['met'][10],
-            'stress': data['met'][12],
-            'time': pd.to_datetime(data['time'], unit='s')  # 转为时间戳
-        }])
+        # 先写入当天的 CSV（缓冲写入，文件句柄保持打开），其他输出出错时也不会丢失
+        self.met_writer.write(data['time'], data['met'])
 
-        # 生成文件名（以日期命名）
-        date_str = new_row['time'].dt.strftime('%Y-%m-%d').iloc[0]
-        filename = f"{date_str}.csv"
+        # 更新共享内存中的实时状态，后端直接读取
+        if self.live_state is not None:
+            try:
+                self.live_state.write_met(data['time'], data['met'])
+            except Exception as e:
+                print(f'写入实时状态失败: {e}')
 
-        # 判断文件是否存在
-        file_exists = os.path.isfile(filename)
-
-        # 写入 CSV（追加或新建）
-        new_row.to_csv(filename, mode='a', header=not file_exists, index=False)
-
-        print(f"Written to {filename}:\n{new_row}\n")
+        # 写入数据库，后端按时间范围查询
+        if self.store is not None:
+            try:
+                self.store.write_met(data['time'], data['met'])
+            except Exception as e:
+                print(f'写入数据库失败: {e}')
 
     def on_new_pow_data(self, *args, **kwargs):
         """
@@ -224,13 +307,27 @@ class Subcribe():
         data = kwargs.get('data')
         print('pow data: {}'.format(data))
 
+    def on_new_eeg_block(self, *args, **kwargs):
+        """
+        To handle blocks of eeg data emitted from Cortex
+        Only emitted when Subcribe is created with block_size or block_ms, for example
+        Subcribe(id, secret, block_size={'eeg': 32})
+
+        Returns
+        -------
+        data: dictionary
+             'data' is a numpy array with one row per sample, its columns match 'labels'.
+             'time' is a numpy array with the timestamp of each row.
+        For example: {'streamName': 'eeg', 'labels': ['COUNTER', ...], 'time': array([...]), 'data': array([[...], ...])}
+        """
+        data = kwargs.get('data')
+        if self.c.debug:
+            print('eeg block: {} samples, mean {}'.format(len(data['time']), data['data'].mean(axis=0)))
+
     # callbacks functions
     def on_create_session_done(self, *args, **kwargs):
         print('on_create_session_done')
 
-        # subribe data 
-        self.sub(self.streams)
-
     def on_inform_error(self, *args, **kwargs):
         error_data = kwargs.get('error_data')
         print(error_data)
@@ -256,7 +353,8 @@ def main():
     your_app_client_id = os.getenv("EMOTIV_CLIENT_ID")
     your_app_client_secret = os.getenv("EMOTIV_CLIENT_SECRET")
 
-    s = Subcribe(your_app_client_id, your_app_client_secret)
+    # set ATTENTION_USER to record eeg features for the focus model of that user
+    s = Subcribe(your_app_client_id, your_app_client_secret, attention_user=os.getenv("ATTENTION_USER"))
 
     # list data streams
     streams = ['met']
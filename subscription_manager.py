@@ -0,0 +1,182 @@
+import threading
+
+from cortex import STATE_CLOSED, STATE_SESSION_READY
+
+
+class Subscription():
+    """
+    A consumer of one stream, returned by SubscriptionManager.acquire
+
+    The handler is called through on_data, bound to new_[stream]_data of this subscription only,
+    so the same handler can be acquired for several streams and released for each separately.
+
+    Methods
+    -------
+    release():
+        To stop consuming the stream. Calling it again has no effect.
+    """
+    def __init__(self, manager, stream_name, handler):
+        self.manager = manager
+        self.stream_name = stream_name
+        self.handler = handler
+        self.released = False
+
+    def on_data(self, *args, **kwargs):
+        return self.handler(*args, **kwargs)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.manager.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SubscriptionManager():
+    """
+    Subscribes Cortex streams on demand by counting their consumers.
+
+    The stream is subscribed when its first consumer is acquired, or as soon as a session is
+    created if there is none yet, and unsubscribed when its last consumer is released. With
+    linger > 0 the unsubscribe is delayed, so a consumer coming back quickly does not cause a
+    subscribe / unsubscribe round trip.
+
+        subscriptions = SubscriptionManager(cortex)
+        eeg = subscriptions.acquire('eeg', on_new_eeg_data)
+        ...
+        eeg.release()
+
+    Attributes
+    ----------
+    counts : dict
+        stream name -> number of consumers
+    active : set
+        streams requested from Cortex and not unsubscribed since
+    pending : set
+        active streams whose subscribe request has not been answered yet
+
+    Methods
+    -------
+    acquire(stream_name, handler=None):
+        To register a consumer, optionally binding handler to new_[stream]_data. Returns a Subscription.
+    release(subscription):
+        To unregister a consumer, the same as subscription.release().
+    """
+    def __init__(self, cortex, linger=0.0):
+        self.cortex = cortex
+        self.linger = linger
+        self.counts = {}
+        self.active = set()
+        self.pending = set()
+        # subscriptions with a handler, pydispatch only keeps weak references to their on_data
+        self.bound = set()
+        self._pending_unsub = {}
+        self._lock = threading.RLock()
+        cortex.bind(create_session_done=self.on_create_session_done)
+        cortex.bind(warn_cortex_stop_all_sub=self.on_session_lost)
+        cortex.bind(state_changed=self.on_state_changed)
+        cortex.bind(new_data_labels=self.on_new_data_labels)
+
+    def session_ready(self):
+        return self.cortex.session_id != ''
+
+    def acquire(self, stream_name, handler=None):
+        subscription = Subscription(self, stream_name, handler)
+        if handler is not None:
+            self.bound.add(subscription)
+            self.cortex.bind(**{'new_' + stream_name + '_data': subscription.on_data})
+
+        with self._lock:
+            count = self.counts.get(stream_name, 0)
+            self.counts[stream_name] = count + 1
+            pending = self._pending_unsub.pop(stream_name, None)
+            if pending is not None:
+                pending.cancel()
+            if stream_name not in self.active and self.session_ready():
+                self.subscribe([stream_name])
+        return subscription
+
+    def subscribe(self, streams):
+        with self._lock:
+            self.active.update(streams)
+            self.pending.update(streams)
+        self.cortex.sub_request(streams)
+
+    def release(self, subscription):
+        stream_name = subscription.stream_name
+        if subscription.handler is not None:
+            self.cortex.unbind(subscription.on_data)
+            self.bound.discard(subscription)
+
+        with self._lock:
+            count = self.counts.get(stream_name, 0) - 1
+            if count > 0:
+                self.counts[stream_name] = count
+                return
+            self.counts.pop(stream_name, None)
+            if stream_name not in self.active:
+                return
+            if self.linger > 0:
+                self._pending_unsub[stream_name] = self.cortex.scheduler.call_later(self.linger, self.unsubscribe_idle, stream_name)
+            else:
+                self.unsubscribe_idle(stream_name)
+
+    def unsubscribe_idle(self, stream_name):
+        with self._lock:
+            self._pending_unsub.pop(stream_name, None)
+            if self.counts.get(stream_name, 0) > 0 or stream_name not in self.active:
+                return
+            self.active.discard(stream_name)
+            self.pending.discard(stream_name)
+            if self.session_ready():
+                self.cortex.unsub_request([stream_name])
+
+    def on_create_session_done(self, *args, **kwargs):
+        with self._lock:
+            streams = [name for name, count in self.counts.items() if count > 0 and name not in self.active]
+            if len(streams) == 0:
+                return
+        self.subscribe(streams)
+
+    def on_new_data_labels(self, *args, **kwargs):
+        # the labels are sent with the subscribe result of a stream
+        with self._lock:
+            self.pending.discard(kwargs.get('data')['streamName'])
+
+    def on_state_changed(self, *args, **kwargs):
+        state = kwargs.get('data')['new']
+        if state == STATE_CLOSED:
+            self.on_session_lost()
+        elif state == STATE_SESSION_READY:
+            self.reconcile_restore()
+
+    def reconcile_restore(self):
+        # a session recreated by auto_reconnect subscribes cortex.restore_streams again right after
+        # this state change. Match them with the consumers: streams acquired during the outage are
+        # added, streams released during the outage are left out. Without restore_streams the
+        # streams whose subscribe was in flight are requested again by on_create_session_done
+        cortex = self.cortex
+        if len(cortex.restore_streams) == 0:
+            return
+        with self._lock:
+            streams = [name for name, count in self.counts.items() if count > 0]
+            self.active = set(streams)
+            self.pending = set(streams)
+        cortex.outage_streams.intersection_update(streams)
+        cortex.restore_streams = streams
+
+    def on_session_lost(self, *args, **kwargs):
+        # the session is gone with its subscriptions. With auto_reconnect Cortex subscribes them
+        # again itself, see reconcile_restore, otherwise they are requested with the next session.
+        # A subscribe still in flight is lost with the session and not known to Cortex, keep it
+        # for the next session
+        with self._lock:
+            if self.cortex.auto_reconnect:
+                self.active -= self.pending
+            else:
+                self.active = set()
+            self.pending = set()
@@ -0,0 +1,76 @@
+import numpy as np
+
+from artifact_detector import ArtifactDetector
+
+FS = 128.0
+EEG_LABELS = ['COUNTER', 'INTERPOLATED', 'AF3', 'T7', 'AF4', 'RAW_CQ']
+MOT_LABELS = ['COUNTER_MEMS', 'INTERPOLATED_MEMS', 'ACCX', 'ACCY', 'ACCZ']
+
+
+def clean_eeg(seconds=10.0, seed=0):
+    t = np.arange(int(seconds * FS)) / FS
+    rng = np.random.default_rng(seed)
+    x = np.zeros((len(t), len(EEG_LABELS)))
+    x[:, 0] = np.arange(len(t)) % 128
+    for col in (2, 3, 4):
+        x[:, col] = 4200.0 + 15.0 * np.sin(2 * np.pi * 10.0 * t + col) + rng.normal(scale=3.0, size=len(t))
+    return t, x
+
+
+def run_eeg(detector, t, x, block=32):
+    detector.set_eeg_labels(EEG_LABELS)
+    intervals = []
+    for i in range(0, len(t), block):
+        intervals += detector.process_eeg(t[i:i + block], x[i:i + block])
+    return intervals
+
+
+def test_clean_eeg_is_not_flagged():
+    t, x = clean_eeg()
+    detector = ArtifactDetector()
+    assert run_eeg(detector, t, x) == []
+    assert detector.contamination(t[0], t[-1]) == 0.0
+
+
+def test_blink_and_step_are_flagged():
+    t, x = clean_eeg()
+    # a 300 ms blink of 200 µV on AF3 at 4 s
+    blink = (t >= 4.0) & (t < 4.3)
+    x[blink, 2] += 200.0 * np.sin(np.pi * (t[blink] - 4.0) / 0.3)
+    # an electrode pop on AF4 at 7 s
+    x[t >= 7.0, 4] += 150.0
+
+    detector = ArtifactDetector()
+    intervals = run_eeg(detector, t, x)
+    assert [i['kind'] for i in intervals] == ['blink', 'blink']
+    first, second = intervals
+    assert first['start'] <= 4.05 and 4.25 <= first['end'] < 5.0
+    assert first['peak'] > 100.0
+    assert first['channels'] == ['AF3', 'AF4']
+    assert 6.8 <= second['start'] <= 7.05
+    # T7 is not a frontal channel, the same step there is ignored
+    t, x = clean_eeg()
+    x[t >= 7.0, 3] += 150.0
+    assert run_eeg(ArtifactDetector(), t, x) == []
+
+    assert detector.contamination(3.0, 5.0, kinds=('blink',)) > 0.1
+    assert detector.contamination(0.0, 3.5) == 0.0
+
+
+def test_head_motion_is_flagged():
+    n = int(10 * 64)
+    t = np.arange(n) / 64.0
+    rng = np.random.default_rng(3)
+    acc = np.zeros((n, len(MOT_LABELS)))
+    acc[:, 4] = 1.0 + rng.normal(scale=0.005, size=n)
+    acc[:, 2:4] = rng.normal(scale=0.005, size=(n, 2))
+    # a jolt of 0.5 g for 100 ms at 5 s
+    acc[(t >= 5.0) & (t < 5.1), 2] += 0.5
+
+    detector = ArtifactDetector()
+    detector.set_mot_labels(MOT_LABELS)
+    intervals = []
+    for i in range(0, n, 16):
+        intervals += detector.process_mot(t[i:i + 16], acc[i:i + 16])
+    assert [i['kind'] for i in intervals] == ['motion']
+    assert 4.8 <= intervals[0]['start'] <= 5.0 and 5.1 <= intervals[0]['end'] <= 5.5
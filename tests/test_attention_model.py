@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from attention_model import AttentionModel, FEATURE_NAMES, FEATURE_STREAM, feature_vector
+from eeg_features import EEGFeatureEngine
+from real_data_reader import RealBioDataReader
+
+# 2026-01-01 10:00:00 UTC, sessions are 100 s apart
+T0 = datetime(2026, 1, 1, 10, 0, 0, tzinfo=timezone.utc).timestamp()
+LOW = np.array([0.05, 0.3, 0.3, 0.15, 0.1, 0.1, 0.5, 0.0, -0.5, 0.8])
+HIGH = np.array([0.05, 0.2, 0.2, 0.2, 0.2, 0.15, -0.2, 0.0, 0.3, 0.7])
+
+
+def sqlite_text(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+@pytest.fixture
+def db(tmp_path):
+    # the tables of CyberParents/backend/main.py a focus session is found through
+    path = str(tmp_path / 'todos.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE conversations (id INTEGER PRIMARY KEY, session_id TEXT NOT NULL);
+        CREATE TABLE goals (id INTEGER PRIMARY KEY, conversation_id INTEGER);
+        CREATE TABLE tasks (id INTEGER PRIMARY KEY, goal_id INTEGER);
+        CREATE TABLE focus_sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER NOT NULL,
+            start_time TIMESTAMP, end_time TIMESTAMP, focus_score REAL);
+        INSERT INTO conversations VALUES (1, 'alice'), (2, 'bob');
+        INSERT INTO goals VALUES (1, 1), (2, 2);
+        INSERT INTO tasks VALUES (1, 1), (2, 2);
+    ''')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def add_session(db, task_id, n, focus_score, ended=True):
+    start = T0 + 100 * n
+    conn = sqlite3.connect(db)
+    conn.execute('INSERT INTO focus_sessions (task_id, start_time, end_time, focus_score) VALUES (?, ?, ?, ?)',
+                 (task_id, sqlite_text(start), sqlite_text(start + 60) if ended else None, focus_score))
+    conn.commit()
+    conn.close()
+
+
+def record_features(model, n, center, seed=0):
+    # 4 feature vectors per second during the 60 s of session n
+    rng = np.random.default_rng(seed + n)
+    for i in range(240):
+        model.recorder.append(FEATURE_STREAM, T0 + 100 * n + i / 4.0, center + rng.normal(scale=0.02, size=len(center)))
+
+
+def test_sessions_train_a_model_that_is_saved_per_user(tmp_path, db):
+    model_dir = str(tmp_path / 'models')
+    model = AttentionModel('alice', model_dir)
+    for n in range(6):
+        record_features(model, n, HIGH if n % 2 else LOW)
+        add_session(db, 1, n, 0.9 if n % 2 else 0.2)
+
+    assert not model.fitted()
+    assert model.train_from_sessions(db, 'alice') == 6
+    low, high = model.predict(np.vstack([LOW, HIGH]))
+    assert low < 0.5 < high
+
+    # features are shared by the users, the model is per user
+    assert model.path == os.path.join(model_dir, 'alice', 'model.joblib')
+    assert os.path.isfile(model.path)
+    assert os.path.isdir(os.path.join(model_dir, FEATURE_STREAM))
+    assert not os.path.exists(os.path.join(model_dir, 'bob'))
+
+    loaded = AttentionModel('alice', model_dir, record=False)
+    assert loaded.n_samples == model.n_samples == 6 * 240
+    assert loaded.learned_sessions == {1, 2, 3, 4, 5, 6}
+    np.testing.assert_allclose(loaded.predict(np.vstack([LOW, HIGH])), [low, high])
+    assert not AttentionModel('bob', model_dir, record=False).fitted()
+    model.close()
+
+
+def test_learned_and_unlabeled_sessions_are_skipped(tmp_path, db):
+    model_dir = str(tmp_path / 'models')
+    model = AttentionModel('alice', model_dir)
+    for n in range(5):
+        record_features(model, n, LOW)
+    add_session(db, 1, 0, 0.3)
+    # still running, ends after the next session
+    add_session(db, 1, 1, None, ended=False)
+    add_session(db, 1, 2, 0.4)
+    # no focus_level was posted during this one
+    add_session(db, 1, 3, None)
+    # another user
+    add_session(db, 2, 4, 0.8)
+
+    assert model.train_from_sessions(db, 'alice') == 2
+    assert model.learned_sessions == {1, 3}
+    assert model.train_from_sessions(db, 'alice') == 0
+    assert model.n_samples == 2 * 240
+
+    conn = sqlite3.connect(db)
+    conn.execute('UPDATE focus_sessions SET end_time = ?, focus_score = 0.5 WHERE id = 2', (sqlite_text(T0 + 160),))
+    conn.commit()
+    conn.close()
+    assert model.train_from_sessions(db, 'alice') == 1
+    assert model.learned_sessions == {1, 2, 3}
+
+    # every session when no user is given
+    everyone = AttentionModel('all', model_dir, record=False)
+    assert everyone.train_from_sessions(db) == 4
+    model.close()
+
+
+def test_predict_latest_reads_the_newest_features(tmp_path, db):
+    model_dir = str(tmp_path / 'models')
+    producer = AttentionModel('alice', model_dir)
+    backend = AttentionModel('alice', model_dir, record=False)
+    record_features(producer, 0, LOW)
+    record_features(producer, 1, HIGH)
+    # not trained yet
+    assert backend.predict_latest() is None
+
+    add_session(db, 1, 0, 0.2)
+    add_session(db, 1, 1, 0.9)
+    producer.train_from_sessions(db, 'alice')
+    # the backend reloads the model saved by the other instance
+    latest = backend.predict_latest()
+    assert latest['time'] == pytest.approx(T0 + 100 + 239 / 4.0)
+    assert latest['focus'] == pytest.approx(producer.predict(HIGH)[0], abs=0.05)
+    # the features are from 2026-01-01, too old for a live prediction
+    assert backend.predict_latest(max_age=10.0) is None
+
+    producer.recorder.append(FEATURE_STREAM, time.time(), LOW)
+    assert backend.predict_latest(max_age=10.0)['focus'] < latest['focus']
+    producer.close()
+
+
+def test_engine_features_are_recorded_and_predicted(tmp_path):
+    model = AttentionModel('alice', str(tmp_path / 'models'))
+    engine = EEGFeatureEngine(128.0, window=2.0)
+    predictions = []
+
+    def on_focus(*args, **kwargs):
+        predictions.append(kwargs['data'])
+
+    model.bind(new_focus_prediction=on_focus)
+    t = np.arange(256) / 128.0
+    x = 4200.0 + 20.0 * np.sin(2 * np.pi * 10.0 * t)[:, None] + np.random.default_rng(0).normal(size=(256, 2))
+    features = engine.compute(x, time=T0)
+    assert feature_vector(features).shape == (len(FEATURE_NAMES),)
+
+    model.on_new_eeg_features(data=features)
+    assert predictions == []
+    assert model.latest_features()[0] == T0
+
+    model.partial_fit([feature_vector(features)], [0.6])
+    model.on_new_eeg_features(data=features)
+    assert predictions[0]['time'] == T0 and 0.0 <= predictions[0]['focus'] <= 1.0
+    model.close()
+
+
+def test_backend_reader_uses_the_model_of_the_user(tmp_path, db):
+    model_dir = str(tmp_path / 'models')
+    producer = AttentionModel('alice', model_dir)
+    record_features(producer, 0, LOW)
+    add_session(db, 1, 0, 0.2)
+    producer.train_from_sessions(db, 'alice')
+    producer.recorder.append(FEATURE_STREAM, time.time(), LOW)
+
+    reader = RealBioDataReader(str(tmp_path), model_dir=model_dir)
+    assert reader.get_model_focus('alice')['focus'] == pytest.approx(producer.predict(LOW)[0])
+    # no trained model, the met formula is used
+    assert reader.get_model_focus('bob') is None
+    assert reader.get_model_focus(None) is None
+    producer.close()
@@ -0,0 +1,111 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from biometric_store import BiometricStore, EMOTION_FIELDS, MET_FIELDS
+
+
+def met_sample(value):
+    # a met sample as emitted by Cortex, see MET_CSV_INDEXES
+    return [True, value, True, value, True, value, True, True, value, True, value, True, value]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'biometrics.db')
+
+
+def count(store, table):
+    return store.query('SELECT COUNT(*) FROM ' + table)[0][0]
+
+
+def test_rows_are_committed_in_batches(path):
+    writer = BiometricStore(path, flush_rows=4, flush_seconds=60.0)
+    reader = BiometricStore(path)
+    try:
+        for i in range(3):
+            writer.write_met(100.0 + i, met_sample(0.1 * i))
+        # pending rows are not visible to other connections
+        assert count(reader, 'met') == 0
+
+        writer.write_emotion(101.5, 'happy', {'happy': 80.0})
+        assert count(reader, 'met') == 3
+        assert count(reader, 'emotion') == 1
+
+        writer.write_met(103.0, met_sample(0.3))
+        writer.flush()
+        assert count(reader, 'met') == 4
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_close_commits_pending_rows(path):
+    writer = BiometricStore(path, flush_rows=100, flush_seconds=60.0)
+    writer.write_met(100.0, met_sample(0.5))
+    writer.close()
+
+    reader = BiometricStore(path)
+    assert reader.latest_met(10) == [dict({'time': 100.0}, **{field: 0.5 for field in MET_FIELDS})]
+    reader.close()
+
+
+def test_met_range_is_half_open_and_ordered(path):
+    store = BiometricStore(path, flush_rows=1)
+    try:
+        for t in [105.0, 100.0, 103.0, 101.0, 104.0, 102.0]:
+            store.write_met(t, met_sample(t / 1000.0))
+        store.write_met(102.0, met_sample(0.9))
+
+        result = store.met_range(101.0, 104.0)
+        np.testing.assert_array_equal(result['time'], [101.0, 102.0, 103.0])
+        # the first row of a time is kept
+        np.testing.assert_allclose(result['attention'], [0.101, 0.102, 0.103])
+        assert len(store.met_range(106.0)['time']) == 0
+        assert len(store.met_range()['stress']) == 6
+    finally:
+        store.close()
+
+
+def test_emotion_range_and_latest(path):
+    store = BiometricStore(path, flush_rows=1)
+    try:
+        store.write_emotion(10.0, 'sad', {'sad': 60.0, 'neutral': 40.0})
+        store.write_emotion(20.0, 'happy', {'happy': 90.0})
+
+        result = store.emotion_range(15.0, None)
+        assert result['dominant'] == ['happy']
+        np.testing.assert_array_equal(result['happy'], [90.0])
+        latest = store.latest_emotion(1)
+        assert latest[0]['dominant'] == 'happy'
+        assert set(latest[0]) == {'time', 'dominant'} | set(EMOTION_FIELDS)
+    finally:
+        store.close()
+
+
+def test_migrate_imports_the_csv_files_once(path, tmp_path):
+    base = tmp_path / 'data'
+    (base / 'EmotionCV').mkdir(parents=True)
+    with open(base / '2026-01-01.csv', 'w') as f:
+        f.write('attention,engagement,excitement,interest,relaxation,stress,time\n')
+        f.write('0.1,0.2,0.3,0.4,0.5,0.6,2026-01-01 12:00:00.000000\n')
+        f.write('bad row\n')
+        f.write('0.2,0.2,0.3,0.4,0.5,0.6,2026-01-01 12:00:01.000000\n')
+    with open(base / 'EmotionCV' / 'emotion_log.csv', 'w') as f:
+        f.write('Timestamp,Dominant Emotion,Angry,Disgust,Fear,Happy,Sad,Surprise,Neutral\n')
+        f.write('2026-01-01 13:00:00,happy,0,0,0,90,5,0,5\n')
+
+    store = BiometricStore(path)
+    try:
+        assert store.migrate(str(base)) == {'met': 2, 'emotion': 1}
+        assert store.migrate(str(base)) == {'met': 2, 'emotion': 1}
+        assert count(store, 'met') == 2
+        assert count(store, 'emotion') == 1
+
+        # met csv times are UTC
+        first = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp()
+        np.testing.assert_array_equal(store.met_range()['time'], [first, first + 1.0])
+        assert store.latest_emotion(1)[0]['happy'] == 90.0
+    finally:
+        store.close()
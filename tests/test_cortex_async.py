@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from cortex_async import AsyncCortex
+from cortex_simulator import CortexSimulator
+
+
+class ReorderingSimulator(CortexSimulator):
+    # answers every two requests in reverse order, and numbers the queryHeadsets results
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.queries = 0
+
+    def query_headsets(self, websocket, params, sessions):
+        self.queries += 1
+        return [dict(headset, customName='query{0}'.format(self.queries)) for headset in self.headsets]
+
+    async def handle_connection(self, websocket):
+        held = []
+        async for message in websocket:
+            held.append(self.handle_request(websocket, json.loads(message), []))
+            if len(held) == 2:
+                for response in reversed(held):
+                    await websocket.send(json.dumps(response))
+                held = []
+
+
+def run_against(handler, scenario):
+    async def main():
+        async with websockets.serve(handler, 'localhost', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncCortex('client', 'secret', url='ws://localhost:{0}'.format(port))
+            await client.open()
+            try:
+                return await scenario(client)
+            finally:
+                await client.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_resolve_with_their_own_responses():
+    simulator = ReorderingSimulator()
+
+    async def scenario(client):
+        return await asyncio.gather(client.query_headset(), client.query_headset())
+
+    first, second = run_against(simulator.handle_connection, scenario)
+    assert first[0]['customName'] == 'query1'
+    assert second[0]['customName'] == 'query2'
+
+
+def test_pending_requests_fail_when_the_socket_closes():
+    async def hang_up(websocket):
+        await websocket.recv()
+        await websocket.close()
+
+    async def scenario(client):
+        with pytest.raises(ConnectionError):
+            await client.query_headset()
+
+    run_against(hang_up, scenario)
+
+
+def test_a_failing_message_does_not_stop_receiving():
+    simulator = CortexSimulator()
+
+    async def answer_after_garbage(websocket):
+        async for message in websocket:
+            request = json.loads(message)
+            # on_message raises KeyError for a frame it does not know
+            await websocket.send(json.dumps({'unknown': True}))
+            await websocket.send(json.dumps(simulator.handle_request(websocket, request, [])))
+
+    async def scenario(client):
+        return await asyncio.wait_for(client.query_headset(), 5)
+
+    headsets = run_against(answer_after_garbage, scenario)
+    assert headsets[0]['id'] == 'INSIGHT-SIM0001'
@@ -0,0 +1,66 @@
+import asyncio
+
+import websockets
+
+from cortex_async import AsyncCortex
+from cortex_simulator import CortexSimulator, SimulatedStream, MET_COLS, channel_names
+
+
+def frames(stream, count):
+    return [stream.frame(n, n / stream.rate) for n in range(count)]
+
+
+def test_same_seed_gives_same_frames():
+    channels = channel_names(5)
+    first = frames(SimulatedStream('met', 2.0, channels, seed=1), 20)
+    again = frames(SimulatedStream('met', 2.0, channels, seed=1), 20)
+    other = frames(SimulatedStream('met', 2.0, channels, seed=2), 20)
+    assert first == again
+    assert first != other
+    assert all(len(frame) == len(MET_COLS) for frame in first)
+
+
+def test_eeg_frames_match_the_subscribed_columns():
+    stream = SimulatedStream('eeg', 128.0, channel_names(5))
+    eeg = frames(stream, 300)
+    assert all(len(frame) == len(stream.cols) for frame in eeg)
+    # COUNTER wraps once per second
+    assert [frame[0] for frame in eeg[126:131]] == [126, 127, 0, 1, 2]
+
+
+def test_client_prepares_and_receives_eeg_from_the_simulator():
+    simulator = CortexSimulator(connect_delay=0.05, speed=4.0)
+    received = []
+    labels = []
+
+    def on_new_eeg_data(*args, **kwargs):
+        received.append(kwargs.get('data'))
+
+    def on_new_data_labels(*args, **kwargs):
+        labels.append(kwargs.get('data'))
+
+    async def main():
+        async with websockets.serve(simulator.handle_connection, 'localhost', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncCortex('client', 'secret', url='ws://localhost:{0}'.format(port))
+            client.bind(new_eeg_data=on_new_eeg_data, new_data_labels=on_new_data_labels)
+            await client.open()
+            try:
+                session_id = await asyncio.wait_for(client.do_prepare_steps(connect_interval=0.05), 5)
+                await client.sub_request(['eeg'])
+                for _ in range(100):
+                    if len(received) >= 64:
+                        break
+                    await asyncio.sleep(0.02)
+                return session_id
+            finally:
+                await client.close()
+
+    session_id = asyncio.run(main())
+    assert session_id
+    assert labels[0]['streamName'] == 'eeg'
+    assert len(received) >= 64
+    # markers are dropped, so each sample has one value per label
+    assert all(len(data['eeg']) == len(labels[0]['labels']) for data in received)
+    counters = [data['eeg'][0] for data in received]
+    assert all((b - a) % 128 == 1 for a, b in zip(counters, counters[1:]))
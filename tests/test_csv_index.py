@@ -0,0 +1,89 @@
+import os
+from datetime import datetime, timedelta
+
+from csv_index import CsvTimeIndex, DailyCsvStore
+
+HEADER = 'attention,time\n'
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def met_line(n, start=T0):
+    return '{0},{1}\n'.format(n, (start + timedelta(seconds=n)).strftime('%Y-%m-%d %H:%M:%S.%f'))
+
+
+def write(path, text, mode='a'):
+    with open(path, mode) as f:
+        f.write(text)
+
+
+def attention(rows):
+    return [int(row['attention']) for row in rows]
+
+
+def test_range_query_reads_only_rows_in_range(tmp_path):
+    path = str(tmp_path / '2026-01-01.csv')
+    write(path, HEADER + ''.join(met_line(n) for n in range(100)), 'w')
+    index = CsvTimeIndex(path, stride=8)
+
+    rows = index.query(T0 + timedelta(seconds=10), T0 + timedelta(seconds=20))
+    assert attention(rows) == list(range(10, 20))
+    assert rows[0]['time'] == T0 + timedelta(seconds=10)
+    assert len(index.offsets) == 13
+
+
+def test_appended_rows_are_indexed_incrementally(tmp_path):
+    path = str(tmp_path / '2026-01-01.csv')
+    write(path, HEADER + ''.join(met_line(n) for n in range(20)), 'w')
+    index = CsvTimeIndex(path, stride=8)
+    assert attention(index.query(None, None)) == list(range(20))
+
+    # a partial line is left for the next update
+    write(path, ''.join(met_line(n) for n in range(20, 30)) + '30,2026-01-01')
+    assert attention(index.query(T0 + timedelta(seconds=25), None)) == list(range(25, 30))
+    write(path, ' 12:00:30.000000\n')
+    assert attention(index.query(T0 + timedelta(seconds=25), None)) == list(range(25, 31))
+    assert index.rows == 31
+
+
+def test_malformed_row_at_an_index_point_is_not_skipped(tmp_path):
+    path = str(tmp_path / '2026-01-01.csv')
+    lines = [met_line(n) for n in range(20)]
+    lines[0] = '0,not a time\n'
+    lines[8] = '8,\n'
+    write(path, HEADER + ''.join(lines), 'w')
+    index = CsvTimeIndex(path, stride=8)
+
+    assert attention(index.query(T0, T0 + timedelta(seconds=12))) == [1, 2, 3, 4, 5, 6, 7, 9, 10, 11]
+    assert index.times[0] == T0 + timedelta(seconds=1)
+    assert index.times[1] == T0 + timedelta(seconds=9)
+
+
+def test_rewritten_file_is_indexed_again(tmp_path):
+    path = str(tmp_path / '2026-01-01.csv')
+    write(path, HEADER + ''.join(met_line(n) for n in range(20)), 'w')
+    index = CsvTimeIndex(path, stride=8)
+    assert len(index.query(None, None)) == 20
+
+    write(path, HEADER + ''.join(met_line(n) for n in range(5)), 'w')
+    assert attention(index.query(None, None)) == list(range(5))
+
+
+def test_daily_store_queries_across_files(tmp_path):
+    day2 = T0 + timedelta(days=1)
+    write(str(tmp_path / '2026-01-01.csv'), HEADER + ''.join(met_line(n, T0 + timedelta(hours=11)) for n in range(10)), 'w')
+    write(str(tmp_path / '2026-01-02.csv'), HEADER + ''.join(met_line(n, day2) for n in range(10)), 'w')
+    write(str(tmp_path / 'notes.csv'), 'time\n', 'w')
+    store = DailyCsvStore(str(tmp_path), converters={'attention': float}, stride=4)
+
+    rows = store.query(T0 + timedelta(hours=11, seconds=5), day2 + timedelta(seconds=3))
+    assert [row['attention'] for row in rows] == [5.0, 6.0, 7.0, 8.0, 9.0, 0.0, 1.0, 2.0]
+
+    # appended rows of the current day are found by the next query
+    write(str(tmp_path / '2026-01-02.csv'), met_line(10, day2))
+    rows = store.query(day2 + timedelta(seconds=9), None)
+    assert [row['attention'] for row in rows] == [9.0, 10.0]
+    assert len(store.files(day2 + timedelta(days=3), None)) == 0
+
+    os.remove(str(tmp_path / '2026-01-01.csv'))
+    store.query(None, None)
+    assert list(store.indexes) == [str(tmp_path / '2026-01-02.csv')]
@@ -0,0 +1,69 @@
+import os
+
+from csv_tail import CsvTailFollower
+
+
+def write(path, lines, mode='w'):
+    with open(path, mode, newline='') as f:
+        f.write(''.join(line + '\n' for line in lines))
+
+
+def test_reads_only_appended_rows(tmp_path):
+    path = str(tmp_path / 'met.csv')
+    write(path, ['time,value', '1,10', '2,20'])
+    tail = CsvTailFollower(path, converters={'value': float})
+
+    assert [row['value'] for row in tail.poll()] == [10.0, 20.0]
+    write(path, ['3,30'], mode='a')
+    assert [row['value'] for row in tail.poll()] == [10.0, 20.0, 30.0]
+
+
+def test_keeps_a_partial_line_for_the_next_poll(tmp_path):
+    path = str(tmp_path / 'met.csv')
+    write(path, ['time,value', '1,10'])
+    tail = CsvTailFollower(path)
+    tail.poll()
+    with open(path, 'a', newline='') as f:
+        f.write('2,2')
+
+    assert [row['time'] for row in tail.poll()] == ['1']
+    with open(path, 'a', newline='') as f:
+        f.write('0\n')
+    assert [row['value'] for row in tail.poll()] == ['10', '20']
+
+
+def test_opens_at_the_tail_of_a_large_file(tmp_path):
+    path = str(tmp_path / 'met.csv')
+    write(path, ['time,value'] + ['{0},{0}'.format(i) for i in range(10000)])
+    tail = CsvTailFollower(path, max_rows=5)
+    tail.BLOCK_SIZE = 256
+
+    assert [row['time'] for row in tail.poll()] == ['9995', '9996', '9997', '9998', '9999']
+
+
+def test_truncated_file_is_read_again(tmp_path):
+    path = str(tmp_path / 'met.csv')
+    write(path, ['time,value', '1,10', '2,20', '3,30'])
+    tail = CsvTailFollower(path)
+    tail.poll()
+
+    write(path, ['time,value', '4,40'])
+    assert [row['time'] for row in tail.poll()] == ['4']
+
+
+def test_rotated_file_is_read_again(tmp_path):
+    path = str(tmp_path / 'met.csv')
+    write(path, ['time,value', '1,10'])
+    tail = CsvTailFollower(path)
+    tail.poll()
+
+    # a new file moved into place, as large as the old one
+    rotated = str(tmp_path / 'met.csv.new')
+    write(rotated, ['time,value', '2,20', '3,30'])
+    os.replace(rotated, path)
+    assert [row['time'] for row in tail.poll()] == ['2', '3']
+
+
+def test_missing_file(tmp_path):
+    tail = CsvTailFollower(str(tmp_path / 'missing.csv'))
+    assert tail.poll() == []
@@ -0,0 +1,83 @@
+import threading
+
+from dispatch_queue import DispatchQueue
+
+
+def stalled_handler():
+    # the first call holds the worker until release is set, later calls queue up behind it
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+
+    return handler, calls, started, release
+
+
+def test_drop_oldest_keeps_the_newest_calls():
+    dispatch = DispatchQueue(workers=1)
+    handler, calls, started, release = stalled_handler()
+    put = dispatch.wrap('met', handler, maxsize=2, policy='drop_oldest')
+    put(1)
+    assert started.wait(5)
+    for value in range(2, 6):
+        put(value)
+    release.set()
+    dispatch.shutdown()
+
+    assert calls == [1, 4, 5]
+    stats = dispatch.stats('met')['met']
+    assert stats['put'] == 5 and stats['delivered'] == 3 and stats['dropped'] == 2
+    assert stats['max_depth'] == 2
+
+
+def test_latest_coalesces_to_the_newest_call():
+    dispatch = DispatchQueue(workers=1)
+    handler, calls, started, release = stalled_handler()
+    put = dispatch.wrap('pow', handler, maxsize=8, policy='latest')
+    put(1)
+    assert started.wait(5)
+    for value in range(2, 6):
+        put(value)
+    release.set()
+    dispatch.shutdown()
+
+    assert calls == [1, 5]
+    stats = dispatch.stats('pow')['pow']
+    assert stats['maxsize'] == 1 and stats['dropped'] == 3
+
+
+def test_block_delivers_every_call_in_order():
+    dispatch = DispatchQueue(workers=2)
+    calls = []
+    put = dispatch.wrap('eeg', calls.append, maxsize=1, policy='block')
+    for value in range(100):
+        put(value)
+    dispatch.shutdown()
+
+    assert calls == list(range(100))
+    assert dispatch.stats('eeg')['eeg']['dropped'] == 0
+
+
+def test_block_put_waits_while_the_queue_is_full():
+    dispatch = DispatchQueue(workers=1)
+    handler, calls, started, release = stalled_handler()
+    put = dispatch.wrap('eeg', handler, maxsize=1, policy='block')
+    put(1)
+    assert started.wait(5)
+    put(2)
+    producer = threading.Thread(target=put, args=(3,))
+    producer.start()
+    # the worker is held by 1 and 2 fills the queue, so 3 is not queued yet
+    producer.join(0.2)
+    assert producer.is_alive()
+    release.set()
+    producer.join(5)
+    assert not producer.is_alive()
+    dispatch.shutdown()
+
+    assert calls == [1, 2, 3]
+    assert dispatch.stats('eeg')['eeg']['max_depth'] == 1
@@ -0,0 +1,78 @@
+import numpy as np
+from pydispatch import Dispatcher
+from scipy import signal
+
+from eeg_features import EEGFeatureEngine, WelchSpectrum
+
+FS = 128.0
+
+
+def sines(freqs, seconds=2.0, noise=0.1, seed=0):
+    # one channel per frequency, on a DC offset like the headset
+    t = np.arange(int(seconds * FS)) / FS
+    rng = np.random.default_rng(seed)
+    x = np.column_stack([20.0 * np.sin(2 * np.pi * f * t) for f in freqs])
+    return t, 4200.0 + x + rng.normal(scale=noise, size=x.shape)
+
+
+def test_welch_matches_scipy():
+    _, x = sines([10.0, 21.0])
+    welch = WelchSpectrum(FS, 128)
+    freqs, expected = signal.welch(x.T, fs=FS, nperseg=128, axis=1)
+    np.testing.assert_allclose(welch.freqs, freqs)
+    np.testing.assert_allclose(welch.compute(x), expected, rtol=1e-9)
+
+
+def test_sine_power_lands_in_its_band():
+    _, x = sines([10.0, 6.0, 20.0])
+    engine = EEGFeatureEngine(FS, window=2.0)
+    features = engine.compute(x)
+
+    relative = features['relative_power']
+    bands = features['bands']
+    assert [bands[i] for i in relative.argmax(axis=1)] == ['alpha', 'theta', 'betaH']
+    assert relative[0, bands.index('alpha')] > 0.95
+    # the power of a sine of amplitude a is a ** 2 / 2
+    assert abs(features['band_power'][0, bands.index('alpha')] - 200.0) < 10.0
+    assert features['ratios']['alpha/theta'][0] > 100.0
+    # a pure tone has a much lower spectral entropy than white noise
+    noise = np.random.default_rng(1).normal(size=(256, 1))
+    assert features['spectral_entropy'][0] < 0.5 < engine.compute(noise)['spectral_entropy'][0]
+
+
+class EEGCortex(Dispatcher):
+    # a Cortex without an eeg ring buffer, emitting one new_eeg_data per sample
+    _events_ = ['new_data_labels', 'new_eeg_data', 'new_eeg_block']
+
+    def __init__(self):
+        self.headset_id = ''
+        self.stream_taps = []
+
+    def get_buffer(self, stream_name):
+        return None
+
+    def sample_mode(self, stream_name):
+        return 'data'
+
+
+def test_engine_emits_every_hop_once_the_window_is_full():
+    cortex = EEGCortex()
+    engine = EEGFeatureEngine(FS, window=2.0, hop=0.25)
+    engine.attach(cortex)
+    received = []
+
+    def on_features(*args, **kwargs):
+        received.append(kwargs['data'])
+
+    engine.bind(new_eeg_features=on_features)
+    cortex.emit('new_data_labels', data={'streamName': 'eeg', 'labels': ['COUNTER', 'INTERPOLATED', 'AF3', 'RAW_CQ']})
+    t, x = sines([10.0], seconds=3.0)
+    for i in range(len(t)):
+        cortex.emit('new_eeg_data', data={'eeg': [i % 128, 0, x[i, 0], 0.0], 'time': t[i]})
+
+    # full after 256 samples, then every 32
+    assert len(received) == 1 + (len(t) - 256) // 32
+    assert received[0]['channels'] == ['AF3']
+    assert received[0]['time'] == t[255]
+    last = received[-1]
+    assert last['bands'][last['relative_power'][0].argmax()] == 'alpha'
@@ -0,0 +1,66 @@
+import numpy as np
+from pydispatch import Dispatcher
+from scipy import signal
+
+from eeg_filters import EEGFilterStage, StreamingFilter
+
+
+def test_blockwise_filter_equals_offline_sosfilt():
+    rng = np.random.default_rng(0)
+    x = 4000.0 + rng.normal(size=(1000, 5)).cumsum(axis=0)
+    f = StreamingFilter(128.0, n_channels=5)
+
+    edges = [0, 1, 17, 32, 200, 201, 640, 1000]
+    y = np.vstack([f.process(x[a:b]) for a, b in zip(edges[:-1], edges[1:])])
+
+    expected, _ = signal.sosfilt(f.sos, x, axis=0, zi=f.initial_state(x[0]))
+    np.testing.assert_allclose(y, expected, rtol=1e-12, atol=1e-9)
+
+
+def test_reset_restarts_from_the_next_block():
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=(256, 3))
+    f = StreamingFilter(128.0, n_channels=3, settle=False)
+    f.process(x[:100])
+    f.reset()
+
+    fresh = StreamingFilter(128.0, n_channels=3, settle=False)
+    np.testing.assert_allclose(f.process(x[100:]), fresh.process(x[100:]))
+
+
+class TappedCortex(Dispatcher):
+    # eeg kept only in the ring buffer: no new_eeg_data, frames reach the stream taps
+    _events_ = ['new_data_labels', 'new_eeg_data', 'new_eeg_block', 'stream_gap']
+
+    def __init__(self):
+        self.headset_id = ''
+        self.stream_taps = []
+
+    def sample_mode(self, stream_name):
+        return 'buffer'
+
+    def frame(self, time, values):
+        for tap in self.stream_taps:
+            tap('eeg', {'eeg': values, 'time': time})
+
+
+def test_stage_filters_tapped_frames_in_buffer_mode():
+    cortex = TappedCortex()
+    stage = EEGFilterStage(128.0)
+    stage.attach(cortex)
+    received = []
+
+    def on_filtered(*args, **kwargs):
+        received.append(kwargs['data'])
+
+    stage.bind(new_eeg_filtered_data=on_filtered)
+    cortex.emit('new_data_labels', data={'streamName': 'eeg', 'labels': ['COUNTER', 'INTERPOLATED', 'AF3', 'AF4']})
+
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=(20, 2))
+    for i, row in enumerate(x):
+        cortex.frame(i / 128.0, [i, 0] + row.tolist())
+
+    expected = StreamingFilter(128.0, n_channels=2).process(x)
+    assert [r['time'] for r in received] == [i / 128.0 for i in range(20)]
+    np.testing.assert_allclose([r['eeg'] for r in received], expected)
@@ -0,0 +1,110 @@
+import numpy as np
+from pydispatch import Dispatcher
+
+from epoching import EpochingService
+
+FS = 128.0
+LABELS = ['COUNTER', 'INTERPOLATED', 'AF3', 'AF4', 'RAW_CQ', 'MARKER_HARDWARE']
+
+
+class MarkedCortex(Dispatcher):
+    # emits eeg like Cortex in 'data' mode: taps see the markers column, new_eeg_data has it removed
+    _events_ = ['new_data_labels', 'new_eeg_data', 'new_eeg_block']
+
+    def __init__(self):
+        self.headset_id = ''
+        self.stream_taps = []
+
+    def get_buffer(self, stream_name):
+        return None
+
+    def sample_mode(self, stream_name):
+        return 'data'
+
+    def frame(self, time, values, markers):
+        frame = {'eeg': list(values) + [markers], 'time': time}
+        for tap in self.stream_taps:
+            tap('eeg', frame)
+        frame['eeg'].pop()
+        self.emit('new_eeg_data', data=frame)
+
+
+def response(t):
+    # a positive deflection of 10 µV peaking 300 ms after the stimulus, on AF3 only
+    return 10.0 * np.exp(-0.5 * ((t - 0.3) / 0.05) ** 2)
+
+
+def run_trials(service, trials, seed=0):
+    # one stimulus 0.5 s into every 1.5 s trial, on a DC offset that changes between trials
+    cortex = MarkedCortex()
+    service.attach(cortex)
+    epochs, erps = [], []
+
+    def on_epoch(*args, **kwargs):
+        epochs.append(kwargs['data'])
+
+    def on_erp(*args, **kwargs):
+        erps.append(kwargs['data'])
+
+    service.bind(new_epoch=on_epoch, new_erp=on_erp)
+    cortex.emit('new_data_labels', data={'streamName': 'eeg', 'labels': LABELS})
+
+    rng = np.random.default_rng(seed)
+    per_trial = int(1.5 * FS)
+    n = 0
+    for trial in range(trials):
+        offset = 4200.0 + rng.normal(scale=50.0)
+        for i in range(per_trial):
+            t = n / FS
+            since_stimulus = i / FS - 0.5
+            af3 = offset + rng.normal(scale=5.0) + (response(since_stimulus) if since_stimulus >= 0 else 0.0)
+            af4 = offset + rng.normal(scale=5.0)
+            markers = [{'label': 'stimulus', 'value': trial}] if i == int(0.5 * FS) else []
+            cortex.frame(t, [n % 128, 0, af3, af4, 0.0, 0], markers)
+            n += 1
+    return epochs, erps
+
+
+def test_markers_yield_baseline_corrected_epochs():
+    service = EpochingService(FS, tmin=-0.2, tmax=0.8, baseline=(None, 0.0))
+    epochs, erps = run_trials(service, 5)
+
+    assert [e['value'] for e in epochs] == list(range(5))
+    assert len(erps) == 5 and erps[-1]['count'] == 5
+    first = epochs[0]
+    assert first['channels'] == ['AF3', 'AF4']
+    assert first['data'].shape == (128, 2)
+    assert len(first['times']) == 128 and first['times'][0] == -0.2
+    assert first['time'] == 0.5
+    # the DC offset is gone, the samples before the marker average to zero
+    baseline = first['data'][first['times'] <= 0.0]
+    np.testing.assert_allclose(baseline.mean(axis=0), 0.0, atol=1e-9)
+    assert not service.pending
+
+
+def test_average_converges_to_the_response():
+    service = EpochingService(FS, tmin=-0.2, tmax=0.8, baseline=(None, 0.0))
+    _, erps = run_trials(service, 60)
+
+    expected = response(service.times) * (service.times >= 0)
+
+    def error(erp):
+        return np.abs(erp['data'][:, 0] - expected).max()
+
+    assert error(erps[-1]) < 0.5 * error(erps[3])
+    assert error(erps[-1]) < 3.0
+    # no response on AF4
+    assert np.abs(erps[-1]['data'][:, 1]).max() < 3.0
+    assert service.erp('stimulus')['count'] == 60
+
+
+def test_external_markers_and_missing_samples():
+    service = EpochingService(FS, tmin=-0.2, tmax=0.8, buffer_seconds=3.0)
+    epochs, _ = run_trials(service, 3)
+    assert len(epochs) == 3
+    # older than the buffer, dropped
+    service.add_marker(0.5, 'late')
+    assert not service.pending and service.erp('late') is None
+    # within the buffer, cut at once
+    service.add_marker(3.0, 'late')
+    assert service.erp('late')['count'] == 1
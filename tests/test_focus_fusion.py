@@ -0,0 +1,70 @@
+from focus_fusion import FocusFusion
+
+MET = {"attention": 0.5, "engagement": 0.4, "excitement": 0.3, "interest": 0.2, "relaxation": 0.1, "stress": 0.6}
+
+
+def test_met_row_joins_the_latest_earlier_emotion():
+    fusion = FocusFusion(tolerance=5.0)
+    fusion.add_emotion(100.0, "happy", {"happy": 0.9})
+    fusion.add_emotion(103.0, "sad", {"sad": 0.8})
+    fusion.add_met(104.0, MET)
+
+    row = fusion.latest()
+    assert row["dominant"] == "sad"
+    assert row["emotion_time"] == 103.0
+    assert row["sad"] == 0.8 and row["happy"] == 0.0
+
+
+def test_late_emotion_updates_the_rows_after_it():
+    fusion = FocusFusion(tolerance=5.0)
+    for t in [100.0, 101.0, 102.0, 103.0, 110.0]:
+        fusion.add_met(t, MET)
+    assert all(row["dominant"] is None for row in fusion.frame())
+
+    fusion.add_emotion(101.5, "fear", {"fear": 0.7})
+
+    dominant = [row["dominant"] for row in fusion.frame()]
+    # rows before the emotion and beyond the tolerance keep no match
+    assert dominant == [None, None, "fear", "fear", None]
+
+
+def test_emotion_beyond_the_tolerance_is_not_matched():
+    fusion = FocusFusion(tolerance=2.0)
+    fusion.add_emotion(100.0, "happy", {"happy": 0.9})
+    fusion.add_met(102.5, MET)
+
+    assert fusion.latest()["dominant"] is None
+
+
+def test_old_rows_are_ignored():
+    fusion = FocusFusion()
+    fusion.add_met(100.0, MET)
+    fusion.add_met(99.0, MET)
+    fusion.add_met(100.0, MET)
+
+    assert [row["time"] for row in fusion.frame()] == [100.0]
+
+
+def test_evict_and_stale_latest():
+    fusion = FocusFusion(tolerance=5.0)
+    fusion.add_emotion(90.0, "happy", {"happy": 0.9})
+    fusion.add_emotion(99.0, "sad", {"sad": 0.9})
+    for t in [100.0, 101.0, 102.0]:
+        fusion.add_met(t, MET)
+
+    fusion.evict(101.0)
+    assert [row["time"] for row in fusion.frame()] == [101.0, 102.0]
+    # the emotion at 99.0 can still match rows within the tolerance
+    assert fusion.emotion_times == [99.0]
+
+    assert fusion.latest(max_age=10.0, now=105.0)["time"] == 102.0
+    assert fusion.latest(max_age=10.0, now=120.0) is None
+
+
+def test_frame_is_bounded_by_the_window():
+    fusion = FocusFusion(window=3)
+    for t in range(10):
+        fusion.add_met(float(t), MET)
+
+    assert [row["time"] for row in fusion.frame()] == [7.0, 8.0, 9.0]
+    assert [row["time"] for row in fusion.frame(2)] == [8.0, 9.0]
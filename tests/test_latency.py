@@ -0,0 +1,78 @@
+import random
+
+import numpy
+import pytest
+
+from latency import ClockOffsetEstimator, LatencyHistogram, LatencyTracker
+
+
+def test_histogram_percentiles_are_within_one_bucket_of_numpy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(-4.0, 1.0) for _ in range(5000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    # the upper bound of a bucket is 10 ** (1 / 20) times its lower bound
+    resolution = 10 ** (1 / 20)
+    for q in (1, 10, 50, 90, 99, 99.9):
+        exact = numpy.percentile(values, q, method='inverted_cdf')
+        reported = histogram.percentile(q)
+        assert exact <= reported <= exact * resolution, q
+    assert histogram.percentile(100) == max(values)
+    assert histogram.to_dict()['mean_ms'] == pytest.approx(numpy.mean(values) * 1000.0)
+
+
+def test_histogram_edges():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.to_dict() == {'count': 0}
+    histogram.record(-0.5)
+    histogram.record(500.0)
+    # below the first bound goes in the first bucket, reported no higher than the max
+    assert histogram.percentile(50) == histogram.bounds[0]
+    assert histogram.percentile(99) == 500.0
+    histogram.reset()
+    assert histogram.count == 0
+
+
+def test_clock_offset_converges_under_jitter():
+    rng = random.Random(3)
+    offset = 1000.25
+    estimator = ClockOffsetEstimator(window=5.0)
+    errors = []
+    for n in range(2000):
+        device_time = n / 128.0
+        # transit delay is never negative, mostly a few ms with occasional bursts
+        delay = 0.002 + rng.expovariate(1 / 0.01)
+        estimate = estimator.update(device_time, device_time + offset + delay)
+        errors.append(estimate - offset)
+
+    assert all(error >= 0.002 for error in errors)
+    # after a few seconds the window minimum is close to the fixed part of the delay
+    assert max(errors[1000:]) < 0.003
+
+
+def test_clock_offset_follows_drift_after_the_window():
+    estimator = ClockOffsetEstimator(window=1.0)
+    for n in range(50):
+        estimator.update(n * 0.1, n * 0.1 + 5.0)
+    # a lower offset is taken at once
+    assert estimator.update(5.9, 10.0) == pytest.approx(4.1)
+    # a higher offset is only taken when the lower one leaves the window
+    assert estimator.update(6.5, 10.8) == pytest.approx(4.1)
+    assert estimator.update(7.0, 11.2) == pytest.approx(4.2)
+
+
+def test_tracker_records_per_stream():
+    tracker = LatencyTracker(window=5.0)
+    tracker.record({'sid': 's', 'time': 10.0, 'met': [1]}, arrival=20.0, handled=20.001)
+    tracker.record({'sid': 's', 'time': 10.5, 'met': [1]}, arrival=20.6, handled=20.602)
+    tracker.record({'sid': 's', 'eeg': [1]}, arrival=21.0, handled=21.0)
+
+    snapshot = tracker.snapshot()
+    assert list(snapshot) == ['met']
+    met = snapshot['met']
+    assert met['clock_offset'] == pytest.approx(10.0)
+    assert met['arrival_to_handled']['count'] == 2
+    assert met['device_to_arrival']['max_ms'] == pytest.approx(100.0)
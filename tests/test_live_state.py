@@ -0,0 +1,126 @@
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from live_state import LIVE_FIELDS, LiveStateReader, LiveStateWriter
+
+
+@pytest.fixture
+def name():
+    return 'eeg_web_llm_test_' + uuid.uuid4().hex[:8]
+
+
+def met_sample(value):
+    # a met sample as emitted by Cortex, see MET_CSV_INDEXES
+    return [True, value, True, value + 0.1, True, value + 0.2, True, True, value + 0.3, True,
+            value + 0.4, True, value + 0.5]
+
+
+def test_round_trip_keeps_the_newest_rows(name):
+    writer = LiveStateWriter(name, trend_len=4)
+    reader = LiveStateReader(name)
+    try:
+        assert reader.snapshot() is None
+        for i in range(6):
+            writer.write_met(100.0 + i, met_sample(i / 10.0))
+
+        state = reader.snapshot()
+        assert state['count'] == 6
+        assert [row['time'] for row in state['rows']] == [102.0, 103.0, 104.0, 105.0]
+        assert state['latest']['time'] == 105.0
+        assert state['latest']['attention'] == pytest.approx(0.5)
+        assert state['latest']['stress'] == pytest.approx(1.0)
+        assert set(state['latest']) == set(LIVE_FIELDS) | {'time'}
+        assert [row['time'] for row in reader.snapshot(n=2)['rows']] == [104.0, 105.0]
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_fields_not_written_keep_their_last_value(name):
+    writer = LiveStateWriter(name)
+    reader = LiveStateReader(name)
+    try:
+        writer.write(1.0, {'attention': 0.3, 'stress': 0.7})
+        writer.write(2.0, {'attention': 0.4})
+        latest = reader.snapshot()['latest']
+        assert latest['attention'] == pytest.approx(0.4)
+        assert latest['stress'] == pytest.approx(0.7)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_follows_a_restarted_writer(name):
+    writer = LiveStateWriter(name)
+    reader = LiveStateReader(name)
+    try:
+        writer.write(1.0, {'attention': 0.1})
+        assert reader.snapshot()['latest']['attention'] == pytest.approx(0.1)
+
+        writer.close()
+        assert reader.snapshot() is None
+
+        writer = LiveStateWriter(name)
+        writer.write(2.0, {'attention': 0.2})
+        state = reader.snapshot()
+        assert state['count'] == 1
+        assert state['latest']['attention'] == pytest.approx(0.2)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_state_older_than_max_age_is_ignored(name):
+    writer = LiveStateWriter(name)
+    reader = LiveStateReader(name)
+    try:
+        writer.write(1.0, {'attention': 0.1})
+        writer.header['updated'] -= 60.0
+        assert reader.snapshot(max_age=10.0) is None
+        assert reader.snapshot() is not None
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_second_writer_raises_while_the_first_is_alive(name):
+    writer = LiveStateWriter(name)
+    reader = LiveStateReader(name)
+    try:
+        writer.write(1.0, {'attention': 0.1})
+        with pytest.raises(FileExistsError, match=str(os.getpid())):
+            LiveStateWriter(name)
+        # the segment of the running writer is kept
+        writer.write(2.0, {'attention': 0.2})
+        assert reader.snapshot()['latest']['attention'] == pytest.approx(0.2)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_segment_of_a_dead_writer_is_replaced(name):
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+    crashed = LiveStateWriter(name)
+    crashed.write(1.0, {'attention': 0.1})
+    # as if the writer was that process and exited without close
+    crashed.header['pid'] = finished.pid
+    crashed.header = None
+    crashed.rows = None
+    crashed.shm.close()
+
+    writer = LiveStateWriter(name)
+    reader = LiveStateReader(name)
+    try:
+        assert reader.snapshot() is None
+        writer.write(2.0, {'attention': 0.2})
+        state = reader.snapshot()
+        assert state['count'] == 1
+        assert state['latest']['attention'] == pytest.approx(0.2)
+    finally:
+        reader.close()
+        writer.close()
@@ -0,0 +1,79 @@
+import csv
+import os
+import time
+from datetime import datetime, timezone
+
+from cortex_simulator import MET_COLS
+from met_writer import MET_CSV_COLUMNS, MET_CSV_INDEXES, MetCsvWriter
+
+# 2026-01-01 23:59:59 UTC
+BEFORE_MIDNIGHT = datetime(2026, 1, 1, 23, 59, 59, tzinfo=timezone.utc).timestamp()
+
+
+def met(value):
+    # a met sample in the column order of the subscribe result, numbered by column
+    return [value + i / 100.0 for i in range(len(MET_COLS))]
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_indexes_match_the_previous_csv_layout():
+    # Subcribe.on_new_met_data wrote these met columns before MetCsvWriter
+    previous = {'attention': 1, 'engagement': 3, 'excitement': 5, 'interest': 8, 'relaxation': 10, 'stress': 12}
+    assert MET_CSV_COLUMNS[:-1] == list(previous)
+    assert MET_CSV_INDEXES == list(previous.values())
+    assert MET_CSV_COLUMNS[-1] == 'time'
+    assert [MET_COLS[i] for i in MET_CSV_INDEXES[:3]] == ['attention', 'eng', 'exc']
+
+
+def test_files_roll_over_at_utc_midnight(tmp_path):
+    writer = MetCsvWriter(str(tmp_path), flush_rows=100, flush_seconds=60.0)
+    writer.write(BEFORE_MIDNIGHT - 1.0, met(1))
+    writer.write(BEFORE_MIDNIGHT, met(2))
+    first_path = writer.path
+    writer.write(BEFORE_MIDNIGHT + 2.0, met(3))
+    second_path = writer.path
+    writer.close()
+
+    assert sorted(os.listdir(str(tmp_path))) == ['2026-01-01.csv', '2026-01-02.csv']
+    assert first_path.endswith('2026-01-01.csv') and second_path.endswith('2026-01-02.csv')
+
+    first = read_rows(first_path)
+    assert first[0] == MET_CSV_COLUMNS
+    assert [row[-1] for row in first[1:]] == ['2026-01-01 23:59:58.000000', '2026-01-01 23:59:59.000000']
+    second = read_rows(second_path)
+    assert second[0] == MET_CSV_COLUMNS
+    assert second[1][-1] == '2026-01-02 00:00:01.000000'
+    assert [float(v) for v in second[1][:-1]] == [met(3)[i] for i in MET_CSV_INDEXES]
+
+
+def test_rows_are_buffered_and_appended_to_an_existing_file(tmp_path):
+    writer = MetCsvWriter(str(tmp_path), flush_rows=2, flush_seconds=60.0)
+    writer.write(BEFORE_MIDNIGHT - 10.0, met(1))
+    # the header may still sit in the file buffer, the row is not written
+    assert len(read_rows(writer.path)) <= 1
+    writer.write(BEFORE_MIDNIGHT - 9.0, met(2))
+    assert len(read_rows(writer.path)) == 3
+    writer.close()
+
+    # a restart on the same day appends without a second header
+    writer = MetCsvWriter(str(tmp_path), flush_rows=2, flush_seconds=60.0)
+    writer.write(BEFORE_MIDNIGHT - 8.0, met(3))
+    path = writer.path
+    writer.close()
+    rows = read_rows(path)
+    assert len(rows) == 4
+    assert rows.count(MET_CSV_COLUMNS) == 1
+
+
+def test_pending_rows_are_flushed_after_flush_seconds(tmp_path):
+    writer = MetCsvWriter(str(tmp_path), flush_rows=100, flush_seconds=0.05)
+    writer.write(BEFORE_MIDNIGHT, met(1))
+    deadline = time.monotonic() + 5.0
+    while len(read_rows(writer.path)) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(read_rows(writer.path)) == 2
+    writer.close()
@@ -0,0 +1,78 @@
+from cortex import CORTEX_STOP_ALL_STREAMS
+from cortex_simulator import MET_COLS
+from multi_headset import MultiHeadsetCortex
+
+
+class RecordingMultiHeadset(MultiHeadsetCortex):
+    # requests are recorded instead of sent
+    def send_request(self, request):
+        self.requests.append(request)
+
+
+def make_client(**kwargs):
+    c = RecordingMultiHeadset('client', 'secret', **kwargs)
+    c.requests = []
+    c.auth = 'token'
+    c.streams = ['met']
+    for sid, headset_id in (('sa', 'A'), ('sb', 'B')):
+        c.handle_create_session_result({'id': sid, 'status': 'activated', 'headset': {'id': headset_id}})
+    return c
+
+
+def subscribe_result(*sids):
+    return {'success': [{'streamName': 'met', 'cols': MET_COLS, 'sid': sid} for sid in sids], 'failure': []}
+
+
+def met_frame(sid, time, value):
+    return {'met': [True, value, True, value, True, value, value, True, value, True, value, True, value],
+            'sid': sid, 'time': time}
+
+
+def test_every_session_subscribes_the_streams():
+    c = make_client()
+    assert [(r['method'], r['params']['session'], r['params']['streams']) for r in c.requests] == \
+        [('subscribe', 'sa', ['met']), ('subscribe', 'sb', ['met'])]
+    assert c.sessions_by_sid['sa'].headset_id == 'A'
+
+
+def test_frames_are_routed_by_session_id():
+    c = make_client(ring_buffer={'met': 16})
+    c.handle_sub_result(subscribe_result('sa', 'sb'))
+    received = []
+
+    def on_new_met_data(*args, **kwargs):
+        received.append(dict(kwargs['data']))
+
+    c.bind(new_met_data=on_new_met_data)
+    c.handle_stream_data(met_frame('sb', 1.0, 0.2))
+    c.handle_stream_data(met_frame('sa', 1.5, 0.7))
+    c.handle_stream_data(met_frame('unknown', 2.0, 0.9))
+
+    assert [(d['headset'], d['time']) for d in received] == [('B', 1.0), ('A', 1.5)]
+    assert c.get_buffer('met', 'A').total == 1
+    assert c.get_buffer('met', 'B').total == 1
+    assert c.get_buffer('met', 'B').latest()[1][0, 1] == 0.2
+
+
+def test_subscribe_results_are_split_by_session():
+    c = make_client()
+    c.handle_sub_result(subscribe_result('sa', 'sb'))
+    assert c.sessions['A'].subscribed_streams == ['met']
+    assert c.sessions['B'].subscribed_streams == ['met']
+
+    c.handle_unsub_result({'success': [{'streamName': 'met', 'sid': 'sa'}], 'failure': []})
+    assert c.sessions['A'].subscribed_streams == []
+    assert c.sessions['B'].subscribed_streams == ['met']
+
+
+def test_outage_of_one_headset_is_kept_on_its_session():
+    c = make_client(auto_reconnect=True, reconnect_delay=60.0)
+    c.handle_sub_result(subscribe_result('sa', 'sb'))
+    c.handle_warning({'code': CORTEX_STOP_ALL_STREAMS, 'message': {'sessionId': 'sa', 'behavior': ''}})
+
+    assert c.sessions['A'].session_id == ''
+    assert c.sessions['A'].restore_streams == ['met']
+    assert c.sessions['A'].outage_streams == {'met'}
+    assert c.sessions['B'].outage_streams == set()
+    assert 'sb' in c.sessions_by_sid
+    c.scheduler.shutdown()
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from cortex import Cortex, STATE_AUTHORIZED, STATE_CONNECTING_HEADSET
+from scheduler import TimerScheduler
+
+
+def test_calls_run_in_due_time_order():
+    scheduler = TimerScheduler()
+    calls = []
+    done = threading.Event()
+    scheduler.call_later(0.06, calls.append, 'c')
+    scheduler.call_later(0.02, calls.append, 'a')
+    scheduler.call_later(0.04, calls.append, 'b')
+    scheduler.call_later(0.08, done.set)
+
+    assert done.wait(2)
+    assert calls == ['a', 'b', 'c']
+    scheduler.shutdown()
+
+
+def test_cancelled_and_failing_calls():
+    scheduler = TimerScheduler()
+    calls = []
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    cancelled = scheduler.call_later(0.01, calls.append, 'cancelled')
+    scheduler.call_later(0.02, fail)
+    scheduler.call_later(0.03, calls.append, 'after failure')
+    scheduler.call_later(0.04, done.set)
+    cancelled.cancel()
+
+    assert done.wait(2)
+    assert calls == ['after failure']
+    scheduler.shutdown()
+
+
+def test_cancel_all_and_shutdown():
+    scheduler = TimerScheduler()
+    calls = []
+    scheduler.call_later(0.02, calls.append, 'dropped')
+    scheduler.cancel_all()
+    scheduler.call_later(0.02, calls.append, 'dropped at shutdown')
+    scheduler.shutdown()
+    time.sleep(0.05)
+    assert calls == []
+
+
+def test_headset_poll_gives_up_after_the_connect_timeout():
+    cortex = Cortex('client', 'secret', headset_poll_interval=0.01, headset_connect_timeout=0.1)
+    polls = []
+    gave_up = threading.Event()
+
+    def query_headset():
+        # the headset keeps answering 'connecting'
+        polls.append(time.monotonic())
+        cortex.schedule_headset_poll()
+
+    def on_state_changed(*args, **kwargs):
+        if kwargs['data']['new'] == STATE_AUTHORIZED:
+            gave_up.set()
+
+    cortex.query_headset = query_headset
+    cortex.bind(state_changed=on_state_changed)
+    cortex.set_state(STATE_CONNECTING_HEADSET)
+    with pytest.warns(UserWarning, match='is not connected after'):
+        cortex.schedule_headset_poll()
+        assert gave_up.wait(2)
+    assert len(polls) >= 3
+    assert cortex.state == STATE_AUTHORIZED
+    cortex.scheduler.shutdown()
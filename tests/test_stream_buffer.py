@@ -0,0 +1,123 @@
+import numpy as np
+
+from stream_buffer import StreamRingBuffer, StreamGapTracker
+
+LABELS = ['COUNTER', 'AF3', 'AF4']
+
+
+def sample(counter, value):
+    return [counter, value, -value]
+
+
+def test_latest_is_contiguous_view_after_wrap():
+    buffer = StreamRingBuffer('eeg', LABELS, capacity=4)
+    for i in range(10):
+        buffer.append(i * 0.5, sample(i, float(i)))
+
+    times, data = buffer.latest()
+    assert buffer.size == 4
+    assert buffer.total == 10
+    np.testing.assert_array_equal(times, [3.0, 3.5, 4.0, 4.5])
+    np.testing.assert_array_equal(data[:, 1], [6.0, 7.0, 8.0, 9.0])
+    # a view on the doubled storage, not a copy
+    assert data.base is not None
+    assert data.flags['C_CONTIGUOUS']
+
+
+def test_extend_matches_append_across_the_wrap():
+    appended = StreamRingBuffer('eeg', LABELS, capacity=5)
+    extended = StreamRingBuffer('eeg', LABELS, capacity=5)
+    rows = np.array([sample(i, float(i)) for i in range(13)])
+    times = np.arange(13) / 128.0
+    for t, row in zip(times, rows):
+        appended.append(t, row)
+    extended.extend(times[:3], rows[:3])
+    extended.extend(times[3:11], rows[3:11])
+    extended.extend(times[11:], rows[11:])
+
+    for a, b in zip(appended.latest(), extended.latest()):
+        np.testing.assert_array_equal(a, b)
+    assert appended.latest_counter() == extended.latest_counter() == 12
+
+
+def test_window_by_time():
+    buffer = StreamRingBuffer('eeg', LABELS, capacity=8)
+    for i in range(12):
+        buffer.append(float(i), sample(i, float(i)))
+
+    times, data = buffer.window_by_time(6.0, 9.0)
+    np.testing.assert_array_equal(times, [6.0, 7.0, 8.0])
+    np.testing.assert_array_equal(data[:, 1], [6.0, 7.0, 8.0])
+
+
+def test_counter_is_unwrapped():
+    buffer = StreamRingBuffer('eeg', LABELS, capacity=16, counter_modulus=4)
+    for i in range(10):
+        buffer.append(float(i), sample(i % 4, 0.0))
+
+    assert buffer.latest_counter() == 9
+    times, _ = buffer.window_by_counter(4, 8)
+    np.testing.assert_array_equal(times, [4.0, 5.0, 6.0, 7.0])
+
+
+def test_repeated_counter_is_not_a_wrap():
+    buffer = StreamRingBuffer('eeg', LABELS, capacity=16, counter_modulus=128)
+    for counter in [10, 11, 11, 12, 11, 13]:
+        buffer.append(0.0, sample(counter, 0.0))
+
+    assert buffer.latest_counter() == 13
+
+
+def test_gap_tracker_counts_lost_samples():
+    tracker = StreamGapTracker('eeg', counter_col=0, counter_modulus=128, sample_rate=128.0)
+    gaps = []
+    for counter in list(range(0, 10)) + list(range(15, 20)):
+        gap = tracker.update(counter / 128.0, sample(counter % 128, 0.0))
+        if gap is not None:
+            gaps.append(gap)
+
+    assert len(gaps) == 1
+    assert gaps[0]['lost'] == 5
+    assert gaps[0]['start'] == 9 / 128.0
+    assert gaps[0]['end'] == 15 / 128.0
+    assert tracker.gaps == 1 and tracker.lost == 5
+
+
+def test_gap_tracker_ignores_the_wrap():
+    tracker = StreamGapTracker('eeg', counter_col=0, counter_modulus=128, sample_rate=128.0)
+    for n in range(300):
+        assert tracker.update(n / 128.0, sample(n % 128, 0.0)) is None
+    assert tracker.lost == 0
+
+
+def test_gap_tracker_counts_whole_periods_of_an_outage():
+    tracker = StreamGapTracker('eeg', counter_col=0, counter_modulus=128, sample_rate=128.0)
+    for n in range(50):
+        tracker.update(n / 128.0, sample(n % 128, 0.0))
+    # 300 samples lost, more than two counter periods
+    n = 350
+    gap = tracker.update(n / 128.0, sample(n % 128, 0.0))
+
+    assert gap['lost'] == 300
+
+
+def test_gap_tracker_ignores_duplicates_after_a_wrap():
+    tracker = StreamGapTracker('eeg', counter_col=0, counter_modulus=128, sample_rate=128.0)
+    for n in range(200):
+        tracker.update(n / 128.0, sample(n % 128, 0.0))
+    # the newest sample arrives twice
+    assert tracker.update(199 / 128.0, sample(199 % 128, 0.0)) is None
+    assert tracker.update(200 / 128.0, sample(200 % 128, 0.0)) is None
+    assert tracker.gaps == 0 and tracker.lost == 0
+
+
+def test_gap_tracker_ignores_reordered_samples():
+    tracker = StreamGapTracker('eeg', counter_col=0, counter_modulus=128, sample_rate=128.0)
+    for n in range(200):
+        tracker.update(n / 128.0, sample(n % 128, 0.0))
+    # 201 overtakes 200: one sample looks missing until 200 arrives late
+    gap = tracker.update(201 / 128.0, sample(201 % 128, 0.0))
+    assert gap['lost'] == 1
+    assert tracker.update(200 / 128.0, sample(200 % 128, 0.0)) is None
+    assert tracker.update(202 / 128.0, sample(202 % 128, 0.0)) is None
+    assert tracker.lost == 1
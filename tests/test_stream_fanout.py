@@ -0,0 +1,73 @@
+import time
+
+from stream_fanout import StreamFanoutClient, StreamFanoutServer
+
+MET_LABELS = {'streamName': 'met', 'labels': ['attention', 'eng']}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError('condition not met')
+        time.sleep(0.01)
+
+
+def start_server():
+    server = StreamFanoutServer('127.0.0.1:0', encoding='json')
+    server.on_new_data_labels(data=MET_LABELS)
+    server.start()
+    host, port = server.address
+    return server, '{0}:{1}'.format(host, port)
+
+
+def test_frames_reach_a_client_once_and_detach():
+    server, address = start_server()
+    client = StreamFanoutClient(address, timeout=5.0)
+    try:
+        assert client.hello == {'encoding': 'json', 'streams': ['met']}
+        # a named stream together with every stream
+        client.subscribe(['met', '*'])
+        assert client.recv() == {'labels': MET_LABELS}
+        wait_for(lambda: '*' in server.subscribers)
+
+        server.publish('met', {'met': [0.5, 0.6], 'sid': 's', 'time': 1.0})
+        server.publish('eeg', {'eeg': [1, 0, 4200.0], 'sid': 's', 'time': 1.1})
+        server.publish('dev', {'dev': [4], 'sid': 's', 'time': 1.2})
+        received = [client.recv() for _ in range(3)]
+        assert received == [{'met': [0.5, 0.6], 'sid': 's', 'time': 1.0},
+                            {'eeg': [1, 0, 4200.0], 'sid': 's', 'time': 1.1},
+                            {'dev': [4], 'sid': 's', 'time': 1.2}]
+
+        client.unsubscribe(['*', 'met'])
+        wait_for(lambda: not server.subscribers)
+        assert server.stats()[0]['streams'] == []
+    finally:
+        client.close()
+    wait_for(lambda: not server.clients)
+    server.close()
+
+
+def test_labels_are_sent_to_subscribers_of_the_stream():
+    server, address = start_server()
+    met_client = StreamFanoutClient(address, timeout=5.0)
+    eeg_client = StreamFanoutClient(address, timeout=5.0)
+    try:
+        met_client.subscribe(['met'])
+        assert met_client.recv() == {'labels': MET_LABELS}
+        eeg_client.subscribe(['eeg'])
+        wait_for(lambda: 'met' in server.subscribers and 'eeg' in server.subscribers)
+
+        eeg_labels = {'streamName': 'eeg', 'labels': ['COUNTER', 'INTERPOLATED', 'AF3']}
+        server.on_new_data_labels(data=eeg_labels)
+        server.publish('met', {'met': [0.1, 0.2], 'sid': 's', 'time': 2.0})
+        server.publish('eeg', {'eeg': [2, 0, 4201.0], 'sid': 's', 'time': 2.1})
+
+        assert met_client.recv()['met'] == [0.1, 0.2]
+        assert eeg_client.recv() == {'labels': eeg_labels}
+        assert eeg_client.recv()['eeg'] == [2, 0, 4201.0]
+    finally:
+        met_client.close()
+        eeg_client.close()
+    wait_for(lambda: not server.clients)
+    server.close()
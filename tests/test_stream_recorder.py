@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from stream_recorder import StreamReader, StreamRecorder
+
+LABELS = ['attention', 'eng']
+T0 = 1700000000.0
+
+
+def record(root, times, **kwargs):
+    recorder = StreamRecorder(root, streams=('met',), flush_rows=4, **kwargs)
+    recorder.set_labels('met', LABELS)
+    for i, time in enumerate(times):
+        recorder.append('met', time, [i, -i])
+    return recorder
+
+
+def test_segments_rotate_and_read_back(tmp_path):
+    times = T0 + np.arange(50) * 0.5
+    recorder = record(str(tmp_path), times, max_seconds=10.0)
+    recorder.close()
+
+    reader = StreamReader(str(tmp_path), 'met')
+    # 25 s of samples in segments of 10 s
+    assert len(reader.segments) == 3
+    assert [s['rows'] for s in reader.segments] == [20, 20, 10]
+    assert reader.labels == LABELS
+    assert isinstance(reader.segments[0]['records'], np.memmap)
+
+    all_times, data = reader.read()
+    assert np.array_equal(all_times, times)
+    assert np.array_equal(data[:, 0], np.arange(50))
+
+    # a window within one segment is a memory mapped view
+    window_times, window = reader.read(T0 + 1.0, T0 + 3.0)
+    assert np.array_equal(window_times, times[2:6])
+    assert isinstance(window, np.memmap)
+
+    # a window across a rotation, stop is exclusive
+    window_times, window = reader.read(T0 + 8.0, T0 + 12.0)
+    assert np.array_equal(window_times, times[16:24])
+    assert np.array_equal(window[:, 1], -np.arange(16, 24))
+    assert len(list(reader.iter_segments(T0 + 8.0, T0 + 12.0))) == 2
+
+    times_after, _ = reader.read(T0 + 100.0)
+    assert len(times_after) == 0
+
+    # the header holds the row count after close
+    for segment in reader.segments:
+        assert len(np.load(segment['path'])) == segment['rows']
+
+
+def test_open_segment_is_readable_before_close(tmp_path):
+    recorder = record(str(tmp_path), T0 + np.arange(10) * 0.5)
+    recorder.flush()
+    times, _ = StreamReader(str(tmp_path), 'met').read()
+    assert len(times) == 10
+    recorder.close()
+
+
+def test_existing_segments_are_not_overwritten(tmp_path):
+    times = T0 + np.arange(8) * 0.5
+    first = record(str(tmp_path), times)
+    first.close()
+    # a second recorder in the same root starts with the same name
+    second = record(str(tmp_path), times)
+    second.close()
+
+    names = sorted(os.listdir(os.path.join(str(tmp_path), 'met')))
+    assert names == ['20231114-221320-0000.json', '20231114-221320-0000.npy',
+                     '20231114-221320-0001.json', '20231114-221320-0001.npy']
+    reader = StreamReader(str(tmp_path), 'met')
+    assert [s['rows'] for s in reader.segments] == [8, 8]
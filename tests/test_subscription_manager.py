@@ -0,0 +1,107 @@
+from pydispatch import Dispatcher
+
+from cortex import STATE_CLOSED, STATE_SESSION_READY
+from subscription_manager import SubscriptionManager
+
+
+class FakeCortex(Dispatcher):
+    # the part of Cortex the manager uses, requests are recorded instead of sent
+    _events_ = ['create_session_done', 'warn_cortex_stop_all_sub', 'state_changed', 'new_data_labels',
+                'new_eeg_data', 'new_met_data']
+
+    def __init__(self, auto_reconnect=False):
+        self.session_id = ''
+        self.auto_reconnect = auto_reconnect
+        self.restore_streams = []
+        self.outage_streams = set()
+        self.requests = []
+
+    def sub_request(self, streams):
+        self.requests.append(('sub', list(streams)))
+
+    def unsub_request(self, streams):
+        self.requests.append(('unsub', list(streams)))
+
+    def create_session(self, session_id='s1'):
+        self.session_id = session_id
+        self.emit('state_changed', data={'old': None, 'new': STATE_SESSION_READY})
+        self.emit('create_session_done', data=session_id)
+
+    def subscribed(self, stream_name):
+        self.emit('new_data_labels', data={'streamName': stream_name, 'labels': []})
+
+    def close(self):
+        self.session_id = ''
+        self.emit('state_changed', data={'old': None, 'new': STATE_CLOSED})
+
+
+def test_streams_are_subscribed_once_the_session_is_created():
+    cortex = FakeCortex()
+    manager = SubscriptionManager(cortex)
+    manager.acquire('eeg')
+    manager.acquire('met')
+    assert cortex.requests == []
+
+    cortex.create_session()
+    assert cortex.requests == [('sub', ['eeg', 'met'])]
+
+
+def test_stream_is_unsubscribed_with_its_last_consumer():
+    cortex = FakeCortex()
+    manager = SubscriptionManager(cortex)
+    cortex.create_session()
+    first = manager.acquire('eeg')
+    second = manager.acquire('eeg')
+    assert cortex.requests == [('sub', ['eeg'])]
+    assert manager.counts == {'eeg': 2}
+
+    first.release()
+    first.release()
+    assert manager.counts == {'eeg': 1}
+    assert cortex.requests == [('sub', ['eeg'])]
+
+    second.release()
+    assert manager.counts == {}
+    assert cortex.requests == [('sub', ['eeg']), ('unsub', ['eeg'])]
+
+
+def test_handler_is_called_until_released():
+    cortex = FakeCortex()
+    manager = SubscriptionManager(cortex)
+    cortex.create_session()
+    received = []
+    subscription = manager.acquire('met', lambda *args, **kwargs: received.append(kwargs['data']))
+
+    cortex.emit('new_met_data', data={'met': [1], 'time': 1.0})
+    subscription.release()
+    cortex.emit('new_met_data', data={'met': [2], 'time': 2.0})
+    assert received == [{'met': [1], 'time': 1.0}]
+
+
+def test_subscribe_in_flight_at_disconnect_is_requested_again():
+    cortex = FakeCortex(auto_reconnect=True)
+    manager = SubscriptionManager(cortex)
+    cortex.create_session()
+    manager.acquire('eeg')
+    cortex.subscribed('eeg')
+    manager.acquire('met')
+    assert manager.pending == {'met'}
+
+    # the connection drops before met is answered, Cortex restores only eeg
+    cortex.restore_streams = ['eeg']
+    cortex.close()
+    cortex.create_session('s2')
+    assert cortex.restore_streams == ['eeg', 'met']
+
+
+def test_only_subscribe_in_flight_at_disconnect_is_requested_again():
+    cortex = FakeCortex(auto_reconnect=True)
+    manager = SubscriptionManager(cortex)
+    cortex.create_session()
+    manager.acquire('met')
+
+    # nothing was subscribed yet, so Cortex has no streams to restore
+    cortex.close()
+    cortex.requests = []
+    cortex.create_session('s2')
+    assert cortex.requests == [('sub', ['met'])]